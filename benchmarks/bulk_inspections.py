@@ -0,0 +1,172 @@
+"""قياس إنتاجية إنشاء التشييكات المجمّع: المسار القديم (استعلام وكائن ORM لكل تشييك) مقابل الدفعات
+
+يرسل جولة كاملة من التشييكات (مع نسبة من الأجهزة غير الموجودة والصفوف التي
+يرفضها SQLite) إلى /inspections/bulk-create، ويقارنها بالمسار القديم الذي
+يجلب كل جهاز باستعلام مستقل ويحفظ كل شيء في commit واحد. أثناء كل قياس يسجل
+مفتش آخر تشييكات منفردة، ويُعرض أطول زمن انتظار له لأنه ينتظر قفل الكتابة.
+ينتهي برمز خروج 1 إذا لم تطابق العدادات وحالة الأجهزة إعادة الحساب الكاملة.
+
+الاستخدام:
+    python benchmarks/bulk_inspections.py [--devices 2000] [--inspections 2000] [--chunk-size 500] [--rounds 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('RATE_LIMIT_DB', os.path.join(tempfile.mkdtemp(), 'ratelimit.db'))
+
+from flask import Flask
+from sqlalchemy import insert
+from src.models.user import db, User, Device, Inspection
+from src.routes.auth import auth_bp
+from src.routes.inspections import inspections_bp
+from src.services import bulk_inspections
+from src.services.dashboard_counters import compute_counters, read_counters
+from src.services.device_health import HEALTH_COLUMNS, repair_device_health
+import src.services.alerts  # noqa: F401 (تسجيل دوال التنبيهات كما في التطبيق)
+
+
+def create_app(devices):
+    app = Flask(__name__)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SECRET_KEY'] = os.environ.setdefault('SECRET_KEY', 'bulk-inspections-secret')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(inspections_bp, url_prefix='/api/inspections')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        User.create_admin_user()
+        db.session.execute(insert(Device), [{
+            'name': f'جهاز {i}',
+            'type': ('fire_extinguisher', 'smoke_detector', 'fire_hose')[i % 3],
+            'location': f'الجناح {i % 20}',
+            'status': 'active',
+            'created_at': datetime.utcnow()
+        } for i in range(devices)])
+        db.session.commit()
+        repair_device_health()
+    return app
+
+
+def generate_round(count, devices):
+    """جولة تفتيش: 1% أجهزة غير موجودة و0.5% ملاحظات بصيغة يرفضها SQLite"""
+    for i in range(count):
+        yield {
+            'device_id': i % devices + 1 if i % 100 != 99 else devices + i,
+            'status': ('good', 'good', 'good', 'warning', 'danger')[i % 5],
+            'notes': f'جولة {i}' if i % 200 != 7 else {'text': 'غير صالح'}
+        }
+
+
+def legacy_bulk(items, inspector_id):
+    """المسار السابق لـ bulk-create: استعلام للجهاز وكائن ORM لكل تشييك ثم commit واحد"""
+    created = 0
+    for item in items:
+        device = db.session.get(Device, item['device_id'])
+        if not device:
+            continue
+        db.session.add(Inspection(device_id=device.id, inspector_id=inspector_id, inspection_date=datetime.utcnow(),
+                                  status=item['status'], notes=item['notes'] if isinstance(item['notes'], str) else ''))
+        created += 1
+    db.session.commit()
+    return created
+
+
+class Probe:
+    """مفتش يسجل تشييكاً منفرداً كل 20ms أثناء القياس ويحفظ أطول زمن انتظار"""
+
+    def __init__(self, app, headers):
+        self.app = app
+        self.headers = headers
+        self.stop = threading.Event()
+        self.latencies = []
+
+    def run(self):
+        client = self.app.test_client()
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            response = client.post('/api/inspections/inspections', headers=self.headers,
+                                   json={'device_id': 1, 'status': 'good', 'notes': 'probe'})
+            self.latencies.append((time.perf_counter() - started, response.status_code))
+            self.stop.wait(0.02)
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+    def summary(self):
+        failed = sum(1 for _, status in self.latencies if status != 201)
+        worst = max((latency for latency, _ in self.latencies), default=0) * 1000
+        return f'probe max {worst:7.0f} ms ({len(self.latencies)} writes, {failed} failed)'
+
+
+def measure(label, count, action, probe):
+    with probe:
+        started = time.perf_counter()
+        created = action()
+        elapsed = time.perf_counter() - started
+    print(f'{label:<20} {count:>6} rows  {created:>6} created  {elapsed:7.2f}s  {count / elapsed:8.0f} rows/s  '
+          f'{probe.summary()}', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=2000, help='عدد الأجهزة')
+    parser.add_argument('--inspections', type=int, default=2000, help='عدد التشييكات في كل جولة')
+    parser.add_argument('--chunk-size', type=int, default=bulk_inspections.INSPECTION_BULK_CHUNK_SIZE,
+                        help='عدد التشييكات في كل دفعة')
+    parser.add_argument('--rounds', type=int, default=3, help='عدد الجولات لكل مسار')
+    args = parser.parse_args()
+    bulk_inspections.INSPECTION_BULK_CHUNK_SIZE = args.chunk_size
+
+    app = create_app(args.devices)
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={
+        'email': 'alisallwe22@gmail.com', 'password': 'admin123'
+    }).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def bulk_create():
+        items = list(generate_round(args.inspections, args.devices))
+        response = client.post('/api/inspections/inspections/bulk-create', json={'inspections': items}, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['total_created']
+
+    def legacy():
+        with app.app_context():
+            admin = User.query.filter_by(email='alisallwe22@gmail.com').first()
+            # المسار القديم يفشل كله إذا رفض SQLite صفاً واحداً، لذلك تُستبدل الملاحظات غير الصالحة بنص فارغ
+            return legacy_bulk(generate_round(args.inspections, args.devices), admin.id)
+
+    for _ in range(args.rounds):
+        measure('legacy per-row', args.inspections, legacy, Probe(app, headers))
+    for _ in range(args.rounds):
+        measure(f'chunked ({args.chunk_size})', args.inspections, bulk_create, Probe(app, headers))
+
+    # العدادات وأعمدة حالة الأجهزة المحدّثة تدريجياً يجب أن تطابق إعادة الحساب الكاملة
+    with app.app_context():
+        stored = {name: value for name, value in read_counters(prefixes=('inspections.',)).items() if value}
+        fresh = {name: value for name, value in compute_counters().items() if name.startswith('inspections.') and value}
+        health = [tuple(getattr(device, column) for column in HEALTH_COLUMNS) for device in Device.query.order_by(Device.id)]
+        repair_device_health()
+        db.session.expire_all()
+        repaired = [tuple(getattr(device, column) for column in HEALTH_COLUMNS) for device in Device.query.order_by(Device.id)]
+    consistent = stored == fresh and health == repaired
+    print(f'{"ok  " if consistent else "FAIL"} dashboard counters and device health match a full recompute')
+    sys.exit(0 if consistent else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""قياس إنتاجية استيراد الأجهزة: المسار القديم (استعلام وكائن ORM لكل صف) مقابل الاستيراد المجمّع
+
+يولّد ملف CSV وملف NDJSON مؤقتين بعدد الصفوف المطلوب (مع نسبة من الأرقام
+التسلسلية المكررة والصفوف الناقصة)، ثم يرفعهما إلى /devices/import كمجرى،
+ويرسل الصفوف نفسها إلى /devices/bulk-create، ويقارن ذلك بالمسار القديم.
+يعرض عدد الصفوف في الثانية، وذروة الذاكرة (tracemalloc) مع --memory لأنها تبطئ القياس.
+المسار القديم أبطأ بكثير (استعلام وكائن ORM لكل صف) لذلك يُقاس على عدد أقل من الصفوف.
+
+الاستخدام:
+    python benchmarks/device_import.py [--rows 10000] [--legacy-rows 2000] [--chunk-size 500] [--memory]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('RATE_LIMIT_DB', os.path.join(tempfile.mkdtemp(), 'ratelimit.db'))
+
+from flask import Flask
+from src.models.user import db, User, Device
+from src.routes.auth import auth_bp
+from src.routes.devices import devices_bp
+from src.services import device_import
+from src.services.dashboard_counters import compute_counters, read_counters
+import src.services.alerts  # noqa: F401 (تسجيل دوال التنبيهات كما في التطبيق)
+import src.services.device_health  # noqa: F401
+
+FIELDS = ('name', 'type', 'location', 'serial_number', 'next_maintenance')
+
+
+def create_app():
+    app = Flask(__name__)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SECRET_KEY'] = os.environ.setdefault('SECRET_KEY', 'device-import-secret')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(devices_bp, url_prefix='/api/devices')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        User.create_admin_user()
+    return app
+
+
+def generate_rows(count, prefix):
+    """صفوف تجريبية: 2% أرقام تسلسلية مكررة و1% صفوف ناقصة"""
+    for i in range(count):
+        yield {
+            'name': f'طفاية حريق {i}',
+            'type': ('extinguisher', 'alarm', 'hose')[i % 3],
+            'location': f'الجناح {i % 12} - الطابق {i % 5}',
+            'serial_number': f'{prefix}-{i - 1 if i % 50 == 49 else i:06d}',
+            'next_maintenance': (date.today() + timedelta(days=i % 90)).isoformat(),
+        } if i % 100 != 99 else {'name': f'ناقص {i}', 'type': '', 'location': ''}
+
+
+def write_files(count, directory):
+    csv_path = os.path.join(directory, 'devices.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as output:
+        writer = csv.DictWriter(output, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(generate_rows(count, 'CSV'))
+    ndjson_path = os.path.join(directory, 'devices.ndjson')
+    with open(ndjson_path, 'w', encoding='utf-8') as output:
+        for row in generate_rows(count, 'ND'):
+            output.write(json.dumps(row, ensure_ascii=False) + '\n')
+    return csv_path, ndjson_path
+
+
+def legacy_import(rows):
+    """المسار السابق لـ bulk-create: استعلام للرقم التسلسلي وكائن ORM لكل صف ثم commit واحد"""
+    created = 0
+    for row in rows:
+        name, device_type, location = row['name'], row['type'], row['location']
+        serial_number = row.get('serial_number', '')
+        if not name or not device_type or not location:
+            continue
+        if serial_number and Device.query.filter_by(serial_number=serial_number).first():
+            continue
+        db.session.add(Device(name=name, type=device_type, location=location,
+                              serial_number=serial_number, status='active'))
+        created += 1
+    db.session.commit()
+    return created
+
+
+def measure(label, count, action, trace_memory):
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    created = action()
+    elapsed = time.perf_counter() - started
+    line = f'{label:<22} {count:>7} rows  {created:>7} created  {elapsed:7.2f}s  {count / elapsed:9.0f} rows/s'
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        line += f'  peak {peak / 1024 / 1024:6.1f} MiB'
+    print(line, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='عدد الصفوف في كل ملف')
+    parser.add_argument('--chunk-size', type=int, default=device_import.DEVICE_IMPORT_CHUNK_SIZE,
+                        help='عدد الصفوف في كل دفعة')
+    parser.add_argument('--legacy-rows', type=int, default=2000, help='عدد الصفوف للمسار القديم (0 للتخطي)')
+    parser.add_argument('--memory', action='store_true', help='قياس ذروة الذاكرة لكل استيراد')
+    args = parser.parse_args()
+    device_import.DEVICE_IMPORT_CHUNK_SIZE = args.chunk_size
+
+    app = create_app()
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={
+        'email': 'alisallwe22@gmail.com', 'password': 'admin123'
+    }).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    csv_path, ndjson_path = write_files(args.rows, tempfile.mkdtemp())
+
+    def upload(path, content_type):
+        def action():
+            with open(path, 'rb') as body:
+                response = client.post('/api/devices/devices/import', input_stream=body,
+                                       content_length=os.path.getsize(path),
+                                       headers={**headers, 'Content-Type': content_type})
+            assert response.status_code == 200, response.get_json()
+            return response.get_json()['total_created']
+        return action
+
+    def bulk_create():
+        rows = list(generate_rows(args.rows, 'JSON'))
+        response = client.post('/api/devices/devices/bulk-create', json={'devices': rows}, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['total_created']
+
+    measure('stream csv', args.rows, upload(csv_path, 'text/csv'), args.memory)
+    measure('stream ndjson', args.rows, upload(ndjson_path, 'application/x-ndjson'), args.memory)
+    measure('bulk-create (json)', args.rows, bulk_create, args.memory)
+    if args.legacy_rows:
+        with app.app_context():
+            measure('legacy per-row', args.legacy_rows,
+                    lambda: legacy_import(generate_rows(args.legacy_rows, 'OLD')), args.memory)
+
+    # العدادات المحدّثة تدريجياً يجب أن تطابق إعادة الحساب الكاملة بعد الاستيراد المجمّع
+    with app.app_context():
+        stored = read_counters(prefixes=('devices.',))
+        fresh = {name: value for name, value in compute_counters().items() if name.startswith('devices.') and value}
+        stored = {name: value for name, value in stored.items() if value}
+    consistent = stored == fresh
+    print(f'{"ok  " if consistent else "FAIL"} dashboard counters match a full recompute')
+    sys.exit(0 if consistent else 1)
+
+
+if __name__ == '__main__':
+    main()
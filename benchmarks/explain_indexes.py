@@ -0,0 +1,166 @@
+"""التحقق من استخدام الفهارس في استعلامات نقاط نهاية القوائم والإحصائيات
+
+يستدعي كل نقطة نهاية على قاعدة بيانات مؤقتة، ويلتقط عبارات SELECT التي تنفذها،
+ثم يعرض EXPLAIN QUERY PLAN لكل منها. ينتهي برمز خروج 1 إذا وُجد مسح كامل
+لجدول من الجداول الكبيرة دون فهرس.
+
+الاستخدام:
+    python benchmarks/explain_indexes.py [--verbose]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('RATE_LIMIT_DB', os.path.join(tempfile.mkdtemp(), 'ratelimit.db'))
+
+from flask import Flask
+from sqlalchemy import event
+from src.models.user import db, User, Device, Inspection, MaintenanceTask
+from src.routes.auth import auth_bp
+from src.routes.dashboard import dashboard_bp
+from src.routes.devices import devices_bp
+from src.routes.inspections import inspections_bp
+from src.routes.locations import locations_bp
+from src.routes.maintenance import maintenance_bp
+from src.services.locations import assign_location, create_location
+
+HOT_TABLES = ('inspection', 'maintenance_task', 'device', 'activity_log')
+
+ENDPOINTS = [
+    '/api/dashboard/stats',
+    '/api/dashboard/summary',
+    '/api/dashboard/activity',
+    '/api/dashboard/activity?type=inspection',
+    '/api/dashboard/activity?user_id=1',
+    '/api/dashboard/alerts',
+    '/api/dashboard/charts/inspections',
+    '/api/dashboard/charts/maintenance',
+    '/api/inspections/inspections',
+    '/api/inspections/inspections?status=danger',
+    '/api/inspections/inspections?device_id=1',
+    '/api/inspections/inspections?inspector_id=1',
+    '/api/inspections/inspections?date_from=2024-01-01&date_to=2024-01-31',
+    '/api/inspections/inspections/stats',
+    '/api/inspections/inspections?cursor=',
+    '/api/inspections/inspections?cursor=&status=danger',
+    '/api/maintenance/maintenance',
+    '/api/maintenance/maintenance?status=pending',
+    '/api/maintenance/maintenance?device_id=1',
+    '/api/maintenance/maintenance?assigned_user_id=1&status=pending',
+    '/api/maintenance/maintenance?date_from=2024-01-01&date_to=2024-01-31',
+    '/api/maintenance/maintenance/stats',
+    '/api/maintenance/maintenance?cursor=&status=pending',
+    '/api/maintenance/maintenance/schedule',
+    '/api/devices/devices',
+    '/api/devices/devices?status=active&type=alarm',
+    '/api/devices/devices?search=Device%201',
+    '/api/devices/devices?location_id=2',
+    '/api/devices/devices?location=Building%20A%20/%20Floor%201',
+    '/api/devices/devices/stats',
+    '/api/devices/scan/SN-0003',
+    '/api/devices/devices/3',
+    '/api/devices/devices/3/inspections?limit=2',
+    '/api/devices/devices/3/maintenance?limit=2',
+    '/api/locations/locations',
+    '/api/locations/locations/2',
+]
+
+# عمليات مسح مقبولة: تجميع كامل مقصود أو بحث نصي يعالج لاحقاً
+ALLOWED_SCANS = (
+    re.compile(r'LIKE', re.IGNORECASE),
+    # عدّ صفوف القائمة بدون أي فلتر يقرأ الجدول كاملاً بطبيعته
+    re.compile(r'^SELECT count\(\*\) AS count_1\s+FROM \((?:(?!WHERE).)*\) AS anon_1\s*$', re.IGNORECASE | re.DOTALL),
+    # صفحة بدون فلتر مع العدد الكلي عبر count(*) OVER () تقرأ الجدول كاملاً مثل العدّ
+    re.compile(r'count\(\*\) OVER \(\)(?:(?!WHERE).)*$', re.IGNORECASE | re.DOTALL),
+)
+
+
+def create_app():
+    app = Flask(__name__)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SECRET_KEY'] = os.environ.setdefault('SECRET_KEY', 'explain-secret')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(devices_bp, url_prefix='/api/devices')
+    app.register_blueprint(inspections_bp, url_prefix='/api/inspections')
+    app.register_blueprint(maintenance_bp, url_prefix='/api/maintenance')
+    app.register_blueprint(locations_bp, url_prefix='/api/locations')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        admin = User.create_admin_user()
+        now = datetime.utcnow()
+        building = create_location('Building A', 'building')
+        floors = [create_location(f'Floor {i}', 'floor', building) for i in range(3)]
+        for i in range(20):
+            device = Device(name=f'Device {i}', type='alarm', location=f'Floor {i % 3}', status='active',
+                            serial_number=f'SN-{i:04d}', next_maintenance=date.today() + timedelta(days=i))
+            assign_location(device, floors[i % 3])
+            db.session.add(device)
+            db.session.flush()
+            db.session.add(Inspection(device_id=device.id, inspector_id=admin.id, status='danger',
+                                      inspection_date=now - timedelta(hours=i)))
+            db.session.add(MaintenanceTask(device_id=device.id, assigned_user_id=admin.id, title=f'Task {i}',
+                                           scheduled_date=now - timedelta(days=i)))
+        # بدون ANALYZE: مع بيانات قليلة يفضّل المخطط المسح الكامل، بينما نريد
+        # خطة الاستعلام كما ستكون على جداول كبيرة
+        db.session.commit()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true', help='عرض خطة كل استعلام')
+    args = parser.parse_args()
+
+    app = create_app()
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={
+        'email': 'alisallwe22@gmail.com', 'password': 'admin123'
+    }).get_json()['token']
+
+    captured = []
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            captured.append((statement, parameters))
+
+    failures = 0
+    for url in ENDPOINTS:
+        captured.clear()
+        response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+        statements = list(captured)
+        print(f'{response.status_code} {url} ({len(statements)} queries)')
+
+        with engine.connect() as connection:
+            for statement, parameters in statements:
+                plan = [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+                scans = [
+                    line for line in plan
+                    if re.match(rf'SCAN ({"|".join(HOT_TABLES)})\b', line) and 'INDEX' not in line
+                ]
+                if scans and any(pattern.search(statement) for pattern in ALLOWED_SCANS):
+                    scans = []
+                if scans:
+                    failures += 1
+                    print(f'    FULL SCAN: {", ".join(scans)}')
+                    print(f'    {" ".join(statement.split())[:300]}')
+                if args.verbose:
+                    for line in plan:
+                        print(f'      {line}')
+
+    print(f'\n{failures} statements scan a hot table without an index')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
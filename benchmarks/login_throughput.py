@@ -0,0 +1,86 @@
+"""قياس إنتاجية تسجيل الدخول مقابل عدد عمليات مجمع تشفير كلمات المرور
+
+الاستخدام:
+    python benchmarks/login_throughput.py --logins 200 --concurrency 32 --workers 0 1 2 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# حدود معدل الدخول تقيس شيئاً آخر: كل المحاولات هنا من عنوان واحد
+os.environ.setdefault('RATE_LIMIT_DB', os.path.join(tempfile.mkdtemp(), 'ratelimit.db'))
+os.environ.setdefault('LOGIN_IP_CAPACITY', '1000000')
+os.environ.setdefault('LOGIN_EMAIL_CAPACITY', '1000000')
+
+from flask import Flask
+from src.models import user as user_models
+from src.models.user import db, User
+from src.routes.auth import auth_bp
+from src.services.password_hasher import PasswordHasher
+
+
+def create_app(users_count):
+    app = Flask(__name__)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed = User(email='seed@example.com', name='seed')
+        seed.set_password('password123')
+        for i in range(users_count):
+            db.session.add(User(
+                email=f'inspector{i}@example.com',
+                name=f'Inspector {i}',
+                password_hash=seed.password_hash,
+                is_active=True
+            ))
+        db.session.commit()
+    return app
+
+
+def run(app, logins, concurrency, users_count):
+    def login(i):
+        client = app.test_client()
+        response = client.post('/api/auth/login', json={
+            'email': f'inspector{i % users_count}@example.com',
+            'password': 'password123'
+        })
+        return response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    return elapsed, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4, os.cpu_count() or 2])
+    parser.add_argument('--max-pending', type=int, default=None)
+    args = parser.parse_args()
+
+    app = create_app(args.users)
+
+    print(f"{'workers':>8} {'logins/s':>10} {'ok':>6} {'503':>6} {'elapsed':>9}")
+    for workers in args.workers:
+        max_pending = args.max_pending or max(workers, 1) * 4
+        user_models.password_hasher = PasswordHasher(workers=workers, max_pending=max_pending)
+        elapsed, statuses = run(app, args.logins, args.concurrency, args.users)
+        ok = statuses.count(200)
+        busy = statuses.count(503)
+        print(f"{workers:>8} {ok / elapsed:>10.1f} {ok:>6} {busy:>6} {elapsed:>8.2f}s")
+
+
+if __name__ == '__main__':
+    main()
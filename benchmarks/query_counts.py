@@ -0,0 +1,128 @@
+"""التحقق من عدد الاستعلامات لكل طلب في نقاط النهاية المعرضة لمشكلة N+1
+
+يملأ قاعدة بيانات مؤقتة بعدد كافٍ من الأجهزة والتشييكات والمهام، ثم يستدعي كل
+نقطة نهاية ويعد عبارات SQL التي تنفذها. ينتهي برمز خروج 1 إذا تجاوزت أي نقطة
+نهاية الحد المسموح لها، لأن الزيادة تعني عادة استعلاماً لكل صف.
+
+الحدود تشمل استعلام إصدارات الجداول الخاص بـ ETag.
+
+الاستخدام:
+    python benchmarks/query_counts.py [--devices 120] [--verbose]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('RATE_LIMIT_DB', os.path.join(tempfile.mkdtemp(), 'ratelimit.db'))
+
+from flask import Flask
+from sqlalchemy import event
+from src.models.user import db, User, Device, Inspection, MaintenanceTask
+from src.routes.auth import auth_bp
+from src.routes.dashboard import dashboard_bp
+from src.routes.devices import devices_bp
+from src.routes.inspections import inspections_bp
+from src.services.dashboard_counters import rebuild_counters
+from src.services.device_health import repair_device_health
+from src.services.response_cache import response_cache
+
+# نقطة النهاية -> الحد الأقصى لعدد الاستعلامات
+BUDGETS = {
+    '/api/devices/devices?per_page=100': 2,
+    '/api/devices/devices?per_page=100&page=2': 2,
+    '/api/devices/devices?status=active&per_page=50': 2,
+    # مسح متكرر دون خيط التحقق من الإصدارات: استعلام إصدارات الجهاز فقط
+    '/api/devices/scan/SN-0003': 1,
+    # الجهاز ثم آخر التشييكات والمهام مع أسماء المستخدمين في نفس الاستعلامين
+    '/api/devices/devices/3': 4,
+    '/api/devices/devices/3/inspections?limit=2': 2,
+    '/api/devices/devices/3/maintenance?limit=2': 2,
+    # التصفح بالمؤشر: صفحة واحدة دون COUNT، والعدد الكلي من الذاكرة المؤقتة
+    '/api/inspections/inspections?cursor=&per_page=50': 2,
+    '/api/inspections/inspections?cursor=&per_page=50&include_total=true': 2,
+    # إصدارات الجداول ثم العدادات وآخر التشييكات والمهام العاجلة، دون الاستجابة المخزنة
+    '/api/dashboard/stats': 4,
+}
+
+# نقاط نهاية تُقاس دون ذاكرة الاستجابات المؤقتة حتى يُحسب عمل المعالج نفسه
+UNCACHED = {'/api/dashboard/stats'}
+
+
+def create_app(devices_count):
+    app = Flask(__name__)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SECRET_KEY'] = os.environ.setdefault('SECRET_KEY', 'query-counts-secret')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(devices_bp, url_prefix='/api/devices')
+    app.register_blueprint(inspections_bp, url_prefix='/api/inspections')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        admin = User.create_admin_user()
+        now = datetime.utcnow()
+        for i in range(devices_count):
+            device = Device(name=f'Device {i:04d}', type='alarm', location=f'Floor {i % 5}',
+                            serial_number=f'SN-{i:04d}', status='active' if i % 4 else 'inactive',
+                            next_maintenance=date.today() + timedelta(days=i % 40))
+            db.session.add(device)
+            db.session.flush()
+            for j in range(3):
+                db.session.add(Inspection(device_id=device.id, inspector_id=admin.id, status='good',
+                                          inspection_date=now - timedelta(days=j, hours=i)))
+                db.session.add(MaintenanceTask(device_id=device.id, assigned_user_id=admin.id, title=f'Task {i}-{j}',
+                                               status='pending' if j else 'completed',
+                                               scheduled_date=now + timedelta(days=j)))
+        db.session.commit()
+        repair_device_health()
+        rebuild_counters()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=120, help='عدد الأجهزة في البيانات التجريبية')
+    parser.add_argument('--verbose', action='store_true', help='عرض الاستعلامات المنفذة')
+    args = parser.parse_args()
+
+    app = create_app(args.devices)
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={
+        'email': 'alisallwe22@gmail.com', 'password': 'admin123'
+    }).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    captured = []
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    failures = 0
+    for url, budget in BUDGETS.items():
+        # الطلب الأول يحمّل إصدارات الرموز، ونقيس الطلب الثاني
+        client.get(url, headers=headers)
+        if url in UNCACHED:
+            response_cache.clear()
+        captured.clear()
+        response = client.get(url, headers=headers)
+        count = len(captured)
+        ok = response.status_code == 200 and count <= budget
+        failures += not ok
+        print(f'{"ok  " if ok else "FAIL"} {response.status_code} {url}: {count} queries (budget {budget})')
+        if args.verbose or not ok:
+            for statement in captured:
+                print(f'      {" ".join(statement.split())[:160]}')
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""قياس زمن مسح ملصقات الأجهزة (/api/devices/scan/<code>) تحت تزامن جولات التفتيش
+
+يُنشئ أجهزة بتشييكات ومهام صيانة، ثم يشغّل عدة مفتشين متزامنين يمسح كل منهم
+ملصقات من جناحه ويسجل تشييكاً لنسبة من الأجهزة (كتابات تُبطل القيم المخزنة
+لتلك الأجهزة فقط ويعيد device_scan_warmer بناءها في الخلفية). يعرض p50 و p95
+و p99 ونسبة الإصابة، ويقارنها بالمسار السابق: البحث بالرقم التسلسلي ثم تفاصيل
+الجهاز ثم قوالب التشييك.
+يخرج برمز 1 إذا تجاوز p99 الحد المطلوب.
+
+الاستخدام:
+    python benchmarks/scan_latency.py [--devices 5000] [--scans 2000] [--concurrency 8] [--think-ms 50]
+                                      [--write-ratio 0.1] [--target-ms 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('RATE_LIMIT_DB', os.path.join(tempfile.mkdtemp(), 'ratelimit.db'))
+
+from flask import Flask
+from sqlalchemy import insert
+from src.models.user import db, User, Device, Inspection, MaintenanceTask
+from src.routes.auth import auth_bp
+from src.routes.devices import devices_bp
+from src.routes.inspections import inspections_bp
+from src.services.device_health import repair_device_health
+from src.services.device_scan import device_scan_cache, device_scan_warmer
+
+DEVICE_TYPES = ('fire_extinguisher', 'smoke_detector', 'fire_alarm', 'emergency_exit', 'fire_hose')
+
+
+def create_app(devices):
+    app = Flask(__name__)
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SECRET_KEY'] = os.environ.setdefault('SECRET_KEY', 'scan-latency-secret')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(devices_bp, url_prefix='/api/devices')
+    app.register_blueprint(inspections_bp, url_prefix='/api/inspections')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        admin = User.create_admin_user()
+        seed(devices, admin.id)
+    return app
+
+
+def seed(count, inspector_id):
+    """أجهزة في 20 جناحاً، ولكل جهاز ثلاثة تشييكات ومهمة صيانة لثلثها"""
+    rnd = random.Random(22)
+    now = datetime.utcnow()
+    db.session.execute(insert(Device), [{
+        'name': f'جهاز {i}',
+        'type': DEVICE_TYPES[i % len(DEVICE_TYPES)],
+        'location': f'الجناح {i % 20}',
+        'serial_number': f'SN-{i:06d}',
+        'next_maintenance': date.today() + timedelta(days=rnd.randint(-10, 90)),
+        'status': 'active',
+        'created_at': now
+    } for i in range(count)])
+    device_ids = list(range(1, count + 1))
+    db.session.execute(insert(Inspection), [{
+        'device_id': device_id,
+        'inspector_id': inspector_id,
+        'inspection_date': now - timedelta(days=rnd.randint(1, 90)),
+        'status': rnd.choice(('good', 'warning', 'danger')),
+        'created_at': now
+    } for device_id in device_ids for _ in range(3)])
+    db.session.execute(insert(MaintenanceTask), [{
+        'device_id': device_id,
+        'assigned_user_id': inspector_id,
+        'title': f'صيانة دورية {device_id}',
+        'priority': rnd.choice(('low', 'medium', 'high')),
+        'status': 'pending',
+        'scheduled_date': now + timedelta(days=rnd.randint(0, 30)),
+        'created_at': now,
+        'updated_at': now
+    } for device_id in device_ids if device_id % 3 == 0])
+    db.session.commit()
+    repair_device_health()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+def run(app, headers, args, scan):
+    """مفتشون متزامنون، كل منهم في جناح واحد يمسح أجهزته بترتيب عشوائي"""
+    latencies = []
+    lock = threading.Lock()
+
+    def inspector(number):
+        rnd = random.Random(number)
+        client = app.test_client()
+        ward = [i for i in range(args.devices) if i % 20 == number % 20]
+        samples = []
+        for _ in range(args.scans // args.concurrency):
+            index = rnd.choice(ward)
+            started = time.perf_counter()
+            device_id = scan(client, f'SN-{index:06d}')
+            samples.append(time.perf_counter() - started)
+            time.sleep(rnd.uniform(0, 2 * args.think_ms) / 1000)
+            if rnd.random() < args.write_ratio:
+                response = client.post('/api/inspections/inspections', headers=headers, json={
+                    'device_id': device_id, 'status': 'good', 'notes': 'جولة'
+                })
+                assert response.status_code == 201, response.get_json()
+        with lock:
+            latencies.extend(samples)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(inspector, range(args.concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--devices', type=int, default=5000, help='عدد الأجهزة')
+    parser.add_argument('--scans', type=int, default=2000, help='عدد عمليات المسح لكل مسار')
+    parser.add_argument('--concurrency', type=int, default=8, help='عدد المفتشين المتزامنين')
+    parser.add_argument('--think-ms', type=float, default=50.0, help='متوسط الانتظار بين مسحتين لكل مفتش')
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='نسبة المسحات التي يتبعها تسجيل تشييك')
+    parser.add_argument('--target-ms', type=float, default=20.0, help='الحد الأعلى المطلوب لـ p99')
+    args = parser.parse_args()
+
+    app = create_app(args.devices)
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={
+        'email': 'alisallwe22@gmail.com', 'password': 'admin123'
+    }).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # كما يفعل device_scan_warmer عند تشغيل التطبيق
+    with app.app_context():
+        started = time.perf_counter()
+        warmed = device_scan_cache.warm()
+        print(f'warmed {warmed} devices in {time.perf_counter() - started:.2f}s')
+    device_scan_warmer.start(app)
+
+    def scan(client, code):
+        response = client.get(f'/api/devices/scan/{code}', headers=headers)
+        assert response.status_code == 200, response.status_code
+        return response.get_json()['device']['id']
+
+    def legacy_scan(client, code):
+        found = client.get(f'/api/devices/devices?search={code}', headers=headers).get_json()['devices']
+        device_id = next(device['id'] for device in found if device['serial_number'] == code)
+        client.get(f'/api/devices/devices/{device_id}', headers=headers)
+        client.get('/api/inspections/templates', headers=headers)
+        return device_id
+
+    print(f"{'path':<18} {'scans':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'scans/s':>9}")
+    results = {}
+    for label, action in (('legacy (3 calls)', legacy_scan), ('scan', scan)):
+        latencies, elapsed = run(app, headers, args, action)
+        results[label] = percentile(latencies, 0.99)
+        print(f'{label:<18} {len(latencies):>6} {percentile(latencies, 0.5):>8.2f} '
+              f'{percentile(latencies, 0.95):>8.2f} {results[label]:>8.2f} {len(latencies) / elapsed:>9.0f}')
+
+    stats = device_scan_cache.stats()
+    print(f"cache: {stats['size']} entries, hit rate {stats['hit_rate']}%")
+    ok = results['scan'] <= args.target_ms
+    print(f'{"ok  " if ok else "FAIL"} scan p99 {results["scan"]:.2f} ms (target {args.target_ms:g} ms)')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
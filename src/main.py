@@ -1,11 +1,14 @@
 import os
 import sys
+import threading
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from src.models.user import db, User
+from src.models.schema import upgrade_schema
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.users import users_bp
@@ -17,10 +20,26 @@ from src.routes.canva import canva_bp
 from src.routes.inspections import inspections_bp
 from src.routes.maintenance import maintenance_bp
 from src.routes.devices import devices_bp
+from src.routes.locations import locations_bp
+from src.services.login_writes import login_writes
+from src.services.session_reaper import session_reaper
+from src.services.dashboard_counters import dashboard_counters, reconcile_dashboard_counters_command
+from src.services.alerts import alerts_sweeper
+from src.services.rollups import init_rollups, backfill_rollups_command
+from src.services.activity_log import init_activity_log
+from src.services.device_health import device_health_repair, init_device_health, repair_device_health_command
+from src.services.device_search import init_device_search
+from src.services.device_scan import device_scan_warmer
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'hospital_fire_safety_secret_key_2024'
 
+# عدد الوكلاء العكسيين الموثوقين أمام التطبيق (0 عند التشغيل المباشر)
+# بدونه يكون request.remote_addr عنوان الوكيل، فيشترك كل المستخدمين في حد معدل IP واحد
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
+
 # تفعيل CORS للسماح بالطلبات من جميع المصادر
 CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"])
 
@@ -36,6 +55,7 @@ app.register_blueprint(canva_bp, url_prefix='/api/canva')
 app.register_blueprint(inspections_bp, url_prefix='/api/inspections')
 app.register_blueprint(maintenance_bp, url_prefix='/api/maintenance')
 app.register_blueprint(devices_bp, url_prefix='/api/devices')
+app.register_blueprint(locations_bp, url_prefix='/api/locations')
 
 # إعداد قاعدة البيانات
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
@@ -45,12 +65,58 @@ db.init_app(app)
 # إنشاء الجداول والبيانات الأولية
 with app.app_context():
     db.create_all()
+    added_columns = upgrade_schema()
     
     # إنشاء المستخدم المدير الافتراضي
     admin_user = User.create_admin_user()
     if admin_user:
         print(f"Admin user created/verified: {admin_user.email}")
 
+# عدادات لوحة التحكم المحدّثة تدريجياً
+dashboard_counters.init_app(app)
+app.cli.add_command(reconcile_dashboard_counters_command)
+
+# جداول تجميع المخططات
+init_rollups(app)
+app.cli.add_command(backfill_rollups_command)
+
+# سجل النشاطات
+init_activity_log(app)
+
+# أعمدة حالة الأجهزة (آخر تشييك وعدد المهام المعلقة): تُملأ عند إضافتها فقط ثم تُصلح دورياً
+init_device_health(app, added_columns)
+app.cli.add_command(repair_device_health_command)
+
+# فهرس البحث النصي للأجهزة
+init_device_search(app)
+
+# المهام الخلفية تبدأ في العملية التي تخدم الطلبات فقط، وليس عند الاستيراد:
+# عملية المراقبة في وضع debug وأوامر flask لا تستقبل طلبات فلا تبدأ فيها خيوط
+_background_lock = threading.Lock()
+_background_started = False
+
+@app.before_request
+def start_background_tasks():
+    global _background_started
+    if _background_started:
+        return
+    with _background_lock:
+        if _background_started:
+            return
+        # تفريغ عمليات الكتابة المجمّعة لتسجيل الدخول في الخلفية
+        login_writes.init_app(app)
+        # حذف جلسات التذكر المنتهية بشكل دوري
+        session_reaper.start(app)
+        dashboard_counters.start(app)
+        # تحديث التنبيهات المرتبطة بالوقت (أول تحديث يعمل في الخلفية مباشرة)
+        alerts_sweeper.start(app)
+        alerts_sweeper.trigger()
+        device_health_repair.start(app)
+        # ذاكرة مسح ملصقات الأجهزة: تُسخّن في الخلفية
+        device_scan_warmer.start(app)
+        device_scan_warmer.trigger()
+        _background_started = True
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
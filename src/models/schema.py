@@ -0,0 +1,73 @@
+from flask import current_app
+from sqlalchemy import func, inspect, select, text
+from src.models.user import db
+
+# تصحيح بيانات قديمة قبل إنشاء الفهارس الجديدة عليها
+DATA_FIXES = {
+    # كانت الأجهزة بدون رقم تسلسلي تُحفظ بنص فارغ، والفهرس الفريد يسمح بتكرار NULL فقط
+    'device': ("UPDATE device SET serial_number = NULL WHERE serial_number = ''",),
+    # إصدارات بيانات المسح لأجهزة حُذفت قبل أن تُحذف صفوفها مع الجهاز
+    'table_versions': (
+        "DELETE FROM table_versions WHERE table_name GLOB 'device_scan.*' "
+        "AND substr(table_name, 13) NOT IN (SELECT CAST(id AS TEXT) FROM device)",
+    ),
+}
+
+
+def _sql_literal(value):
+    """تحويل قيمة افتراضية بسيطة إلى نص SQL"""
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _has_duplicates(connection, index):
+    """هل توجد قيم مكررة تمنع إنشاء الفهرس الفريد"""
+    columns = list(index.columns)
+    duplicates = select(*columns).where(*(column.isnot(None) for column in columns)).group_by(
+        *columns
+    ).having(func.count() > 1).limit(1)
+    return connection.execute(duplicates).first() is not None
+
+
+def upgrade_schema():
+    """ترقية قاعدة بيانات موجودة لتطابق النماذج الحالية
+
+    db.create_all() ينشئ الجداول الجديدة فقط، لذلك نضيف هنا الأعمدة
+    والفهارس الجديدة إلى الجداول الموجودة مسبقاً. يعيد الأعمدة المضافة
+    بصيغة "الجدول.العمود" حتى تُملأ البيانات المشتقة منها مرة واحدة فقط.
+    """
+    added = set()
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=connection.dialect)}'
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f' DEFAULT {_sql_literal(column.default.arg)}'
+                connection.execute(text(ddl))
+                added.add(f'{table.name}.{column.name}')
+
+            for statement in DATA_FIXES.get(table.name, ()):
+                connection.execute(text(statement))
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if index.unique and _has_duplicates(connection, index):
+                    current_app.logger.warning(
+                        f"Skipping unique index {index.name}: duplicate values in {table.name}"
+                    )
+                    continue
+                index.create(connection)
+    return added
@@ -1,5 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.services.password_hasher import password_hasher
 from datetime import datetime
 import jwt
 import os
@@ -20,6 +20,7 @@ class User(db.Model):
     reset_token = db.Column(db.String(255))
     reset_token_expires = db.Column(db.DateTime)
     last_login = db.Column(db.DateTime)
+    token_version = db.Column(db.Integer, default=0)  # يزداد عند تغيير الدور أو الحالة أو كلمة المرور
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -33,32 +34,42 @@ class User(db.Model):
 
     def set_password(self, password):
         """تعيين كلمة مرور مشفرة"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         """التحقق من كلمة المرور"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     def generate_token(self, expires_in=3600):
         """إنشاء رمز JWT للمصادقة"""
         payload = {
             'user_id': self.id,
             'email': self.email,
+            'role': self.role,
+            'is_active': self.is_active,
+            'ver': self.token_version or 0,
             'exp': datetime.utcnow().timestamp() + expires_in
         }
         return jwt.encode(payload, os.environ.get('SECRET_KEY', 'default-secret'), algorithm='HS256')
 
     @staticmethod
-    def verify_token(token):
-        """التحقق من صحة الرمز المميز"""
+    def decode_token(token):
+        """فك تشفير الرمز المميز والتحقق من توقيعه وصلاحيته"""
         try:
-            payload = jwt.decode(token, os.environ.get('SECRET_KEY', 'default-secret'), algorithms=['HS256'])
-            return User.query.get(payload['user_id'])
+            return jwt.decode(token, os.environ.get('SECRET_KEY', 'default-secret'), algorithms=['HS256'])
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
 
+    @staticmethod
+    def verify_token(token):
+        """التحقق من صحة الرمز المميز"""
+        payload = User.decode_token(token)
+        if not payload:
+            return None
+        return User.query.get(payload['user_id'])
+
     def generate_verification_token(self):
         """إنشاء رمز التحقق من البريد الإلكتروني"""
         payload = {
@@ -90,6 +101,29 @@ class User(db.Model):
             pass
         return None
 
+    @staticmethod
+    def generate_stream_ticket(user_id, token_version, session_exp, expires_in):
+        """إنشاء تذكرة قصيرة العمر لفتح بث لوحة التحكم بدل وضع الرمز المميز في الرابط"""
+        payload = {
+            'user_id': user_id,
+            'ver': token_version,
+            'action': 'dashboard_stream',
+            'session_exp': session_exp,  # البث ينتهي مع انتهاء صلاحية الرمز المميز الأصلي
+            'exp': min(datetime.utcnow().timestamp() + expires_in, session_exp)
+        }
+        return jwt.encode(payload, os.environ.get('SECRET_KEY', 'default-secret'), algorithm='HS256')
+
+    @staticmethod
+    def verify_stream_ticket(ticket):
+        """التحقق من تذكرة البث وإرجاع مطالباتها"""
+        try:
+            payload = jwt.decode(ticket, os.environ.get('SECRET_KEY', 'default-secret'), algorithms=['HS256'])
+            if payload.get('action') == 'dashboard_stream':
+                return payload
+        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+            pass
+        return None
+
     def update_last_login(self):
         """تحديث وقت آخر تسجيل دخول"""
         self.last_login = datetime.utcnow()
@@ -157,11 +191,11 @@ class User(db.Model):
 class UserSession(db.Model):
     """جدول جلسات المستخدمين للتذكر"""
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     session_token = db.Column(db.String(255), unique=True, nullable=False)
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.Text)
-    expires_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref='sessions')
@@ -227,6 +261,34 @@ class Inspection(db.Model):
     images = db.Column(db.Text)  # JSON string للصور
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # فهارس مطابقة لأشكال الاستعلامات الفعلية (التصفية ثم الترتيب بالتاريخ)
+    __table_args__ = (
+        db.Index('ix_inspection_inspection_date', 'inspection_date'),
+        db.Index('ix_inspection_device_date', 'device_id', 'inspection_date'),
+        db.Index('ix_inspection_status_date', 'status', 'inspection_date'),
+        db.Index('ix_inspection_inspector_date', 'inspector_id', 'inspection_date'),
+    )
+
+
+class Location(db.Model):
+    """المواقع الهرمية: مبنى ← طابق ← منطقة ← غرفة
+
+    path مسار المعرفات من الجذر مثل /1/4/9/، فتكون جميع المواقع والأجهزة
+    داخل موقع ما نطاقاً متصلاً في الفهرس (src/services/locations.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # building, floor, zone, room
+    parent_id = db.Column(db.Integer, db.ForeignKey('location.id'))
+    path = db.Column(db.String(255), nullable=False, default='')
+    full_name = db.Column(db.String(255), nullable=False, default='')  # مثل: المبنى الرئيسي / الطابق 3
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_location_path', 'path'),
+        db.Index('ix_location_parent_name', 'parent_id', 'name'),
+    )
+
 
 class Device(db.Model):
     """جدول الأجهزة"""
@@ -234,13 +296,35 @@ class Device(db.Model):
     name = db.Column(db.String(100), nullable=False)
     type = db.Column(db.String(50), nullable=False)
     location = db.Column(db.String(100), nullable=False)
-    serial_number = db.Column(db.String(100))
+    serial_number = db.Column(db.String(100))  # NULL عند عدم وجوده، فالفهرس الفريد يسمح بتكرار NULL فقط
     installation_date = db.Column(db.Date)
     last_maintenance = db.Column(db.Date)
     next_maintenance = db.Column(db.Date)
     status = db.Column(db.String(20), default='active')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # الموقع في الهرمية، و location_path نسخة من Location.path للتصفية بنطاق في الفهرس
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'))
+    location_path = db.Column(db.String(255))
+    
+    # حالة الجهاز من الجداول الفرعية، تُحدّث مع كل كتابة (src/services/device_health.py)
+    last_inspection_id = db.Column(db.Integer)
+    last_inspection_date = db.Column(db.DateTime)
+    last_inspection_status = db.Column(db.String(20))
+    last_inspector_id = db.Column(db.Integer)
+    last_inspector_name = db.Column(db.String(100))
+    pending_tasks_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_device_status_type', 'status', 'type'),
+        db.Index('ix_device_status_next_maintenance', 'status', 'next_maintenance'),
+        db.Index('ix_device_status_location', 'status', 'location'),
+        db.Index('ix_device_location', 'location'),
+        db.Index('ix_device_location_path', 'location_path'),
+        db.Index('ix_device_name', 'name'),
+        db.Index('ix_device_serial_number', 'serial_number', unique=True),
+    )
+    
     inspections = db.relationship('Inspection', backref='device', lazy=True)
     maintenance_tasks = db.relationship('MaintenanceTask', backref='device', lazy=True)
 
@@ -260,6 +344,16 @@ class MaintenanceTask(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_maintenance_task_scheduled_date', 'scheduled_date'),
+        db.Index('ix_maintenance_task_status_scheduled', 'status', 'scheduled_date'),
+        db.Index('ix_maintenance_task_device_scheduled', 'device_id', 'scheduled_date'),
+        db.Index('ix_maintenance_task_assigned_status', 'assigned_user_id', 'status'),
+        db.Index('ix_maintenance_task_priority_status_scheduled', 'priority', 'status', 'scheduled_date'),
+        db.Index('ix_maintenance_task_created_at', 'created_at'),
+        db.Index('ix_maintenance_task_updated_at', 'updated_at'),
+    )
+
 
 class UploadedFile(db.Model):
     """جدول الملفات المرفوعة"""
@@ -326,3 +420,78 @@ class AutoSaveData(db.Model):
             'timestamp': self.timestamp.isoformat()
         }
 
+
+
+class DashboardCounter(db.Model):
+    """عدادات لوحة التحكم المحدّثة تدريجياً مع كل عملية كتابة"""
+    __tablename__ = 'dashboard_counters'
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Alert(db.Model):
+    """التنبيهات النشطة، تُحدّث عند الكتابة وبشكل دوري للتغيرات المرتبطة بالوقت"""
+    __tablename__ = 'alerts'
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(30), nullable=False)  # overdue_maintenance, upcoming_maintenance, danger_inspection
+    source_id = db.Column(db.Integer, nullable=False)  # معرف المهمة أو الجهاز أو التشييك
+    device_id = db.Column(db.Integer, index=True)
+    device_name = db.Column(db.String(100))
+    subject = db.Column(db.String(200))  # عنوان مهمة الصيانة
+    severity = db.Column(db.String(20), nullable=False)  # critical, high, medium, low
+    severity_rank = db.Column(db.Integer, nullable=False)  # 0 للأعلى أهمية
+    timestamp = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('type', 'source_id', name='uq_alerts_type_source'),
+        db.Index('ix_alerts_severity_timestamp', 'severity_rank', 'timestamp', 'id'),
+    )
+
+
+class InspectionDailyRollup(db.Model):
+    """تجميع يومي لعدد التشييكات حسب الحالة"""
+    __tablename__ = 'inspection_daily_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class MaintenanceMonthlyRollup(db.Model):
+    """تجميع شهري لمهام الصيانة حسب الحالة والأولوية (حسب تاريخ الإنشاء)"""
+    __tablename__ = 'maintenance_monthly_rollup'
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    priority = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ActivityLog(db.Model):
+    """سجل النشاطات (إضافة فقط)، يُكتب في معاملة العملية نفسها"""
+    __tablename__ = 'activity_log'
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(20), nullable=False)  # inspection, maintenance, file, user
+    action = db.Column(db.String(20), nullable=False)  # created, updated, deleted
+    source_id = db.Column(db.Integer, nullable=False)  # معرف التشييك أو المهمة أو الملف أو المستخدم
+    user_id = db.Column(db.Integer)  # المستخدم المرتبط بالنشاط
+    user_name = db.Column(db.String(100))
+    device_id = db.Column(db.Integer)
+    device_name = db.Column(db.String(100))
+    subject = db.Column(db.String(255))  # عنوان المهمة أو اسم الملف
+    status = db.Column(db.String(20))
+    priority = db.Column(db.String(20))
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_activity_log_timestamp', 'timestamp', 'id'),
+        db.Index('ix_activity_log_type_timestamp', 'type', 'timestamp', 'id'),
+        db.Index('ix_activity_log_user_timestamp', 'user_id', 'timestamp', 'id'),
+    )
+
+
+class TableVersion(db.Model):
+    """رقم إصدار متزايد لكل جدول، يزداد مع كل تغيير ويُستخدم لبناء ETag"""
+    __tablename__ = 'table_versions'
+    table_name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -1,6 +1,11 @@
 from flask import Blueprint, jsonify, request, current_app
-from werkzeug.security import check_password_hash
 from src.models.user import User, UserSession, UserProfile, db
+from src.services.token_cache import CachedUser, token_cache, invalidate_user_tokens
+from src.services.token_revocation import token_versions, bump_token_version, revoke_sessions
+from src.services.password_hasher import password_hasher, HasherBusy
+from src.services.login_writes import login_writes, LoginWritesBusy
+from src.services.rate_limiter import login_rate_limiter
+from src.services.table_versions import conditional_response
 from datetime import datetime, timedelta
 import secrets
 import re
@@ -19,8 +24,42 @@ def validate_password(password):
         return False, "كلمة المرور يجب أن تكون 6 أحرف على الأقل"
     return True, "كلمة مرور صالحة"
 
-def token_required(f):
-    """ديكوريتر للتحقق من الرمز المميز"""
+def hasher_busy_response(error):
+    """استجابة سريعة عند امتلاء قائمة انتظار تشفير كلمات المرور أو قائمة كتابة تسجيل الدخول"""
+    response = jsonify({'message': 'الخادم مشغول حالياً، يرجى المحاولة بعد قليل'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def rate_limited_response(retry_after):
+    """استجابة رفض عند تجاوز الحد المسموح لمحاولات تسجيل الدخول"""
+    response = jsonify({'message': 'محاولات كثيرة، يرجى المحاولة بعد قليل'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def claims_principal(token):
+    """بناء مستخدم خفيف من مطالبات الرمز دون استعلام قاعدة البيانات
+
+    يعيد None إذا كان الرمز قديماً (بدون مطالبات) أو تم إبطال إصداره،
+    وعندها يتم التحقق بالطريقة المعتادة.
+    """
+    payload = User.decode_token(token)
+    if not payload or 'role' not in payload or 'ver' not in payload:
+        return None
+    if not payload.get('is_active'):
+        return None
+    if not token_versions.is_current(payload['user_id'], payload['ver']):
+        return None
+    return CachedUser.from_claims(payload)
+
+def token_required(f=None, *, claims_only=False):
+    """ديكوريتر للتحقق من الرمز المميز
+
+    claims_only=True: للمسارات التي تحتاج فقط معرف المستخدم ودوره،
+    يتم بناء المستخدم من مطالبات الرمز دون استعلام قاعدة البيانات.
+    """
+    if f is None:
+        return lambda func: token_required(func, claims_only=claims_only)
+    
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -37,9 +76,17 @@ def token_required(f):
             return jsonify({'message': 'رمز المصادقة مطلوب'}), 401
         
         try:
-            current_user = User.verify_token(token)
-            if not current_user:
-                return jsonify({'message': 'رمز مصادقة منتهي الصلاحية أو غير صالح'}), 401
+            current_user = claims_principal(token) if claims_only else None
+            
+            # البحث في ذاكرة الرموز المتحقق منها أولاً لتجنب استعلام قاعدة البيانات
+            if current_user is None:
+                current_user = token_cache.get(token)
+            if current_user is None:
+                payload = User.decode_token(token)
+                current_user = User.query.get(payload['user_id']) if payload else None
+                if not current_user:
+                    return jsonify({'message': 'رمز مصادقة منتهي الصلاحية أو غير صالح'}), 401
+                token_cache.set(token, payload['exp'], current_user)
         except Exception as e:
             return jsonify({'message': 'خطأ في التحقق من الرمز المميز'}), 401
         
@@ -51,6 +98,11 @@ def token_required(f):
 def login():
     """تسجيل الدخول"""
     try:
+        # رفض المحاولات الزائدة قبل أي تشفير أو استعلام
+        retry_after = login_rate_limiter.check_ip(request.remote_addr)
+        if retry_after:
+            return rate_limited_response(retry_after)
+        
         data = request.get_json()
         
         if not data:
@@ -68,18 +120,24 @@ def login():
         if not validate_email(email):
             return jsonify({'message': 'البريد الإلكتروني غير صالح'}), 400
         
+        retry_after = login_rate_limiter.check_email(request.remote_addr, email)
+        if retry_after:
+            return rate_limited_response(retry_after)
+        
         # البحث عن المستخدم
         user = User.query.filter_by(email=email).first()
         
         if not user or not user.check_password(password):
+            login_rate_limiter.login_failed(request.remote_addr, email)
             return jsonify({'message': 'البريد الإلكتروني أو كلمة المرور غير صحيحة'}), 401
         
         # التحقق من حالة المستخدم
         if not user.is_active:
             return jsonify({'message': 'الحساب غير مفعل. يرجى التواصل مع المدير'}), 403
         
-        # تحديث وقت آخر تسجيل دخول
-        user.update_last_login()
+        # تحديث وقت آخر تسجيل دخول (تتم الكتابة بشكل مجمّع في الخلفية)
+        login_time = datetime.utcnow()
+        login_writes.record_login(user.id, login_time)
         
         # إنشاء الرمز المميز
         token_expires = 30 * 24 * 3600 if remember_me else 24 * 3600  # 30 يوم أو 24 ساعة
@@ -88,36 +146,97 @@ def login():
         # إنشاء جلسة إذا كان المستخدم يريد التذكر
         if remember_me:
             session_token = secrets.token_urlsafe(32)
-            expires_at = datetime.utcnow() + timedelta(days=30)
+            expires_at = login_time + timedelta(days=30)
             
-            user_session = UserSession(
+            login_writes.add_session(
                 user_id=user.id,
                 session_token=session_token,
                 ip_address=request.remote_addr,
                 user_agent=request.headers.get('User-Agent', ''),
-                expires_at=expires_at
+                expires_at=expires_at,
+                created_at=login_time
             )
-            db.session.add(user_session)
-            db.session.commit()
+        
+        user_data = user.to_dict()
+        user_data['last_login'] = login_time.isoformat()
         
         # إعداد بيانات الاستجابة
         response_data = {
             'message': 'تم تسجيل الدخول بنجاح',
             'token': token,
-            'user': user.to_dict(),
+            'user': user_data,
             'expires_in': token_expires
         }
         
+        if remember_me:
+            response_data['session_token'] = session_token
+        
         return jsonify(response_data), 200
         
+    except (HasherBusy, LoginWritesBusy) as e:
+        return hasher_busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Login error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في تسجيل الدخول'}), 500
 
+@auth_bp.route('/refresh-session', methods=['POST'])
+def refresh_session():
+    """تجديد الرمز المميز باستخدام رمز جلسة التذكر دون التحقق من كلمة المرور"""
+    try:
+        data = request.get_json()
+        session_token = data.get('session_token') if data else None
+        
+        if not session_token:
+            return jsonify({'message': 'رمز الجلسة مطلوب'}), 400
+        
+        # قد تكون الجلسة ما زالت في قائمة الكتابة المجمّعة، فيُبحث عنها في الذاكرة قبل قاعدة البيانات
+        # (التفريغ من خيط الطلب يسمح لأي طلب غير مصادق بإلغاء التجميع وحجز قفل الكتابة)
+        pending = login_writes.find_session(session_token)
+        user_session = UserSession(**pending) if pending else UserSession.query.filter_by(session_token=session_token).first()
+        
+        if not user_session:
+            return jsonify({'message': 'الجلسة غير صالحة'}), 401
+        
+        if user_session.is_expired():
+            if user_session.id:
+                db.session.delete(user_session)
+                db.session.commit()
+            return jsonify({'message': 'انتهت صلاحية الجلسة. يرجى تسجيل الدخول مجدداً'}), 401
+        
+        user = db.session.get(User, user_session.user_id)
+        if not user or not user.is_active:
+            return jsonify({'message': 'الحساب غير مفعل. يرجى التواصل مع المدير'}), 403
+        
+        login_time = datetime.utcnow()
+        login_writes.record_login(user.id, login_time)
+        
+        token_expires = int((user_session.expires_at - login_time).total_seconds())
+        token = user.generate_token(expires_in=token_expires)
+        
+        user_data = user.to_dict()
+        user_data['last_login'] = login_time.isoformat()
+        
+        return jsonify({
+            'message': 'تم تجديد الجلسة بنجاح',
+            'token': token,
+            'user': user_data,
+            'expires_in': token_expires
+        }), 200
+        
+    except LoginWritesBusy as e:
+        return hasher_busy_response(e)
+    except Exception as e:
+        current_app.logger.error(f"Refresh session error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في تجديد الجلسة'}), 500
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """تسجيل مستخدم جديد"""
     try:
+        retry_after = login_rate_limiter.check_ip(request.remote_addr)
+        if retry_after:
+            return rate_limited_response(retry_after)
+        
         data = request.get_json()
         
         if not data:
@@ -178,6 +297,8 @@ def register():
             'verification_token': verification_token
         }), 201
         
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Registration error: {str(e)}")
@@ -202,6 +323,7 @@ def verify_email():
         user.is_verified = True
         user.verification_token = None
         db.session.commit()
+        invalidate_user_tokens(user.id)
         
         return jsonify({'message': 'تم التحقق من البريد الإلكتروني بنجاح'}), 200
         
@@ -239,10 +361,15 @@ def change_password(current_user):
         
         # تحديث كلمة المرور
         current_user.set_password(new_password)
+        bump_token_version(current_user)
+        revoke_sessions(current_user)
         db.session.commit()
+        invalidate_user_tokens(current_user.id)
         
         return jsonify({'message': 'تم تغيير كلمة المرور بنجاح'}), 200
         
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Change password error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في تغيير كلمة المرور'}), 500
@@ -307,18 +434,24 @@ def reset_password():
         
         # تحديث كلمة المرور
         user.set_password(new_password)
+        bump_token_version(user)
+        revoke_sessions(user)
         user.reset_token = None
         user.reset_token_expires = None
         db.session.commit()
+        invalidate_user_tokens(user.id)
         
         return jsonify({'message': 'تم إعادة تعيين كلمة المرور بنجاح'}), 200
         
+    except HasherBusy as e:
+        return hasher_busy_response(e)
     except Exception as e:
         current_app.logger.error(f"Reset password error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في إعادة تعيين كلمة المرور'}), 500
 
 @auth_bp.route('/profile', methods=['GET'])
 @token_required
+@conditional_response((User.__tablename__, UserProfile.__tablename__))
 def get_profile(current_user):
     """الحصول على الملف الشخصي"""
     try:
@@ -375,6 +508,7 @@ def update_profile(current_user):
             profile.preferences = data['preferences']
         
         db.session.commit()
+        invalidate_user_tokens(current_user.id)
         
         return jsonify({
             'message': 'تم تحديث الملف الشخصي بنجاح',
@@ -392,8 +526,8 @@ def update_profile(current_user):
 def logout(current_user):
     """تسجيل الخروج"""
     try:
-        # حذف جلسات المستخدم
-        UserSession.query.filter_by(user_id=current_user.id).delete()
+        # حذف جلسات المستخدم (بما فيها الجلسات التي لم تُكتب بعد)
+        revoke_sessions(current_user)
         db.session.commit()
         
         return jsonify({'message': 'تم تسجيل الخروج بنجاح'}), 200
@@ -431,3 +565,44 @@ def validate_token():
             'message': 'حدث خطأ في التحقق من الرمز المميز'
         }), 500
 
+@auth_bp.route('/token-cache/stats', methods=['GET'])
+@token_required
+def get_token_cache_stats(current_user):
+    """إحصائيات ذاكرة الرموز المميزة المتحقق منها"""
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لعرض الإحصائيات'}), 403
+        
+        return jsonify({'token_cache': token_cache.stats()}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Token cache stats error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب إحصائيات الذاكرة'}), 500
+
+@auth_bp.route('/hasher/stats', methods=['GET'])
+@token_required
+def get_hasher_stats(current_user):
+    """إحصائيات مجمع تشفير كلمات المرور"""
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لعرض الإحصائيات'}), 403
+        
+        return jsonify({'password_hasher': password_hasher.stats()}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Hasher stats error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب إحصائيات التشفير'}), 500
+
+@auth_bp.route('/rate-limit/stats', methods=['GET'])
+@token_required
+def get_rate_limit_stats(current_user):
+    """إحصائيات تحديد معدل محاولات تسجيل الدخول"""
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لعرض الإحصائيات'}), 403
+        
+        return jsonify({'rate_limit': login_rate_limiter.stats()}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Rate limit stats error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب إحصائيات تحديد المعدل'}), 500
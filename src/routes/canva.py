@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request, current_app, redirect
 from src.routes.auth import token_required
+from src.services.reference_data import reference_data
 import requests
 import json
 from datetime import datetime
@@ -74,129 +75,134 @@ def canva_callback():
         current_app.logger.error(f"Canva callback error: {str(e)}")
         return redirect('/canva_integration.html?error=callback_failed')
 
+@reference_data.catalog('canva_templates')
+def _canva_templates_catalog():
+    """قوالب Canva للسلامة من الحرائق"""
+    templates = {
+        'reports': [
+            {
+                'id': 'fire_safety_report_1',
+                'name': 'تقرير السلامة الشهري',
+                'description': 'قالب تقرير شهري شامل للسلامة من الحرائق',
+                'thumbnail': '/static/images/templates/fire_report_1.jpg',
+                'category': 'reports'
+            },
+            {
+                'id': 'incident_report_1',
+                'name': 'تقرير حادث',
+                'description': 'قالب لتقارير الحوادث والطوارئ',
+                'thumbnail': '/static/images/templates/incident_report_1.jpg',
+                'category': 'reports'
+            },
+            {
+                'id': 'inspection_report_1',
+                'name': 'تقرير تشييك',
+                'description': 'قالب لتقارير التشييكات اليومية',
+                'thumbnail': '/static/images/templates/inspection_report_1.jpg',
+                'category': 'reports'
+            }
+        ],
+        'presentations': [
+            {
+                'id': 'fire_safety_training_1',
+                'name': 'عرض تدريب السلامة',
+                'description': 'عرض تقديمي لتدريب الموظفين على السلامة',
+                'thumbnail': '/static/images/templates/training_presentation_1.jpg',
+                'category': 'presentations'
+            },
+            {
+                'id': 'emergency_procedures_1',
+                'name': 'إجراءات الطوارئ',
+                'description': 'عرض تقديمي لإجراءات الطوارئ والإخلاء',
+                'thumbnail': '/static/images/templates/emergency_procedures_1.jpg',
+                'category': 'presentations'
+            }
+        ],
+        'posters': [
+            {
+                'id': 'fire_safety_poster_1',
+                'name': 'ملصق السلامة من الحرائق',
+                'description': 'ملصق توعوي للسلامة من الحرائق',
+                'thumbnail': '/static/images/templates/safety_poster_1.jpg',
+                'category': 'posters'
+            },
+            {
+                'id': 'evacuation_plan_1',
+                'name': 'خطة الإخلاء',
+                'description': 'ملصق خطة الإخلاء للطوارئ',
+                'thumbnail': '/static/images/templates/evacuation_plan_1.jpg',
+                'category': 'posters'
+            },
+            {
+                'id': 'fire_extinguisher_guide_1',
+                'name': 'دليل طفايات الحريق',
+                'description': 'ملصق توضيحي لاستخدام طفايات الحريق',
+                'thumbnail': '/static/images/templates/extinguisher_guide_1.jpg',
+                'category': 'posters'
+            }
+        ],
+        'certificates': [
+            {
+                'id': 'fire_safety_certificate_1',
+                'name': 'شهادة السلامة من الحرائق',
+                'description': 'شهادة إتمام دورة السلامة من الحرائق',
+                'thumbnail': '/static/images/templates/safety_certificate_1.jpg',
+                'category': 'certificates'
+            },
+            {
+                'id': 'training_completion_1',
+                'name': 'شهادة إتمام التدريب',
+                'description': 'شهادة إتمام التدريب على أجهزة الإطفاء',
+                'thumbnail': '/static/images/templates/training_certificate_1.jpg',
+                'category': 'certificates'
+            }
+        ],
+        'infographics': [
+            {
+                'id': 'fire_statistics_1',
+                'name': 'إحصائيات الحرائق',
+                'description': 'إنفوجرافيك لإحصائيات السلامة من الحرائق',
+                'thumbnail': '/static/images/templates/fire_stats_1.jpg',
+                'category': 'infographics'
+            },
+            {
+                'id': 'fire_prevention_tips_1',
+                'name': 'نصائح الوقاية من الحرائق',
+                'description': 'إنفوجرافيك لنصائح الوقاية من الحرائق',
+                'thumbnail': '/static/images/templates/prevention_tips_1.jpg',
+                'category': 'infographics'
+            }
+        ],
+        'id_cards': [
+            {
+                'id': 'fire_warden_id_1',
+                'name': 'بطاقة مسؤول السلامة',
+                'description': 'بطاقة هوية لمسؤولي السلامة من الحرائق',
+                'thumbnail': '/static/images/templates/fire_warden_id_1.jpg',
+                'category': 'id_cards'
+            },
+            {
+                'id': 'emergency_contact_1',
+                'name': 'بطاقة جهات الاتصال',
+                'description': 'بطاقة أرقام الطوارئ والاتصال',
+                'thumbnail': '/static/images/templates/emergency_contact_1.jpg',
+                'category': 'id_cards'
+            }
+        ]
+    }
+    
+    return {
+        'templates': templates,
+        'total_templates': sum(len(category) for category in templates.values()),
+        'message': 'تم جلب قوالب Canva بنجاح'
+    }
+
 @canva_bp.route('/templates', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_canva_templates(current_user):
     """الحصول على قوالب Canva للسلامة من الحرائق"""
     try:
-        templates = {
-            'reports': [
-                {
-                    'id': 'fire_safety_report_1',
-                    'name': 'تقرير السلامة الشهري',
-                    'description': 'قالب تقرير شهري شامل للسلامة من الحرائق',
-                    'thumbnail': '/static/images/templates/fire_report_1.jpg',
-                    'category': 'reports'
-                },
-                {
-                    'id': 'incident_report_1',
-                    'name': 'تقرير حادث',
-                    'description': 'قالب لتقارير الحوادث والطوارئ',
-                    'thumbnail': '/static/images/templates/incident_report_1.jpg',
-                    'category': 'reports'
-                },
-                {
-                    'id': 'inspection_report_1',
-                    'name': 'تقرير تشييك',
-                    'description': 'قالب لتقارير التشييكات اليومية',
-                    'thumbnail': '/static/images/templates/inspection_report_1.jpg',
-                    'category': 'reports'
-                }
-            ],
-            'presentations': [
-                {
-                    'id': 'fire_safety_training_1',
-                    'name': 'عرض تدريب السلامة',
-                    'description': 'عرض تقديمي لتدريب الموظفين على السلامة',
-                    'thumbnail': '/static/images/templates/training_presentation_1.jpg',
-                    'category': 'presentations'
-                },
-                {
-                    'id': 'emergency_procedures_1',
-                    'name': 'إجراءات الطوارئ',
-                    'description': 'عرض تقديمي لإجراءات الطوارئ والإخلاء',
-                    'thumbnail': '/static/images/templates/emergency_procedures_1.jpg',
-                    'category': 'presentations'
-                }
-            ],
-            'posters': [
-                {
-                    'id': 'fire_safety_poster_1',
-                    'name': 'ملصق السلامة من الحرائق',
-                    'description': 'ملصق توعوي للسلامة من الحرائق',
-                    'thumbnail': '/static/images/templates/safety_poster_1.jpg',
-                    'category': 'posters'
-                },
-                {
-                    'id': 'evacuation_plan_1',
-                    'name': 'خطة الإخلاء',
-                    'description': 'ملصق خطة الإخلاء للطوارئ',
-                    'thumbnail': '/static/images/templates/evacuation_plan_1.jpg',
-                    'category': 'posters'
-                },
-                {
-                    'id': 'fire_extinguisher_guide_1',
-                    'name': 'دليل طفايات الحريق',
-                    'description': 'ملصق توضيحي لاستخدام طفايات الحريق',
-                    'thumbnail': '/static/images/templates/extinguisher_guide_1.jpg',
-                    'category': 'posters'
-                }
-            ],
-            'certificates': [
-                {
-                    'id': 'fire_safety_certificate_1',
-                    'name': 'شهادة السلامة من الحرائق',
-                    'description': 'شهادة إتمام دورة السلامة من الحرائق',
-                    'thumbnail': '/static/images/templates/safety_certificate_1.jpg',
-                    'category': 'certificates'
-                },
-                {
-                    'id': 'training_completion_1',
-                    'name': 'شهادة إتمام التدريب',
-                    'description': 'شهادة إتمام التدريب على أجهزة الإطفاء',
-                    'thumbnail': '/static/images/templates/training_certificate_1.jpg',
-                    'category': 'certificates'
-                }
-            ],
-            'infographics': [
-                {
-                    'id': 'fire_statistics_1',
-                    'name': 'إحصائيات الحرائق',
-                    'description': 'إنفوجرافيك لإحصائيات السلامة من الحرائق',
-                    'thumbnail': '/static/images/templates/fire_stats_1.jpg',
-                    'category': 'infographics'
-                },
-                {
-                    'id': 'fire_prevention_tips_1',
-                    'name': 'نصائح الوقاية من الحرائق',
-                    'description': 'إنفوجرافيك لنصائح الوقاية من الحرائق',
-                    'thumbnail': '/static/images/templates/prevention_tips_1.jpg',
-                    'category': 'infographics'
-                }
-            ],
-            'id_cards': [
-                {
-                    'id': 'fire_warden_id_1',
-                    'name': 'بطاقة مسؤول السلامة',
-                    'description': 'بطاقة هوية لمسؤولي السلامة من الحرائق',
-                    'thumbnail': '/static/images/templates/fire_warden_id_1.jpg',
-                    'category': 'id_cards'
-                },
-                {
-                    'id': 'emergency_contact_1',
-                    'name': 'بطاقة جهات الاتصال',
-                    'description': 'بطاقة أرقام الطوارئ والاتصال',
-                    'thumbnail': '/static/images/templates/emergency_contact_1.jpg',
-                    'category': 'id_cards'
-                }
-            ]
-        }
-        
-        return jsonify({
-            'templates': templates,
-            'total_templates': sum(len(category) for category in templates.values()),
-            'message': 'تم جلب قوالب Canva بنجاح'
-        }), 200
+        return reference_data.response('canva_templates')
         
     except Exception as e:
         current_app.logger.error(f"Get Canva templates error: {str(e)}")
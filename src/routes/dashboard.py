@@ -1,78 +1,51 @@
-from flask import Blueprint, jsonify, request, current_app
-from src.models.user import User, Device, Inspection, MaintenanceTask, UploadedFile, db
+from flask import Blueprint, Response, jsonify, request, current_app
+from src.models.user import User, Device, Inspection, MaintenanceTask, UploadedFile, Alert, ActivityLog, DashboardCounter, InspectionDailyRollup, MaintenanceMonthlyRollup, db
 from src.routes.auth import token_required
+from src.services.response_cache import (
+    cached_response, response_cache,
+    RESPONSE_CACHE_TTL_STATS, RESPONSE_CACHE_TTL_CHARTS, RESPONSE_CACHE_TTL_ALERTS, RESPONSE_CACHE_TTL_ACTIVITY
+)
+from src.services.dashboard_counters import (
+    read_counters, family, day_keys, inspections_by_status, basic_stats, read_basic_stats,
+    BASIC_STATS_NAMES, BASIC_STATS_PREFIXES
+)
+from src.services.rollups import display as display_rollup_value
+from src.services.alerts import alert_to_dict, SEVERITY_RANKS
+from src.services.activity_log import activity_to_dict, ACTIVITY_TYPES
+from src.services.table_versions import conditional_response
+from src.services.pagination import encode_cursor, decode_cursor, page_size, InvalidCursor
+from src.services.dashboard_stream import dashboard_broadcaster, format_event, STREAM_HEARTBEAT_INTERVAL, STREAM_TICKET_TTL
+from src.services.token_revocation import token_versions
 from datetime import datetime, timedelta
+import queue
+import time
 from sqlalchemy import func, and_, or_
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# الجداول التي تعتمد عليها كل مجموعة من الاستجابات المخزنة
+STATS_TABLES = (Device.__tablename__, Inspection.__tablename__, MaintenanceTask.__tablename__, User.__tablename__, UploadedFile.__tablename__, DashboardCounter.__tablename__)
+ACTIVITY_TABLES = (Inspection.__tablename__, MaintenanceTask.__tablename__, UploadedFile.__tablename__, User.__tablename__)
+ALERTS_TABLES = (Device.__tablename__, Inspection.__tablename__, MaintenanceTask.__tablename__, Alert.__tablename__)
+
 @dashboard_bp.route('/stats', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(STATS_TABLES)
+@cached_response(RESPONSE_CACHE_TTL_STATS, STATS_TABLES)
 def get_dashboard_stats(current_user):
     """الحصول على إحصائيات لوحة التحكم"""
     try:
-        # الإحصائيات الأساسية
-        total_devices = Device.query.filter_by(status='active').count()
-        total_users = User.query.filter_by(is_active=True).count()
-        
-        # تشييكات اليوم
+        # جميع العدادات من جدول dashboard_counters في استعلام واحد
+        counters = read_counters(
+            names=BASIC_STATS_NAMES,
+            prefixes=BASIC_STATS_PREFIXES + ('devices.active.type:', 'tasks.open.priority:')
+        )
         today = datetime.utcnow().date()
-        today_inspections = Inspection.query.filter(
-            func.date(Inspection.inspection_date) == today
-        ).count()
-        
-        # مهام الصيانة المعلقة
-        pending_maintenance = MaintenanceTask.query.filter(
-            MaintenanceTask.status.in_(['pending', 'in_progress'])
-        ).count()
-        
-        # مهام الصيانة المتأخرة
-        overdue_maintenance = MaintenanceTask.query.filter(
-            and_(
-                MaintenanceTask.status == 'pending',
-                MaintenanceTask.scheduled_date < datetime.utcnow()
-            )
-        ).count()
-        
-        # الملفات المرفوعة
-        total_files = UploadedFile.query.count()
         
-        # إحصائيات الأجهزة حسب النوع
-        device_types = db.session.query(
-            Device.type,
-            func.count(Device.id).label('count')
-        ).filter_by(status='active').group_by(Device.type).all()
-        
-        # إحصائيات التشييكات الأخيرة
-        recent_inspections = db.session.query(
-            Inspection.status,
-            func.count(Inspection.id).label('count')
-        ).filter(
-            Inspection.inspection_date >= datetime.utcnow() - timedelta(days=7)
-        ).group_by(Inspection.status).all()
-        
-        # إحصائيات مهام الصيانة حسب الحالة
-        maintenance_stats = db.session.query(
-            MaintenanceTask.status,
-            func.count(MaintenanceTask.id).label('count')
-        ).group_by(MaintenanceTask.status).all()
-        
-        # إحصائيات مهام الصيانة حسب الأولوية
-        priority_stats = db.session.query(
-            MaintenanceTask.priority,
-            func.count(MaintenanceTask.id).label('count')
-        ).filter(
-            MaintenanceTask.status.in_(['pending', 'in_progress'])
-        ).group_by(MaintenanceTask.priority).all()
-        
-        # الأجهزة التي تحتاج صيانة قريباً (خلال 30 يوم)
-        upcoming_maintenance = Device.query.filter(
-            and_(
-                Device.next_maintenance.isnot(None),
-                Device.next_maintenance <= datetime.utcnow().date() + timedelta(days=30),
-                Device.status == 'active'
-            )
-        ).count()
+        device_types = sorted(family(counters, 'devices.active.type:').items())
+        recent_inspections = sorted(inspections_by_status(counters, day_keys(today, 7)).items())
+        maintenance_stats = sorted(family(counters, 'tasks.status:').items())
+        priority_stats = sorted(family(counters, 'tasks.open.priority:').items())
         
         # آخر التشييكات
         latest_inspections = db.session.query(
@@ -96,15 +69,7 @@ def get_dashboard_stats(current_user):
         ).order_by(MaintenanceTask.scheduled_date.asc()).limit(5).all()
         
         return jsonify({
-            'basic_stats': {
-                'totalDevices': total_devices,
-                'todayInspections': today_inspections,
-                'pendingMaintenance': pending_maintenance,
-                'totalUsers': total_users,
-                'overdueMaintenance': overdue_maintenance,
-                'totalFiles': total_files,
-                'upcomingMaintenance': upcoming_maintenance
-            },
+            'basic_stats': basic_stats(counters, today),
             'device_types': [
                 {'type': dtype, 'count': count} for dtype, count in device_types
             ],
@@ -146,61 +111,112 @@ def get_dashboard_stats(current_user):
         current_app.logger.error(f"Get dashboard stats error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب إحصائيات لوحة التحكم'}), 500
 
-@dashboard_bp.route('/activity', methods=['GET'])
-@token_required
-def get_recent_activity(current_user):
-    """الحصول على النشاطات الأخيرة"""
+@dashboard_bp.route('/stream-ticket', methods=['POST'])
+@token_required(claims_only=True)
+def create_stream_ticket(current_user):
+    """إصدار تذكرة قصيرة العمر لفتح البث، لأن EventSource لا يرسل هيدر Authorization"""
     try:
-        limit = request.args.get('limit', 20, type=int)
+        payload = User.decode_token(request.headers['Authorization'].split(' ')[-1])
+        token_version = payload['ver'] if 'ver' in payload else current_user.token_version or 0
+        ticket = User.generate_stream_ticket(current_user.id, token_version, payload['exp'], STREAM_TICKET_TTL)
         
-        activities = []
+        return jsonify({'ticket': ticket, 'expires_in': STREAM_TICKET_TTL}), 200
         
-        # آخر التشييكات
-        recent_inspections = db.session.query(
-            Inspection,
-            Device.name.label('device_name'),
-            User.name.label('inspector_name')
-        ).join(Device).join(User).order_by(
-            Inspection.inspection_date.desc()
-        ).limit(limit // 2).all()
-        
-        for inspection, device_name, inspector_name in recent_inspections:
-            activities.append({
-                'type': 'inspection',
-                'title': f'تشييك {device_name}',
-                'description': f'تم إجراء تشييك بواسطة {inspector_name}',
-                'status': inspection.status,
-                'timestamp': inspection.inspection_date.isoformat(),
-                'user': inspector_name,
-                'icon': '🔍'
-            })
-        
-        # آخر مهام الصيانة
-        recent_maintenance = db.session.query(
-            MaintenanceTask,
-            Device.name.label('device_name'),
-            User.name.label('assigned_user_name')
-        ).join(Device).join(User).order_by(
-            MaintenanceTask.updated_at.desc()
-        ).limit(limit // 2).all()
-        
-        for task, device_name, assigned_user_name in recent_maintenance:
-            activities.append({
-                'type': 'maintenance',
-                'title': task.title,
-                'description': f'مهمة صيانة لـ {device_name} - {assigned_user_name}',
-                'status': task.status,
-                'timestamp': task.updated_at.isoformat(),
-                'user': assigned_user_name,
-                'priority': task.priority,
-                'icon': '⚙️'
-            })
-        
-        # ترتيب النشاطات حسب الوقت
-        activities.sort(key=lambda x: x['timestamp'], reverse=True)
+    except Exception as e:
+        current_app.logger.error(f"Create stream ticket error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في إصدار تذكرة البث'}), 500
+
+@dashboard_bp.route('/stream', methods=['GET'])
+def stream_dashboard():
+    """بث تغييرات إحصائيات لوحة التحكم والتنبيهات الخطيرة (Server-Sent Events)
+
+    يتم التحقق بتذكرة البث في معامل ticket بدلاً من الرمز المميز نفسه حتى لا
+    يظهر الرمز في سجلات الخادم والوكلاء.
+    """
+    subscription = None
+    try:
+        payload = User.verify_stream_ticket(request.args.get('ticket', ''))
+        if not payload or not token_versions.is_current(payload['user_id'], payload['ver']):
+            return jsonify({'message': 'تذكرة البث منتهية الصلاحية أو غير صالحة'}), 401
+        
+        expires_at = payload['session_exp']
+        subscription = dashboard_broadcaster.subscribe(current_app._get_current_object())
+        snapshot = read_basic_stats()
+        # إنهاء معاملة القراءة حتى لا يبقى الاتصال مفتوحاً طوال مدة البث
+        db.session.remove()
+    except Exception as e:
+        if subscription is not None:
+            dashboard_broadcaster.unsubscribe(subscription)
+        current_app.logger.error(f"Dashboard stream error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في بث لوحة التحكم'}), 500
+    
+    def events():
+        try:
+            yield format_event('snapshot', snapshot)
+            while True:
+                if subscription.closed:
+                    # تم فصل المتصل لبطئه، إنهاء الاستجابة ليعيد المتصفح الاتصال
+                    yield format_event('reconnect', {})
+                    break
+                timeout = min(STREAM_HEARTBEAT_INTERVAL, expires_at - time.time())
+                if timeout <= 0:
+                    # انتهت صلاحية الرمز، يجب على المتصفح تجديده قبل إعادة الاتصال
+                    yield format_event('expired', {})
+                    break
+                try:
+                    event, data = subscription.get(timeout=timeout)
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                yield format_event(event, data)
+        finally:
+            dashboard_broadcaster.unsubscribe(subscription)
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@dashboard_bp.route('/activity', methods=['GET'])
+@token_required(claims_only=True)
+@conditional_response(ACTIVITY_TABLES)
+@cached_response(RESPONSE_CACHE_TTL_ACTIVITY, ACTIVITY_TABLES, params={'limit': int, 'cursor': str, 'type': str, 'user_id': int})
+def get_recent_activity(current_user):
+    """الحصول على النشاطات الأخيرة من سجل النشاطات، مع ترقيم الصفحات بالمؤشر"""
+    try:
+        limit = page_size(request.args.get('limit', type=int), default=20)
+        cursor = request.args.get('cursor')
+        activity_type = request.args.get('type')
+        user_id = request.args.get('user_id', type=int)
+        
+        query = ActivityLog.query
+        if activity_type:
+            if activity_type not in ACTIVITY_TYPES:
+                return jsonify({'message': 'نوع النشاط غير صالح'}), 400
+            query = query.filter(ActivityLog.type == activity_type)
+        if user_id:
+            query = query.filter(ActivityLog.user_id == user_id)
+        if cursor:
+            try:
+                timestamp, entry_id = decode_cursor(cursor, datetime, int)
+            except InvalidCursor:
+                return jsonify({'message': 'مؤشر الصفحة غير صالح'}), 400
+            query = query.filter(or_(
+                ActivityLog.timestamp < timestamp,
+                and_(ActivityLog.timestamp == timestamp, ActivityLog.id < entry_id)
+            ))
+        
+        entries = query.order_by(ActivityLog.timestamp.desc(), ActivityLog.id.desc()).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            last = entries[-1]
+            next_cursor = encode_cursor(last.timestamp, last.id)
         
         return jsonify({
-            'activities': activities[:limit]
+            'activities': [activity_to_dict(entry) for entry in entries],
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -208,30 +224,32 @@ def get_recent_activity(current_user):
         return jsonify({'message': 'حدث خطأ في جلب النشاطات الأخيرة'}), 500
 
 @dashboard_bp.route('/charts/inspections', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response((Inspection.__tablename__,))
+@cached_response(RESPONSE_CACHE_TTL_CHARTS, (Inspection.__tablename__,), params={'days': int})
 def get_inspections_chart_data(current_user):
     """الحصول على بيانات مخطط التشييكات"""
     try:
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
+        start_day = (datetime.utcnow() - timedelta(days=days)).date()
         
-        # بيانات التشييكات اليومية
-        daily_inspections = db.session.query(
-            func.date(Inspection.inspection_date).label('date'),
-            func.count(Inspection.id).label('count')
+        # بيانات التشييكات اليومية وحسب الحالة من جدول التجميع اليومي
+        rollup_rows = db.session.query(
+            InspectionDailyRollup.day,
+            InspectionDailyRollup.status,
+            InspectionDailyRollup.count
         ).filter(
-            Inspection.inspection_date >= start_date
-        ).group_by(
-            func.date(Inspection.inspection_date)
-        ).order_by('date').all()
-        
-        # بيانات التشييكات حسب الحالة
-        status_data = db.session.query(
-            Inspection.status,
-            func.count(Inspection.id).label('count')
-        ).filter(
-            Inspection.inspection_date >= start_date
-        ).group_by(Inspection.status).all()
+            InspectionDailyRollup.day >= start_day,
+            InspectionDailyRollup.count > 0
+        ).order_by(InspectionDailyRollup.day).all()
+        
+        daily_counts = {}
+        status_counts = {}
+        for day, status, count in rollup_rows:
+            daily_counts[day] = daily_counts.get(day, 0) + count
+            status_counts[status] = status_counts.get(status, 0) + count
+        daily_inspections = list(daily_counts.items())
+        status_data = [(display_rollup_value(status), count) for status, count in sorted(status_counts.items())]
         
         return jsonify({
             'daily_inspections': [
@@ -255,30 +273,34 @@ def get_inspections_chart_data(current_user):
         return jsonify({'message': 'حدث خطأ في جلب بيانات مخطط التشييكات'}), 500
 
 @dashboard_bp.route('/charts/maintenance', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response((MaintenanceTask.__tablename__,))
+@cached_response(RESPONSE_CACHE_TTL_CHARTS, (MaintenanceTask.__tablename__,))
 def get_maintenance_chart_data(current_user):
     """الحصول على بيانات مخطط الصيانة"""
     try:
-        # بيانات الصيانة حسب الحالة
-        status_data = db.session.query(
-            MaintenanceTask.status,
-            func.count(MaintenanceTask.id).label('count')
-        ).group_by(MaintenanceTask.status).all()
-        
-        # بيانات الصيانة حسب الأولوية
-        priority_data = db.session.query(
-            MaintenanceTask.priority,
-            func.count(MaintenanceTask.id).label('count')
-        ).group_by(MaintenanceTask.priority).all()
-        
-        # بيانات الصيانة الشهرية
-        monthly_data = db.session.query(
-            func.extract('year', MaintenanceTask.created_at).label('year'),
-            func.extract('month', MaintenanceTask.created_at).label('month'),
-            func.count(MaintenanceTask.id).label('count')
-        ).filter(
-            MaintenanceTask.created_at >= datetime.utcnow() - timedelta(days=365)
-        ).group_by('year', 'month').order_by('year', 'month').all()
+        # جميع البيانات من جدول التجميع الشهري (صف لكل شهر وحالة وأولوية)
+        rollup_rows = db.session.query(
+            MaintenanceMonthlyRollup.year,
+            MaintenanceMonthlyRollup.month,
+            MaintenanceMonthlyRollup.status,
+            MaintenanceMonthlyRollup.priority,
+            MaintenanceMonthlyRollup.count
+        ).filter(MaintenanceMonthlyRollup.count > 0).all()
+        
+        start = datetime.utcnow() - timedelta(days=365)
+        status_counts = {}
+        priority_counts = {}
+        monthly_counts = {}
+        for year, month, status, priority, count in rollup_rows:
+            status_counts[status] = status_counts.get(status, 0) + count
+            priority_counts[priority] = priority_counts.get(priority, 0) + count
+            if (year, month) >= (start.year, start.month):
+                monthly_counts[(year, month)] = monthly_counts.get((year, month), 0) + count
+        
+        status_data = [(display_rollup_value(status), count) for status, count in sorted(status_counts.items())]
+        priority_data = [(display_rollup_value(priority), count) for priority, count in sorted(priority_counts.items())]
+        monthly_data = [(year, month, count) for (year, month), count in sorted(monthly_counts.items())]
         
         return jsonify({
             'status_distribution': [
@@ -310,130 +332,123 @@ def get_maintenance_chart_data(current_user):
         return jsonify({'message': 'حدث خطأ في جلب بيانات مخطط الصيانة'}), 500
 
 @dashboard_bp.route('/alerts', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(ALERTS_TABLES)
+@cached_response(RESPONSE_CACHE_TTL_ALERTS, ALERTS_TABLES, params={'limit': int, 'cursor': str, 'severity': str, 'type': str})
 def get_system_alerts(current_user):
-    """الحصول على تنبيهات النظام"""
+    """الحصول على تنبيهات النظام مرتبة حسب الأهمية ثم الأحدث، مع ترقيم الصفحات بالمؤشر
+
+    total_count هو عدد التنبيهات المطابقة للتصفية، بينما أعداد الأهمية
+    (critical_count وغيرها) لجميع التنبيهات النشطة.
+    """
     try:
-        alerts = []
-        
-        # تنبيهات الصيانة المتأخرة
-        overdue_tasks = db.session.query(
-            MaintenanceTask,
-            Device.name.label('device_name')
-        ).join(Device).filter(
-            and_(
-                MaintenanceTask.status == 'pending',
-                MaintenanceTask.scheduled_date < datetime.utcnow()
-            )
-        ).all()
-        
-        for task, device_name in overdue_tasks:
-            days_overdue = (datetime.utcnow() - task.scheduled_date).days
-            alerts.append({
-                'type': 'overdue_maintenance',
-                'severity': 'high' if days_overdue > 7 else 'medium',
-                'title': 'صيانة متأخرة',
-                'message': f'مهمة صيانة {task.title} لجهاز {device_name} متأخرة بـ {days_overdue} يوم',
-                'timestamp': task.scheduled_date.isoformat(),
-                'action_url': f'/maintenance.html?task_id={task.id}'
-            })
-        
-        # تنبيهات الأجهزة التي تحتاج صيانة قريباً
-        upcoming_maintenance = db.session.query(Device).filter(
-            and_(
-                Device.next_maintenance.isnot(None),
-                Device.next_maintenance <= datetime.utcnow().date() + timedelta(days=7),
-                Device.next_maintenance > datetime.utcnow().date(),
-                Device.status == 'active'
-            )
-        ).all()
-        
-        for device in upcoming_maintenance:
-            days_until = (device.next_maintenance - datetime.utcnow().date()).days
-            alerts.append({
-                'type': 'upcoming_maintenance',
-                'severity': 'low' if days_until > 3 else 'medium',
-                'title': 'صيانة قادمة',
-                'message': f'جهاز {device.name} يحتاج صيانة خلال {days_until} يوم',
-                'timestamp': device.next_maintenance.isoformat(),
-                'action_url': f'/devices.html?device_id={device.id}'
-            })
-        
-        # تنبيهات التشييكات الخطيرة
-        danger_inspections = db.session.query(
-            Inspection,
-            Device.name.label('device_name')
-        ).join(Device).filter(
-            and_(
-                Inspection.status == 'danger',
-                Inspection.inspection_date >= datetime.utcnow() - timedelta(days=1)
-            )
-        ).all()
-        
-        for inspection, device_name in danger_inspections:
-            alerts.append({
-                'type': 'danger_inspection',
-                'severity': 'critical',
-                'title': 'تشييك خطير',
-                'message': f'تم العثور على مشكلة خطيرة في جهاز {device_name}',
-                'timestamp': inspection.inspection_date.isoformat(),
-                'action_url': f'/inspections.html?inspection_id={inspection.id}'
-            })
-        
-        # ترتيب التنبيهات حسب الأهمية والوقت
-        severity_order = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
-        alerts.sort(key=lambda x: (severity_order.get(x['severity'], 4), x['timestamp']), reverse=True)
+        limit = page_size(request.args.get('limit', type=int))
+        cursor = request.args.get('cursor')
+        severity = request.args.get('severity')
+        alert_type = request.args.get('type')
+        
+        query = Alert.query
+        if severity:
+            if severity not in SEVERITY_RANKS:
+                return jsonify({'message': 'مستوى الأهمية غير صالح'}), 400
+            query = query.filter(Alert.severity_rank == SEVERITY_RANKS[severity])
+        if alert_type:
+            query = query.filter(Alert.type == alert_type)
+        
+        # أعداد التنبيهات حسب الأهمية من جدول العدادات
+        counts = family(read_counters(prefixes=('alerts.severity:',)), 'alerts.severity:')
+        # العدد الكلي للتنبيهات المطابقة للتصفية (العدادات لا تميز النوع، لذلك يُعد بالاستعلام)
+        if alert_type:
+            total_count = query.order_by(None).count()
+        elif severity:
+            total_count = counts.get(severity, 0)
+        else:
+            total_count = sum(counts.values())
+        
+        if cursor:
+            try:
+                rank, timestamp, alert_id = decode_cursor(cursor, int, datetime, int)
+            except InvalidCursor:
+                return jsonify({'message': 'مؤشر الصفحة غير صالح'}), 400
+            query = query.filter(or_(
+                Alert.severity_rank > rank,
+                and_(Alert.severity_rank == rank, Alert.timestamp < timestamp),
+                and_(Alert.severity_rank == rank, Alert.timestamp == timestamp, Alert.id < alert_id)
+            ))
+        
+        alerts = query.order_by(
+            Alert.severity_rank.asc(), Alert.timestamp.desc(), Alert.id.desc()
+        ).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(alerts) > limit:
+            alerts = alerts[:limit]
+            last = alerts[-1]
+            next_cursor = encode_cursor(last.severity_rank, last.timestamp, last.id)
+        
+        now = datetime.utcnow()
         
         return jsonify({
-            'alerts': alerts,
-            'total_count': len(alerts),
-            'critical_count': len([a for a in alerts if a['severity'] == 'critical']),
-            'high_count': len([a for a in alerts if a['severity'] == 'high']),
-            'medium_count': len([a for a in alerts if a['severity'] == 'medium']),
-            'low_count': len([a for a in alerts if a['severity'] == 'low'])
+            'alerts': [alert_to_dict(alert, now) for alert in alerts],
+            'next_cursor': next_cursor,
+            'total_count': total_count,
+            'critical_count': counts.get('critical', 0),
+            'high_count': counts.get('high', 0),
+            'medium_count': counts.get('medium', 0),
+            'low_count': counts.get('low', 0)
         }), 200
         
     except Exception as e:
         current_app.logger.error(f"Get system alerts error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب تنبيهات النظام'}), 500
 
+@dashboard_bp.route('/cache/stats', methods=['GET'])
+@token_required
+def get_cache_stats(current_user):
+    """إحصائيات الذاكرة المؤقتة لاستجابات لوحة التحكم"""
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لعرض الإحصائيات'}), 403
+        
+        return jsonify({'response_cache': response_cache.stats()}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Response cache stats error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب إحصائيات الذاكرة'}), 500
+
 @dashboard_bp.route('/summary', methods=['GET'])
 @token_required
+@conditional_response((DashboardCounter.__tablename__, User.__tablename__, Inspection.__tablename__, MaintenanceTask.__tablename__))
 def get_dashboard_summary(current_user):
     """الحصول على ملخص لوحة التحكم"""
     try:
-        # ملخص سريع للمستخدم الحالي
-        user_inspections = Inspection.query.filter_by(inspector_id=current_user.id).count()
-        user_tasks = MaintenanceTask.query.filter_by(assigned_user_id=current_user.id).count()
+        # ملخص سريع من جدول العدادات
+        counters = read_counters(
+            names=(
+                f'inspections.user:{current_user.id}',
+                f'tasks.user:{current_user.id}',
+                'devices.active',
+                'tasks.completed_on_schedule'
+            ),
+            prefixes=('inspections.day:',)
+        )
+        today = datetime.utcnow().date()
+        week_days = day_keys(today, 14)
+        current_week = inspections_by_status(counters, week_days[:7])
+        
+        user_inspections = counters.get(f'inspections.user:{current_user.id}', 0)
+        user_tasks = counters.get(f'tasks.user:{current_user.id}', 0)
         
         # ملخص النظام العام
         system_health = {
-            'devices_operational': Device.query.filter_by(status='active').count(),
-            'recent_inspections_good': Inspection.query.filter(
-                and_(
-                    Inspection.status == 'good',
-                    Inspection.inspection_date >= datetime.utcnow() - timedelta(days=7)
-                )
-            ).count(),
-            'maintenance_on_schedule': MaintenanceTask.query.filter(
-                and_(
-                    MaintenanceTask.status == 'completed',
-                    MaintenanceTask.completed_date >= MaintenanceTask.scheduled_date
-                )
-            ).count()
+            'devices_operational': counters.get('devices.active', 0),
+            'recent_inspections_good': current_week.get('good', 0),
+            'maintenance_on_schedule': counters.get('tasks.completed_on_schedule', 0)
         }
         
         # اتجاهات الأداء
-        current_week_inspections = Inspection.query.filter(
-            Inspection.inspection_date >= datetime.utcnow() - timedelta(days=7)
-        ).count()
-        
-        previous_week_inspections = Inspection.query.filter(
-            and_(
-                Inspection.inspection_date >= datetime.utcnow() - timedelta(days=14),
-                Inspection.inspection_date < datetime.utcnow() - timedelta(days=7)
-            )
-        ).count()
+        current_week_inspections = sum(current_week.values())
+        previous_week_inspections = sum(inspections_by_status(counters, week_days[7:]).values())
         
         inspection_trend = 'up' if current_week_inspections > previous_week_inspections else 'down' if current_week_inspections < previous_week_inspections else 'stable'
         
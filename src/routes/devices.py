@@ -1,12 +1,31 @@
 from flask import Blueprint, jsonify, request, current_app
-from src.models.user import Device, Inspection, MaintenanceTask, db
+from src.models.user import Device, Inspection, Location, MaintenanceTask, User, db
 from src.routes.auth import token_required
+from src.services.reference_data import reference_data
+from src.services.table_versions import conditional_response
+from src.services.device_search import search_matches
+from src.services.device_import import IMPORT_READERS, ImportReport, import_devices
+from src.services.device_scan import device_scan_cache
+from src.services.locations import assign_location, location_filter, starts_with
+from src.services.pagination import decode_cursor, keyset_page, page_size, InvalidCursor
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
+import math
+import csv
 
 devices_bp = Blueprint('devices', __name__)
 
+# الجداول التي تعتمد عليها استجابات الأجهزة (لبناء ETag)
+DEVICE_TABLES = (Device.__tablename__, Inspection.__tablename__, MaintenanceTask.__tablename__)
+
+# عدد التشييكات والمهام في صفحة الجهاز، والباقي عبر مسارات السجل بالمؤشر
+RECENT_HISTORY_LIMIT = 5
+NOTES_PREVIEW_LENGTH = 100
+
 @devices_bp.route('/devices', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(DEVICE_TABLES)
 def get_devices(current_user):
     """الحصول على قائمة الأجهزة"""
     try:
@@ -14,6 +33,7 @@ def get_devices(current_user):
         per_page = request.args.get('per_page', 20, type=int)
         device_type = request.args.get('type', '')
         location = request.args.get('location', '')
+        location_id = request.args.get('location_id', type=int)
         status = request.args.get('status', '')
         search = request.args.get('search', '')
         
@@ -24,50 +44,49 @@ def get_devices(current_user):
         if device_type:
             query = query.filter(Device.type == device_type)
         
-        # تصفية حسب الموقع
+        # تصفية حسب الموقع وكل ما تحته في الهرمية (نطاق في الفهرس)
+        if location_id:
+            parent = db.session.get(Location, location_id)
+            if parent is None:
+                return jsonify({'message': 'الموقع غير موجود'}), 404
+            query = query.filter(starts_with(Device.location_path, parent.path))
         if location:
-            query = query.filter(Device.location.contains(location))
+            query = query.filter(location_filter(location))
         
         # تصفية حسب الحالة
         if status:
             query = query.filter(Device.status == status)
         
-        # البحث
-        if search:
-            query = query.filter(
-                (Device.name.contains(search)) |
-                (Device.location.contains(search)) |
-                (Device.serial_number.contains(search))
-            )
-        
-        # ترتيب النتائج
-        query = query.order_by(Device.name.asc())
-        
-        # تطبيق التصفح
-        devices = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        # البحث النصي عبر فهرس FTS5 مع ترتيب النتائج حسب الصلة
+        order = (Device.name.asc(), Device.id.asc())
+        matches = search_matches(search) if search else None
+        if matches is not None:
+            query = query.join(matches, matches.c.device_id == Device.id)
+            order = (matches.c.score.asc(),) + order
+        
+        # تطبيق التصفح مع حساب العدد الكلي في نفس الاستعلام
+        if page < 1:
+            page = 1
+        if per_page < 1:
+            per_page = 20
+        rows = query.add_columns(db.func.count().over().label('total')).order_by(
+            *order
+        ).limit(per_page).offset((page - 1) * per_page).all()
+        devices = [device for device, _ in rows]
+        total = rows[0].total if rows else (query.order_by(None).count() if page > 1 else 0)
+        pages = math.ceil(total / per_page) if total else 0
+        
+        maintenance_due_before = datetime.utcnow().date() + timedelta(days=7)
+        can_edit = current_user.can_manage_users()
         
         devices_data = []
-        for device in devices.items:
-            # حساب آخر تشييك
-            last_inspection = Inspection.query.filter_by(
-                device_id=device.id
-            ).order_by(Inspection.inspection_date.desc()).first()
-            
-            # حساب المهام المعلقة
-            pending_tasks = MaintenanceTask.query.filter_by(
-                device_id=device.id,
-                status='pending'
-            ).count()
-            
+        for device in devices:
             device_data = {
                 'id': device.id,
                 'name': device.name,
                 'type': device.type,
                 'location': device.location,
+                'location_id': device.location_id,
                 'serial_number': device.serial_number,
                 'installation_date': device.installation_date.isoformat() if device.installation_date else None,
                 'last_maintenance': device.last_maintenance.isoformat() if device.last_maintenance else None,
@@ -75,13 +94,13 @@ def get_devices(current_user):
                 'status': device.status,
                 'created_at': device.created_at.isoformat(),
                 'last_inspection': {
-                    'date': last_inspection.inspection_date.isoformat() if last_inspection else None,
-                    'status': last_inspection.status if last_inspection else None,
-                    'inspector': last_inspection.inspector.name if last_inspection else None
+                    'date': device.last_inspection_date.isoformat() if device.last_inspection_date else None,
+                    'status': device.last_inspection_status,
+                    'inspector': device.last_inspector_name
                 },
-                'pending_tasks': pending_tasks,
-                'maintenance_due': device.next_maintenance and device.next_maintenance <= datetime.utcnow().date() + timedelta(days=7),
-                'can_edit': current_user.can_manage_users()
+                'pending_tasks': device.pending_tasks_count,
+                'maintenance_due': device.next_maintenance and device.next_maintenance <= maintenance_due_before,
+                'can_edit': can_edit
             }
             devices_data.append(device_data)
         
@@ -89,11 +108,11 @@ def get_devices(current_user):
             'devices': devices_data,
             'pagination': {
                 'page': page,
-                'pages': devices.pages,
+                'pages': pages,
                 'per_page': per_page,
-                'total': devices.total,
-                'has_next': devices.has_next,
-                'has_prev': devices.has_prev
+                'total': total,
+                'has_next': page < pages,
+                'has_prev': page > 1
             }
         }), 200
         
@@ -118,13 +137,21 @@ def create_device(current_user):
         installation_date = data.get('installation_date')
         next_maintenance = data.get('next_maintenance')
         
+        # الموقع من الهرمية يحدد نص الموقع أيضاً
+        location_obj = None
+        if data.get('location_id'):
+            location_obj = db.session.get(Location, data['location_id'])
+            if location_obj is None:
+                return jsonify({'message': 'الموقع غير موجود'}), 404
+            location = location_obj.full_name
+        
         # التحقق من البيانات المطلوبة
         if not name or not device_type or not location:
             return jsonify({'message': 'الاسم والنوع والموقع مطلوبة'}), 400
         
-        # التحقق من عدم تكرار الرقم التسلسلي
+        # التحقق من عدم تكرار الرقم التسلسلي (بحث في الفهرس الفريد)
         if serial_number:
-            existing_device = Device.query.filter_by(serial_number=serial_number).first()
+            existing_device = db.session.query(Device.id).filter_by(serial_number=serial_number).first()
             if existing_device:
                 return jsonify({'message': 'الرقم التسلسلي مستخدم مسبقاً'}), 409
         
@@ -148,11 +175,13 @@ def create_device(current_user):
             name=name,
             type=device_type,
             location=location,
-            serial_number=serial_number,
+            serial_number=serial_number or None,
             installation_date=installation_date_obj,
             next_maintenance=next_maintenance_obj,
             status='active'
         )
+        if location_obj:
+            assign_location(new_device, location_obj)
         
         db.session.add(new_device)
         db.session.commit()
@@ -164,6 +193,7 @@ def create_device(current_user):
                 'name': new_device.name,
                 'type': new_device.type,
                 'location': new_device.location,
+                'location_id': new_device.location_id,
                 'serial_number': new_device.serial_number,
                 'installation_date': new_device.installation_date.isoformat() if new_device.installation_date else None,
                 'next_maintenance': new_device.next_maintenance.isoformat() if new_device.next_maintenance else None,
@@ -172,27 +202,87 @@ def create_device(current_user):
             }
         }), 201
         
+    except IntegrityError:
+        # طلب آخر أضاف الرقم التسلسلي نفسه بعد التحقق
+        db.session.rollback()
+        return jsonify({'message': 'الرقم التسلسلي مستخدم مسبقاً'}), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Create device error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في إنشاء الجهاز'}), 500
 
+def _inspection_history(device_id, limit, cursor=None):
+    """صفحة من تشييكات جهاز من الأحدث، بأعمدة العرض فقط واسم المفتش في نفس الاستعلام"""
+    query = db.session.query(
+        Inspection.id,
+        Inspection.inspection_date,
+        Inspection.status,
+        func.substr(Inspection.notes, 1, NOTES_PREVIEW_LENGTH + 1).label('notes'),
+        User.name.label('inspector_name')
+    ).outerjoin(User, User.id == Inspection.inspector_id).filter(Inspection.device_id == device_id)
+    rows, next_cursor = keyset_page(query, Inspection.inspection_date, Inspection.id, limit, cursor)
+    return [
+        {
+            'id': row.id,
+            'inspection_date': row.inspection_date.isoformat() if row.inspection_date else None,
+            'status': row.status,
+            'inspector_name': row.inspector_name,
+            'notes': row.notes[:NOTES_PREVIEW_LENGTH] + '...' if row.notes and len(row.notes) > NOTES_PREVIEW_LENGTH else row.notes
+        } for row in rows
+    ], next_cursor
+
+
+def _maintenance_history(device_id, limit, cursor=None):
+    """صفحة من مهام صيانة جهاز حسب الموعد من الأحدث، مع اسم المكلف في نفس الاستعلام"""
+    query = db.session.query(
+        MaintenanceTask.id,
+        MaintenanceTask.title,
+        MaintenanceTask.priority,
+        MaintenanceTask.status,
+        MaintenanceTask.scheduled_date,
+        User.name.label('assigned_user_name')
+    ).outerjoin(User, User.id == MaintenanceTask.assigned_user_id).filter(MaintenanceTask.device_id == device_id)
+    rows, next_cursor = keyset_page(query, MaintenanceTask.scheduled_date, MaintenanceTask.id, limit, cursor)
+    return [
+        {
+            'id': row.id,
+            'title': row.title,
+            'priority': row.priority,
+            'status': row.status,
+            'scheduled_date': row.scheduled_date.isoformat() if row.scheduled_date else None,
+            'assigned_user_name': row.assigned_user_name
+        } for row in rows
+    ], next_cursor
+
+
+def _history_response(device_id, history, key):
+    """استجابة صفحة من سجل جهاز، و 404 إذا كانت الصفحة الأولى فارغة والجهاز غير موجود"""
+    limit = page_size(request.args.get('limit', type=int), default=20)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor, datetime, int)
+        except InvalidCursor:
+            return jsonify({'message': 'مؤشر الصفحة غير صالح'}), 400
+    
+    items, next_cursor = history(device_id, limit, cursor or None)
+    # التحقق من وجود الجهاز فقط عندما لا توجد نتائج
+    if not items and not cursor and db.session.get(Device, device_id) is None:
+        return jsonify({'message': 'الجهاز غير موجود'}), 404
+    
+    return jsonify({key: items, 'next_cursor': next_cursor}), 200
+
 @devices_bp.route('/devices/<int:device_id>', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(DEVICE_TABLES)
 def get_device(current_user, device_id):
-    """الحصول على جهاز معين"""
+    """الحصول على جهاز معين مع آخر التشييكات والمهام (عدد ثابت من الصفوف مهما طال سجله)"""
     try:
         device = Device.query.get_or_404(device_id)
         
-        # جلب آخر التشييكات
-        recent_inspections = Inspection.query.filter_by(
-            device_id=device.id
-        ).order_by(Inspection.inspection_date.desc()).limit(5).all()
-        
-        # جلب مهام الصيانة
-        maintenance_tasks = MaintenanceTask.query.filter_by(
-            device_id=device.id
-        ).order_by(MaintenanceTask.scheduled_date.desc()).limit(5).all()
+        # آخر التشييكات ومهام الصيانة، ومؤشرات لمتابعة السجل في المسارات الفرعية
+        recent_inspections, inspections_cursor = _inspection_history(device.id, RECENT_HISTORY_LIMIT)
+        maintenance_tasks, maintenance_cursor = _maintenance_history(device.id, RECENT_HISTORY_LIMIT)
         
         return jsonify({
             'device': {
@@ -200,39 +290,86 @@ def get_device(current_user, device_id):
                 'name': device.name,
                 'type': device.type,
                 'location': device.location,
+                'location_id': device.location_id,
                 'serial_number': device.serial_number,
                 'installation_date': device.installation_date.isoformat() if device.installation_date else None,
                 'last_maintenance': device.last_maintenance.isoformat() if device.last_maintenance else None,
                 'next_maintenance': device.next_maintenance.isoformat() if device.next_maintenance else None,
                 'status': device.status,
                 'created_at': device.created_at.isoformat(),
+                'last_inspection': {
+                    'date': device.last_inspection_date.isoformat() if device.last_inspection_date else None,
+                    'status': device.last_inspection_status,
+                    'inspector': device.last_inspector_name
+                },
+                'pending_tasks': device.pending_tasks_count,
                 'can_edit': current_user.can_manage_users()
             },
-            'recent_inspections': [
-                {
-                    'id': inspection.id,
-                    'inspection_date': inspection.inspection_date.isoformat(),
-                    'status': inspection.status,
-                    'inspector_name': inspection.inspector.name,
-                    'notes': inspection.notes[:100] + '...' if inspection.notes and len(inspection.notes) > 100 else inspection.notes
-                } for inspection in recent_inspections
-            ],
-            'maintenance_tasks': [
-                {
-                    'id': task.id,
-                    'title': task.title,
-                    'priority': task.priority,
-                    'status': task.status,
-                    'scheduled_date': task.scheduled_date.isoformat() if task.scheduled_date else None,
-                    'assigned_user_name': task.assigned_user.name
-                } for task in maintenance_tasks
-            ]
+            'recent_inspections': recent_inspections,
+            'maintenance_tasks': maintenance_tasks,
+            'history': {
+                'inspections_cursor': inspections_cursor,
+                'maintenance_cursor': maintenance_cursor
+            }
         }), 200
         
     except Exception as e:
         current_app.logger.error(f"Get device error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب الجهاز'}), 500
 
+@devices_bp.route('/devices/<int:device_id>/inspections', methods=['GET'])
+@token_required(claims_only=True)
+@conditional_response(DEVICE_TABLES)
+def get_device_inspections(current_user, device_id):
+    """سجل تشييكات جهاز من الأحدث، مع ترقيم الصفحات بالمؤشر"""
+    try:
+        return _history_response(device_id, _inspection_history, 'inspections')
+        
+    except Exception as e:
+        current_app.logger.error(f"Get device inspections error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب تشييكات الجهاز'}), 500
+
+@devices_bp.route('/devices/<int:device_id>/maintenance', methods=['GET'])
+@token_required(claims_only=True)
+@conditional_response(DEVICE_TABLES)
+def get_device_maintenance(current_user, device_id):
+    """سجل مهام صيانة جهاز حسب الموعد من الأحدث، مع ترقيم الصفحات بالمؤشر"""
+    try:
+        return _history_response(device_id, _maintenance_history, 'maintenance_tasks')
+        
+    except Exception as e:
+        current_app.logger.error(f"Get device maintenance error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب مهام صيانة الجهاز'}), 500
+
+@devices_bp.route('/scan/<path:code>', methods=['GET'])
+@token_required(claims_only=True)
+def scan_device(current_user, code):
+    """مسح ملصق جهاز: الجهاز وآخر تشييك والمهام المفتوحة وقالب التشييك في استجابة واحدة"""
+    try:
+        response = device_scan_cache.response(code.strip())
+        if response is None:
+            return jsonify({'message': 'لا يوجد جهاز بهذا الرقم التسلسلي'}), 404
+        
+        return response
+        
+    except Exception as e:
+        current_app.logger.error(f"Scan device error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في مسح الجهاز'}), 500
+
+@devices_bp.route('/devices/scan-cache/stats', methods=['GET'])
+@token_required
+def get_scan_cache_stats(current_user):
+    """إحصائيات ذاكرة مسح ملصقات الأجهزة"""
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لعرض الإحصائيات'}), 403
+        
+        return jsonify({'scan_cache': device_scan_cache.stats()}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Scan cache stats error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب إحصائيات الذاكرة'}), 500
+
 @devices_bp.route('/devices/<int:device_id>', methods=['PUT'])
 @token_required
 def update_device(current_user, device_id):
@@ -251,14 +388,22 @@ def update_device(current_user, device_id):
         if 'type' in data and data['type'].strip():
             device.type = data['type'].strip()
         
-        if 'location' in data and data['location'].strip():
+        if data.get('location_id'):
+            location = db.session.get(Location, data['location_id'])
+            if location is None:
+                return jsonify({'message': 'الموقع غير موجود'}), 404
+            assign_location(device, location)
+        elif 'location' in data and data['location'].strip() and data['location'].strip() != device.location:
+            # نص حر يفصل الجهاز عن الهرمية
             device.location = data['location'].strip()
+            device.location_id = None
+            device.location_path = None
         
         if 'serial_number' in data:
             serial_number = data['serial_number'].strip()
             if serial_number and serial_number != device.serial_number:
-                # التحقق من عدم تكرار الرقم التسلسلي
-                existing_device = Device.query.filter_by(serial_number=serial_number).first()
+                # التحقق من عدم تكرار الرقم التسلسلي (بحث في الفهرس الفريد)
+                existing_device = db.session.query(Device.id).filter_by(serial_number=serial_number).first()
                 if existing_device:
                     return jsonify({'message': 'الرقم التسلسلي مستخدم مسبقاً'}), 409
                 device.serial_number = serial_number
@@ -299,6 +444,7 @@ def update_device(current_user, device_id):
                 'name': device.name,
                 'type': device.type,
                 'location': device.location,
+                'location_id': device.location_id,
                 'serial_number': device.serial_number,
                 'installation_date': device.installation_date.isoformat() if device.installation_date else None,
                 'last_maintenance': device.last_maintenance.isoformat() if device.last_maintenance else None,
@@ -307,6 +453,9 @@ def update_device(current_user, device_id):
             }
         }), 200
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'الرقم التسلسلي مستخدم مسبقاً'}), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Update device error: {str(e)}")
@@ -341,71 +490,82 @@ def delete_device(current_user, device_id):
         current_app.logger.error(f"Delete device error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في حذف الجهاز'}), 500
 
+@reference_data.catalog('device_types')
+def _device_types_catalog():
+    """أنواع الأجهزة"""
+    device_types = [
+        {'value': 'fire_extinguisher', 'label': 'طفاية حريق'},
+        {'value': 'smoke_detector', 'label': 'كاشف دخان'},
+        {'value': 'fire_alarm', 'label': 'جهاز إنذار حريق'},
+        {'value': 'sprinkler_system', 'label': 'نظام الرش'},
+        {'value': 'fire_hose', 'label': 'خرطوم حريق'},
+        {'value': 'emergency_exit', 'label': 'مخرج طوارئ'},
+        {'value': 'emergency_lighting', 'label': 'إضاءة طوارئ'},
+        {'value': 'fire_door', 'label': 'باب حريق'},
+        {'value': 'fire_pump', 'label': 'مضخة حريق'},
+        {'value': 'fire_panel', 'label': 'لوحة تحكم حريق'}
+    ]
+    
+    return {'device_types': device_types}
+
 @devices_bp.route('/devices/types', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_device_types(current_user):
     """الحصول على أنواع الأجهزة"""
     try:
-        device_types = [
-            {'value': 'fire_extinguisher', 'label': 'طفاية حريق'},
-            {'value': 'smoke_detector', 'label': 'كاشف دخان'},
-            {'value': 'fire_alarm', 'label': 'جهاز إنذار حريق'},
-            {'value': 'sprinkler_system', 'label': 'نظام الرش'},
-            {'value': 'fire_hose', 'label': 'خرطوم حريق'},
-            {'value': 'emergency_exit', 'label': 'مخرج طوارئ'},
-            {'value': 'emergency_lighting', 'label': 'إضاءة طوارئ'},
-            {'value': 'fire_door', 'label': 'باب حريق'},
-            {'value': 'fire_pump', 'label': 'مضخة حريق'},
-            {'value': 'fire_panel', 'label': 'لوحة تحكم حريق'}
-        ]
-        
-        return jsonify({'device_types': device_types}), 200
+        return reference_data.response('device_types')
         
     except Exception as e:
         current_app.logger.error(f"Get device types error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب أنواع الأجهزة'}), 500
 
+@reference_data.catalog('device_locations', columns=(Device.location, Location.full_name))
+def _device_locations_catalog():
+    """مواقع الأجهزة الحالية ومواقع الهرمية مع المواقع الافتراضية"""
+    # الحصول على المواقع من قاعدة البيانات
+    locations_query = db.session.query(Device.location).filter(
+        Device.location.isnot(None),
+        Device.location != ''
+    ).union(db.session.query(Location.full_name)).all()
+    
+    locations = [loc[0] for loc in locations_query if loc[0]]
+    
+    # إضافة مواقع افتراضية إذا لم تكن موجودة
+    default_locations = [
+        'الطابق الأول',
+        'الطابق الثاني',
+        'الطابق الثالث',
+        'القبو',
+        'المطبخ',
+        'المختبر',
+        'غرفة العمليات',
+        'العيادة الخارجية',
+        'قسم الطوارئ',
+        'المخزن',
+        'الممر الرئيسي',
+        'مدخل المبنى'
+    ]
+    
+    for location in default_locations:
+        if location not in locations:
+            locations.append(location)
+    
+    return {'locations': sorted(locations)}
+
 @devices_bp.route('/devices/locations', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_device_locations(current_user):
     """الحصول على مواقع الأجهزة"""
     try:
-        # الحصول على المواقع من قاعدة البيانات
-        locations_query = db.session.query(Device.location).filter(
-            Device.location.isnot(None),
-            Device.location != ''
-        ).distinct().all()
-        
-        locations = [loc[0] for loc in locations_query if loc[0]]
-        
-        # إضافة مواقع افتراضية إذا لم تكن موجودة
-        default_locations = [
-            'الطابق الأول',
-            'الطابق الثاني',
-            'الطابق الثالث',
-            'القبو',
-            'المطبخ',
-            'المختبر',
-            'غرفة العمليات',
-            'العيادة الخارجية',
-            'قسم الطوارئ',
-            'المخزن',
-            'الممر الرئيسي',
-            'مدخل المبنى'
-        ]
-        
-        for location in default_locations:
-            if location not in locations:
-                locations.append(location)
-        
-        return jsonify({'locations': sorted(locations)}), 200
+        return reference_data.response('device_locations')
         
     except Exception as e:
         current_app.logger.error(f"Get device locations error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب مواقع الأجهزة'}), 500
 
 @devices_bp.route('/devices/stats', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response((Device.__tablename__, Inspection.__tablename__))
 def get_devices_stats(current_user):
     """الحصول على إحصائيات الأجهزة"""
     try:
@@ -494,54 +654,23 @@ def bulk_create_devices(current_user):
         if not devices_data:
             return jsonify({'message': 'لم يتم تحديد أي أجهزة للإنشاء'}), 400
         
-        created_devices = []
-        errors = []
-        
-        for device_data in devices_data:
-            try:
-                name = device_data.get('name', '').strip()
-                device_type = device_data.get('type', '').strip()
-                location = device_data.get('location', '').strip()
-                serial_number = device_data.get('serial_number', '').strip()
-                
-                if not name or not device_type or not location:
-                    errors.append('الاسم والنوع والموقع مطلوبة')
-                    continue
-                
-                # التحقق من عدم تكرار الرقم التسلسلي
-                if serial_number:
-                    existing_device = Device.query.filter_by(serial_number=serial_number).first()
-                    if existing_device:
-                        errors.append(f'الرقم التسلسلي {serial_number} مستخدم مسبقاً')
-                        continue
-                
-                # إنشاء الجهاز
-                new_device = Device(
-                    name=name,
-                    type=device_type,
-                    location=location,
-                    serial_number=serial_number,
-                    status='active'
-                )
-                
-                db.session.add(new_device)
-                created_devices.append({
-                    'name': name,
-                    'type': device_type,
-                    'location': location
-                })
-                
-            except Exception as e:
-                errors.append(f'خطأ في إنشاء الجهاز {name}: {str(e)}')
+        if not isinstance(devices_data, list):
+            return jsonify({'message': 'صيغة قائمة الأجهزة غير صالحة'}), 400
         
-        db.session.commit()
+        created_devices = []
+        report = import_devices(enumerate(devices_data, 1), ImportReport(), on_created=lambda row: created_devices.append({
+            'name': row['name'],
+            'type': row['type'],
+            'location': row['location']
+        }))
+        errors = [error['message'] for error in report.to_dict()['errors']]
         
         return jsonify({
             'message': f'تم إنشاء {len(created_devices)} جهاز بنجاح',
             'created_devices': created_devices,
             'errors': errors,
             'total_created': len(created_devices),
-            'total_errors': len(errors)
+            'total_errors': report.total_errors
         }), 200
         
     except Exception as e:
@@ -549,3 +678,31 @@ def bulk_create_devices(current_user):
         current_app.logger.error(f"Bulk create devices error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في إنشاء الأجهزة'}), 500
 
+@devices_bp.route('/devices/import', methods=['POST'])
+@token_required
+def import_devices_stream(current_user):
+    """استيراد الأجهزة من ملف CSV أو NDJSON يُقرأ من جسم الطلب تدريجياً"""
+    report = ImportReport()
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لإضافة أجهزة'}), 403
+        
+        read_rows = IMPORT_READERS.get(request.args.get('format') or request.mimetype)
+        if read_rows is None:
+            return jsonify({'message': 'صيغة الملف غير مدعومة، استخدم CSV أو NDJSON'}), 415
+        
+        import_devices(read_rows(request.stream), report)
+        
+        return jsonify({
+            'message': f'تم إنشاء {report.total_created} جهاز بنجاح',
+            **report.to_dict()
+        }), 200
+        
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Import devices parse error: {str(e)}")
+        return jsonify({'message': 'تعذرت قراءة الملف، تأكد من أنه بترميز UTF-8', **report.to_dict()}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Import devices error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في استيراد الأجهزة', **report.to_dict()}), 500
@@ -2,6 +2,9 @@ from flask import Blueprint, jsonify, request, current_app, send_file, send_from
 from werkzeug.utils import secure_filename
 from src.models.user import UploadedFile, db
 from src.routes.auth import token_required
+from src.services.reference_data import reference_data
+from src.services.table_versions import conditional_response
+from src.services.pagination import cursor_page, InvalidCursor
 import os
 import uuid
 from datetime import datetime
@@ -173,7 +176,8 @@ def upload_files(current_user):
         return jsonify({'message': 'حدث خطأ في رفع الملفات'}), 500
 
 @files_bp.route('/files', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response((UploadedFile.__tablename__,))
 def get_files(current_user):
     """الحصول على قائمة الملفات"""
     try:
@@ -212,18 +216,34 @@ def get_files(current_user):
                 (UploadedFile.description.contains(search))
             )
         
-        # ترتيب النتائج
-        query = query.order_by(UploadedFile.upload_date.desc())
-        
-        # تطبيق التصفح
-        files = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        # التصفح بالمؤشر عند طلبه (?cursor=)، وإلا بأرقام الصفحات
+        if 'cursor' in request.args:
+            try:
+                rows, pagination = cursor_page(query, UploadedFile.upload_date, UploadedFile.id, (UploadedFile.__tablename__,))
+            except InvalidCursor:
+                return jsonify({'message': 'مؤشر الصفحة غير صالح'}), 400
+        else:
+            # ترتيب النتائج
+            query = query.order_by(UploadedFile.upload_date.desc())
+            
+            # تطبيق التصفح
+            files = query.paginate(
+                page=page,
+                per_page=per_page,
+                error_out=False
+            )
+            rows = files.items
+            pagination = {
+                'page': page,
+                'pages': files.pages,
+                'per_page': per_page,
+                'total': files.total,
+                'has_next': files.has_next,
+                'has_prev': files.has_prev
+            }
         
         files_data = []
-        for file in files.items:
+        for file in rows:
             file_data = {
                 'id': file.id,
                 'filename': file.filename,
@@ -249,14 +269,7 @@ def get_files(current_user):
         
         return jsonify({
             'files': files_data,
-            'pagination': {
-                'page': page,
-                'pages': files.pages,
-                'per_page': per_page,
-                'total': files.total,
-                'has_next': files.has_next,
-                'has_prev': files.has_prev
-            }
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -264,7 +277,8 @@ def get_files(current_user):
         return jsonify({'message': 'حدث خطأ في جلب الملفات'}), 500
 
 @files_bp.route('/files/<int:file_id>', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response((UploadedFile.__tablename__,))
 def get_file_info(current_user, file_id):
     """الحصول على معلومات ملف معين"""
     try:
@@ -297,7 +311,7 @@ def get_file_info(current_user, file_id):
         return jsonify({'message': 'حدث خطأ في جلب معلومات الملف'}), 500
 
 @files_bp.route('/files/<int:file_id>/download', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def download_file(current_user, file_id):
     """تحميل ملف"""
     try:
@@ -323,7 +337,7 @@ def download_file(current_user, file_id):
         return jsonify({'message': 'حدث خطأ في تحميل الملف'}), 500
 
 @files_bp.route('/files/<int:file_id>/preview', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def preview_file(current_user, file_id):
     """معاينة ملف (للصور فقط)"""
     try:
@@ -351,7 +365,7 @@ def preview_file(current_user, file_id):
         return jsonify({'message': 'حدث خطأ في معاينة الملف'}), 500
 
 @files_bp.route('/files/<int:file_id>/thumbnail', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_thumbnail(current_user, file_id):
     """الحصول على الصورة المصغرة"""
     try:
@@ -519,7 +533,8 @@ def bulk_delete_files(current_user):
         return jsonify({'message': 'حدث خطأ في حذف الملفات'}), 500
 
 @files_bp.route('/files/stats', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response((UploadedFile.__tablename__,))
 def get_files_stats(current_user):
     """الحصول على إحصائيات الملفات"""
     try:
@@ -590,25 +605,30 @@ def format_file_size(size_bytes):
     
     return f"{size_bytes:.1f} {size_names[i]}"
 
+@reference_data.catalog('file_categories')
+def _file_categories_catalog():
+    """فئات الملفات"""
+    categories = [
+        {'value': 'general', 'label': 'عام'},
+        {'value': 'forms', 'label': 'نماذج'},
+        {'value': 'reports', 'label': 'تقارير'},
+        {'value': 'procedures', 'label': 'إجراءات'},
+        {'value': 'training', 'label': 'تدريب'},
+        {'value': 'maintenance', 'label': 'صيانة'},
+        {'value': 'inspections', 'label': 'تشييكات'},
+        {'value': 'certificates', 'label': 'شهادات'},
+        {'value': 'manuals', 'label': 'أدلة'},
+        {'value': 'policies', 'label': 'سياسات'}
+    ]
+    
+    return {'categories': categories}
+
 @files_bp.route('/files/categories', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_file_categories(current_user):
     """الحصول على قائمة فئات الملفات"""
     try:
-        categories = [
-            {'value': 'general', 'label': 'عام'},
-            {'value': 'forms', 'label': 'نماذج'},
-            {'value': 'reports', 'label': 'تقارير'},
-            {'value': 'procedures', 'label': 'إجراءات'},
-            {'value': 'training', 'label': 'تدريب'},
-            {'value': 'maintenance', 'label': 'صيانة'},
-            {'value': 'inspections', 'label': 'تشييكات'},
-            {'value': 'certificates', 'label': 'شهادات'},
-            {'value': 'manuals', 'label': 'أدلة'},
-            {'value': 'policies', 'label': 'سياسات'}
-        ]
-        
-        return jsonify({'categories': categories}), 200
+        return reference_data.response('file_categories')
         
     except Exception as e:
         current_app.logger.error(f"Get file categories error: {str(e)}")
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request, current_app, redirect, url_for
 from src.routes.auth import token_required
+from src.services.reference_data import reference_data
 import requests
 import json
 from datetime import datetime, timedelta
@@ -261,69 +262,74 @@ def create_google_site(current_user):
         current_app.logger.error(f"Create Google Site error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في إنشاء Google Site'}), 500
 
+@reference_data.catalog('google_templates')
+def _google_templates_catalog():
+    """قوالب Google المتاحة"""
+    templates = {
+        'sheets': [
+            {
+                'id': 'fire_inspection_log',
+                'name': 'سجل تشييكات الحريق',
+                'description': 'قالب لتسجيل تشييكات أجهزة الحريق اليومية'
+            },
+            {
+                'id': 'maintenance_schedule',
+                'name': 'جدول الصيانة',
+                'description': 'قالب لجدولة أعمال الصيانة الدورية'
+            },
+            {
+                'id': 'incident_report',
+                'name': 'تقرير الحوادث',
+                'description': 'قالب لتسجيل حوادث السلامة'
+            }
+        ],
+        'forms': [
+            {
+                'id': 'daily_inspection',
+                'name': 'تشييك يومي',
+                'description': 'نموذج للتشييك اليومي لأجهزة الحريق'
+            },
+            {
+                'id': 'incident_report_form',
+                'name': 'بلاغ حادث',
+                'description': 'نموذج للإبلاغ عن حوادث السلامة'
+            },
+            {
+                'id': 'training_feedback',
+                'name': 'تقييم التدريب',
+                'description': 'نموذج لتقييم دورات التدريب'
+            }
+        ],
+        'docs': [
+            {
+                'id': 'safety_policy',
+                'name': 'سياسة السلامة',
+                'description': 'قالب لكتابة سياسات السلامة'
+            },
+            {
+                'id': 'emergency_plan',
+                'name': 'خطة الطوارئ',
+                'description': 'قالب لخطط الطوارئ والإخلاء'
+            },
+            {
+                'id': 'training_manual',
+                'name': 'دليل التدريب',
+                'description': 'قالب لأدلة التدريب على السلامة'
+            }
+        ]
+    }
+    
+    return {
+        'templates': templates,
+        'message': 'تم جلب القوالب بنجاح'
+    }
+
 @google_bp.route('/templates', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_google_templates(current_user):
     """الحصول على قوالب Google المتاحة"""
     try:
-        templates = {
-            'sheets': [
-                {
-                    'id': 'fire_inspection_log',
-                    'name': 'سجل تشييكات الحريق',
-                    'description': 'قالب لتسجيل تشييكات أجهزة الحريق اليومية'
-                },
-                {
-                    'id': 'maintenance_schedule',
-                    'name': 'جدول الصيانة',
-                    'description': 'قالب لجدولة أعمال الصيانة الدورية'
-                },
-                {
-                    'id': 'incident_report',
-                    'name': 'تقرير الحوادث',
-                    'description': 'قالب لتسجيل حوادث السلامة'
-                }
-            ],
-            'forms': [
-                {
-                    'id': 'daily_inspection',
-                    'name': 'تشييك يومي',
-                    'description': 'نموذج للتشييك اليومي لأجهزة الحريق'
-                },
-                {
-                    'id': 'incident_report_form',
-                    'name': 'بلاغ حادث',
-                    'description': 'نموذج للإبلاغ عن حوادث السلامة'
-                },
-                {
-                    'id': 'training_feedback',
-                    'name': 'تقييم التدريب',
-                    'description': 'نموذج لتقييم دورات التدريب'
-                }
-            ],
-            'docs': [
-                {
-                    'id': 'safety_policy',
-                    'name': 'سياسة السلامة',
-                    'description': 'قالب لكتابة سياسات السلامة'
-                },
-                {
-                    'id': 'emergency_plan',
-                    'name': 'خطة الطوارئ',
-                    'description': 'قالب لخطط الطوارئ والإخلاء'
-                },
-                {
-                    'id': 'training_manual',
-                    'name': 'دليل التدريب',
-                    'description': 'قالب لأدلة التدريب على السلامة'
-                }
-            ]
-        }
-        
-        return jsonify({
-            'templates': templates,
-            'message': 'تم جلب القوالب بنجاح'
-        }), 200
+        return reference_data.response('google_templates')
         
     except Exception as e:
         current_app.logger.error(f"Get Google templates error: {str(e)}")
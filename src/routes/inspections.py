@@ -1,14 +1,24 @@
 from flask import Blueprint, jsonify, request, current_app
 from src.models.user import Inspection, Device, User, db
 from src.routes.auth import token_required
+from src.services.reference_data import reference_data
+from src.services.date_ranges import range_start, range_end, day_bounds
+from src.services.table_versions import conditional_response
+from src.services.pagination import cursor_page, InvalidCursor
+from src.services.bulk_inspections import create_inspections
+from src.services.device_import import ImportReport
 from datetime import datetime, timedelta
 import json
 import os
 
 inspections_bp = Blueprint('inspections', __name__)
 
+# الجداول التي تعتمد عليها استجابات التشييكات (لبناء ETag)
+INSPECTION_TABLES = (Inspection.__tablename__, Device.__tablename__, User.__tablename__)
+
 @inspections_bp.route('/inspections', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(INSPECTION_TABLES)
 def get_inspections(current_user):
     """الحصول على قائمة التشييكات"""
     try:
@@ -40,33 +50,43 @@ def get_inspections(current_user):
         if inspector_id:
             query = query.filter(Inspection.inspector_id == inspector_id)
         
-        # تصفية حسب التاريخ
-        if date_from:
-            try:
-                from_date = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
-                query = query.filter(Inspection.inspection_date >= from_date)
-            except ValueError:
-                pass
-        
-        if date_to:
-            try:
-                to_date = datetime.fromisoformat(date_to.replace('Z', '+00:00'))
-                query = query.filter(Inspection.inspection_date <= to_date)
-            except ValueError:
-                pass
+        # تصفية حسب التاريخ بنطاق نصف مفتوح [date_from, date_to)
+        from_date = range_start(date_from) if date_from else None
+        if from_date:
+            query = query.filter(Inspection.inspection_date >= from_date)
         
-        # ترتيب النتائج
-        query = query.order_by(Inspection.inspection_date.desc())
+        to_date = range_end(date_to) if date_to else None
+        if to_date:
+            query = query.filter(Inspection.inspection_date < to_date)
         
-        # تطبيق التصفح
-        inspections = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        # التصفح بالمؤشر عند طلبه (?cursor=)، وإلا بأرقام الصفحات
+        if 'cursor' in request.args:
+            try:
+                rows, pagination = cursor_page(query, Inspection.inspection_date, Inspection.id, INSPECTION_TABLES)
+            except InvalidCursor:
+                return jsonify({'message': 'مؤشر الصفحة غير صالح'}), 400
+        else:
+            # ترتيب النتائج
+            query = query.order_by(Inspection.inspection_date.desc())
+            
+            # تطبيق التصفح
+            inspections = query.paginate(
+                page=page,
+                per_page=per_page,
+                error_out=False
+            )
+            rows = inspections.items
+            pagination = {
+                'page': page,
+                'pages': inspections.pages,
+                'per_page': per_page,
+                'total': inspections.total,
+                'has_next': inspections.has_next,
+                'has_prev': inspections.has_prev
+            }
         
         inspections_data = []
-        for inspection, device_name, device_location, inspector_name in inspections.items:
+        for inspection, device_name, device_location, inspector_name in rows:
             inspection_data = {
                 'id': inspection.id,
                 'device_id': inspection.device_id,
@@ -85,14 +105,7 @@ def get_inspections(current_user):
         
         return jsonify({
             'inspections': inspections_data,
-            'pagination': {
-                'page': page,
-                'pages': inspections.pages,
-                'per_page': per_page,
-                'total': inspections.total,
-                'has_next': inspections.has_next,
-                'has_prev': inspections.has_prev
-            }
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -165,7 +178,8 @@ def create_inspection(current_user):
         return jsonify({'message': 'حدث خطأ في إنشاء التشييك'}), 500
 
 @inspections_bp.route('/inspections/<int:inspection_id>', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(INSPECTION_TABLES)
 def get_inspection(current_user, inspection_id):
     """الحصول على تشييك معين"""
     try:
@@ -275,14 +289,17 @@ def delete_inspection(current_user, inspection_id):
         return jsonify({'message': 'حدث خطأ في حذف التشييك'}), 500
 
 @inspections_bp.route('/inspections/stats', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(INSPECTION_TABLES)
 def get_inspections_stats(current_user):
     """الحصول على إحصائيات التشييكات"""
     try:
         # إحصائيات عامة
         total_inspections = Inspection.query.count()
+        today_start, tomorrow_start = day_bounds(datetime.utcnow().date())
         today_inspections = Inspection.query.filter(
-            db.func.date(Inspection.inspection_date) == datetime.utcnow().date()
+            Inspection.inspection_date >= today_start,
+            Inspection.inspection_date < tomorrow_start
         ).count()
         
         # إحصائيات حسب الحالة
@@ -328,7 +345,7 @@ def get_inspections_stats(current_user):
             ],
             'weekly_trend': [
                 {
-                    'date': date.isoformat(),
+                    'date': str(date),
                     'count': count
                 } for date, count in weekly_inspections
             ],
@@ -345,59 +362,64 @@ def get_inspections_stats(current_user):
         current_app.logger.error(f"Get inspections stats error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب إحصائيات التشييكات'}), 500
 
+@reference_data.catalog('inspection_templates')
+def _inspection_templates_catalog():
+    """قوالب التشييك"""
+    templates = [
+        {
+            'id': 'fire_extinguisher',
+            'name': 'طفاية حريق',
+            'fields': [
+                {'name': 'pressure_gauge', 'label': 'مقياس الضغط', 'type': 'select', 'options': ['جيد', 'متوسط', 'ضعيف']},
+                {'name': 'safety_pin', 'label': 'دبوس الأمان', 'type': 'select', 'options': ['موجود', 'مفقود']},
+                {'name': 'hose_condition', 'label': 'حالة الخرطوم', 'type': 'select', 'options': ['جيد', 'متضرر']},
+                {'name': 'label_readable', 'label': 'وضوح الملصق', 'type': 'select', 'options': ['واضح', 'غير واضح']},
+                {'name': 'accessibility', 'label': 'سهولة الوصول', 'type': 'select', 'options': ['سهل', 'صعب', 'مسدود']}
+            ]
+        },
+        {
+            'id': 'smoke_detector',
+            'name': 'كاشف دخان',
+            'fields': [
+                {'name': 'led_indicator', 'label': 'مؤشر LED', 'type': 'select', 'options': ['يعمل', 'لا يعمل']},
+                {'name': 'test_button', 'label': 'زر الاختبار', 'type': 'select', 'options': ['يعمل', 'لا يعمل']},
+                {'name': 'cleanliness', 'label': 'النظافة', 'type': 'select', 'options': ['نظيف', 'متسخ']},
+                {'name': 'mounting', 'label': 'التثبيت', 'type': 'select', 'options': ['محكم', 'مفكوك']}
+            ]
+        },
+        {
+            'id': 'fire_alarm',
+            'name': 'جهاز إنذار حريق',
+            'fields': [
+                {'name': 'power_status', 'label': 'حالة الطاقة', 'type': 'select', 'options': ['يعمل', 'لا يعمل']},
+                {'name': 'sound_test', 'label': 'اختبار الصوت', 'type': 'select', 'options': ['واضح', 'ضعيف', 'لا يعمل']},
+                {'name': 'display_screen', 'label': 'شاشة العرض', 'type': 'select', 'options': ['تعمل', 'لا تعمل']},
+                {'name': 'backup_battery', 'label': 'البطارية الاحتياطية', 'type': 'select', 'options': ['جيدة', 'ضعيفة', 'تحتاج استبدال']}
+            ]
+        },
+        {
+            'id': 'emergency_exit',
+            'name': 'مخرج طوارئ',
+            'fields': [
+                {'name': 'door_operation', 'label': 'تشغيل الباب', 'type': 'select', 'options': ['سهل', 'صعب', 'مسدود']},
+                {'name': 'exit_sign', 'label': 'لافتة المخرج', 'type': 'select', 'options': ['مضيئة', 'غير مضيئة', 'مفقودة']},
+                {'name': 'pathway_clear', 'label': 'وضوح المسار', 'type': 'select', 'options': ['واضح', 'مسدود جزئياً', 'مسدود كلياً']},
+                {'name': 'emergency_lighting', 'label': 'الإضاءة الطارئة', 'type': 'select', 'options': ['تعمل', 'لا تعمل']}
+            ]
+        }
+    ]
+    
+    return {
+        'templates': templates,
+        'message': 'تم جلب قوالب التشييك بنجاح'
+    }
+
 @inspections_bp.route('/inspections/templates', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_inspection_templates(current_user):
     """الحصول على قوالب التشييك"""
     try:
-        templates = [
-            {
-                'id': 'fire_extinguisher',
-                'name': 'طفاية حريق',
-                'fields': [
-                    {'name': 'pressure_gauge', 'label': 'مقياس الضغط', 'type': 'select', 'options': ['جيد', 'متوسط', 'ضعيف']},
-                    {'name': 'safety_pin', 'label': 'دبوس الأمان', 'type': 'select', 'options': ['موجود', 'مفقود']},
-                    {'name': 'hose_condition', 'label': 'حالة الخرطوم', 'type': 'select', 'options': ['جيد', 'متضرر']},
-                    {'name': 'label_readable', 'label': 'وضوح الملصق', 'type': 'select', 'options': ['واضح', 'غير واضح']},
-                    {'name': 'accessibility', 'label': 'سهولة الوصول', 'type': 'select', 'options': ['سهل', 'صعب', 'مسدود']}
-                ]
-            },
-            {
-                'id': 'smoke_detector',
-                'name': 'كاشف دخان',
-                'fields': [
-                    {'name': 'led_indicator', 'label': 'مؤشر LED', 'type': 'select', 'options': ['يعمل', 'لا يعمل']},
-                    {'name': 'test_button', 'label': 'زر الاختبار', 'type': 'select', 'options': ['يعمل', 'لا يعمل']},
-                    {'name': 'cleanliness', 'label': 'النظافة', 'type': 'select', 'options': ['نظيف', 'متسخ']},
-                    {'name': 'mounting', 'label': 'التثبيت', 'type': 'select', 'options': ['محكم', 'مفكوك']}
-                ]
-            },
-            {
-                'id': 'fire_alarm',
-                'name': 'جهاز إنذار حريق',
-                'fields': [
-                    {'name': 'power_status', 'label': 'حالة الطاقة', 'type': 'select', 'options': ['يعمل', 'لا يعمل']},
-                    {'name': 'sound_test', 'label': 'اختبار الصوت', 'type': 'select', 'options': ['واضح', 'ضعيف', 'لا يعمل']},
-                    {'name': 'display_screen', 'label': 'شاشة العرض', 'type': 'select', 'options': ['تعمل', 'لا تعمل']},
-                    {'name': 'backup_battery', 'label': 'البطارية الاحتياطية', 'type': 'select', 'options': ['جيدة', 'ضعيفة', 'تحتاج استبدال']}
-                ]
-            },
-            {
-                'id': 'emergency_exit',
-                'name': 'مخرج طوارئ',
-                'fields': [
-                    {'name': 'door_operation', 'label': 'تشغيل الباب', 'type': 'select', 'options': ['سهل', 'صعب', 'مسدود']},
-                    {'name': 'exit_sign', 'label': 'لافتة المخرج', 'type': 'select', 'options': ['مضيئة', 'غير مضيئة', 'مفقودة']},
-                    {'name': 'pathway_clear', 'label': 'وضوح المسار', 'type': 'select', 'options': ['واضح', 'مسدود جزئياً', 'مسدود كلياً']},
-                    {'name': 'emergency_lighting', 'label': 'الإضاءة الطارئة', 'type': 'select', 'options': ['تعمل', 'لا تعمل']}
-                ]
-            }
-        ]
-        
-        return jsonify({
-            'templates': templates,
-            'message': 'تم جلب قوالب التشييك بنجاح'
-        }), 200
+        return reference_data.response('inspection_templates')
         
     except Exception as e:
         current_app.logger.error(f"Get inspection templates error: {str(e)}")
@@ -414,58 +436,30 @@ def bulk_create_inspections(current_user):
         if not inspections_data:
             return jsonify({'message': 'لم يتم تحديد أي تشييكات للإنشاء'}), 400
         
-        created_inspections = []
-        errors = []
-        
-        for inspection_data in inspections_data:
-            try:
-                device_id = inspection_data.get('device_id')
-                status = inspection_data.get('status', 'good')
-                notes = inspection_data.get('notes', '')
-                images = inspection_data.get('images', [])
-                
-                if not device_id:
-                    errors.append('معرف الجهاز مطلوب')
-                    continue
-                
-                # التحقق من وجود الجهاز
-                device = Device.query.get(device_id)
-                if not device:
-                    errors.append(f'الجهاز {device_id} غير موجود')
-                    continue
-                
-                # إنشاء التشييك
-                new_inspection = Inspection(
-                    device_id=device_id,
-                    inspector_id=current_user.id,
-                    inspection_date=datetime.utcnow(),
-                    status=status,
-                    notes=notes,
-                    images=json.dumps(images) if images else None
-                )
-                
-                db.session.add(new_inspection)
-                created_inspections.append({
-                    'device_id': device_id,
-                    'device_name': device.name,
-                    'status': status
-                })
-                
-            except Exception as e:
-                errors.append(f'خطأ في إنشاء تشييك للجهاز {device_id}: {str(e)}')
+        if not isinstance(inspections_data, list):
+            return jsonify({'message': 'صيغة قائمة التشييكات غير صالحة'}), 400
         
-        db.session.commit()
+        created_inspections = []
+        report = create_inspections(
+            enumerate(inspections_data, 1), current_user.id, ImportReport(),
+            on_created=lambda row, device_name: created_inspections.append({
+                'id': row['id'],
+                'device_id': row['device_id'],
+                'device_name': device_name,
+                'status': row['status']
+            })
+        )
+        errors = [error['message'] for error in report.to_dict()['errors']]
         
         return jsonify({
             'message': f'تم إنشاء {len(created_inspections)} تشييك بنجاح',
             'created_inspections': created_inspections,
             'errors': errors,
             'total_created': len(created_inspections),
-            'total_errors': len(errors)
+            'total_errors': report.total_errors
         }), 200
         
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Bulk create inspections error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في إنشاء التشييكات'}), 500
-
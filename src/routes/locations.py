@@ -0,0 +1,204 @@
+from flask import Blueprint, jsonify, request, current_app
+from src.models.user import Device, Location, DashboardCounter, db
+from src.routes.auth import token_required
+from src.services.dashboard_counters import read_location_totals
+from src.services.locations import (
+    LOCATION_KINDS, LOCATION_KIND_LABELS, ancestor_ids, child_kind, create_location, location_to_dict, move_location, starts_with
+)
+from src.services.table_versions import conditional_response
+
+locations_bp = Blueprint('locations', __name__)
+
+# المجاميع من جدول العدادات، لذلك يعتمد ETag عليه أيضاً
+LOCATION_TABLES = (Location.__tablename__, DashboardCounter.__tablename__)
+
+
+def _with_totals(locations):
+    totals = read_location_totals([location.id for location in locations])
+    return [location_to_dict(location, totals[location.id]) for location in locations]
+
+
+def _sibling_exists(parent_id, name, exclude_id=None):
+    query = Location.query.filter(Location.parent_id == parent_id, Location.name == name)
+    if exclude_id:
+        query = query.filter(Location.id != exclude_id)
+    return db.session.query(query.exists()).scalar()
+
+
+@locations_bp.route('/locations', methods=['GET'])
+@token_required(claims_only=True)
+@conditional_response(LOCATION_TABLES)
+def get_locations(current_user):
+    """المواقع الفرعية لموقع معين (أو المباني عند عدم تحديده) مع مجاميعها"""
+    try:
+        parent_id = request.args.get('parent_id', type=int)
+        locations = Location.query.filter(Location.parent_id == parent_id).order_by(Location.name, Location.id).all()
+        
+        return jsonify({'locations': _with_totals(locations)}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get locations error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب المواقع'}), 500
+
+@locations_bp.route('/locations/tree', methods=['GET'])
+@token_required(claims_only=True)
+@conditional_response(LOCATION_TABLES)
+def get_locations_tree(current_user):
+    """شجرة المواقع كاملة مع مجاميع كل موقع"""
+    try:
+        locations = Location.query.order_by(Location.name, Location.id).all()
+        
+        nodes = {}
+        roots = []
+        for node in _with_totals(locations):
+            node['children'] = []
+            nodes[node['id']] = node
+        for node in nodes.values():
+            parent = nodes.get(node['parent_id'])
+            (parent['children'] if parent else roots).append(node)
+        
+        return jsonify({'locations': roots}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get locations tree error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب شجرة المواقع'}), 500
+
+@locations_bp.route('/locations/<int:location_id>', methods=['GET'])
+@token_required(claims_only=True)
+@conditional_response(LOCATION_TABLES)
+def get_location(current_user, location_id):
+    """موقع واحد مع مساره من المبنى ومواقعه الفرعية"""
+    try:
+        location = Location.query.get_or_404(location_id)
+        
+        ancestors = {
+            ancestor.id: ancestor for ancestor in
+            Location.query.filter(Location.id.in_(ancestor_ids(location.path)[:-1])).all()
+        }
+        children = Location.query.filter(Location.parent_id == location.id).order_by(Location.name, Location.id).all()
+        totals = read_location_totals([location.id] + [child.id for child in children])
+        
+        return jsonify({
+            'location': location_to_dict(location, totals[location.id]),
+            'ancestors': [
+                {'id': ancestor.id, 'name': ancestor.name, 'kind': ancestor.kind}
+                for ancestor in (ancestors[ancestor_id] for ancestor_id in ancestor_ids(location.path)[:-1])
+            ],
+            'children': [location_to_dict(child, totals[child.id]) for child in children]
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Get location error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في جلب الموقع'}), 500
+
+@locations_bp.route('/locations', methods=['POST'])
+@token_required
+def create_location_route(current_user):
+    """إضافة موقع (مبنى أو طابق أو منطقة أو غرفة)"""
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لإدارة المواقع'}), 403
+        
+        data = request.get_json()
+        name = data.get('name', '').strip()
+        parent_id = data.get('parent_id')
+        
+        if not name:
+            return jsonify({'message': 'اسم الموقع مطلوب'}), 400
+        
+        parent = None
+        if parent_id:
+            parent = db.session.get(Location, parent_id)
+            if parent is None:
+                return jsonify({'message': 'الموقع الأب غير موجود'}), 404
+        
+        # المستوى يُحدد من الأب: مبنى ← طابق ← منطقة ← غرفة
+        kind = child_kind(parent)
+        if kind is None:
+            return jsonify({'message': 'لا يمكن إضافة مواقع داخل غرفة'}), 400
+        if data.get('kind') and data['kind'] != kind:
+            return jsonify({'message': f'يجب أن يكون مستوى الموقع {LOCATION_KIND_LABELS[kind]}', 'kinds': LOCATION_KINDS}), 400
+        
+        if _sibling_exists(parent.id if parent else None, name):
+            return jsonify({'message': 'يوجد موقع بنفس الاسم في هذا المستوى'}), 409
+        
+        location = create_location(name, kind, parent)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'تم إنشاء الموقع بنجاح',
+            'location': location_to_dict(location)
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Create location error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في إنشاء الموقع'}), 500
+
+@locations_bp.route('/locations/<int:location_id>', methods=['PUT'])
+@token_required
+def update_location(current_user, location_id):
+    """تغيير اسم موقع أو نقله تحت موقع آخر من نفس المستوى الأعلى"""
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لإدارة المواقع'}), 403
+        
+        location = Location.query.get_or_404(location_id)
+        data = request.get_json()
+        
+        name = data.get('name', location.name).strip()
+        if not name:
+            return jsonify({'message': 'اسم الموقع مطلوب'}), 400
+        
+        parent = db.session.get(Location, location.parent_id) if location.parent_id else None
+        if 'parent_id' in data:
+            parent = db.session.get(Location, data['parent_id']) if data['parent_id'] else None
+            if data['parent_id'] and parent is None:
+                return jsonify({'message': 'الموقع الأب غير موجود'}), 404
+            if parent and parent.path.startswith(location.path):
+                return jsonify({'message': 'لا يمكن نقل الموقع إلى داخل نفسه'}), 400
+            if child_kind(parent) != location.kind:
+                return jsonify({'message': 'لا يمكن نقل الموقع إلى مستوى مختلف'}), 400
+        
+        if _sibling_exists(parent.id if parent else None, name, exclude_id=location.id):
+            return jsonify({'message': 'يوجد موقع بنفس الاسم في هذا المستوى'}), 409
+        
+        move_location(location, name, parent)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'تم تحديث الموقع بنجاح',
+            'location': location_to_dict(location)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Update location error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في تحديث الموقع'}), 500
+
+@locations_bp.route('/locations/<int:location_id>', methods=['DELETE'])
+@token_required
+def delete_location(current_user, location_id):
+    """حذف موقع فارغ (بدون مواقع فرعية أو أجهزة)"""
+    try:
+        if not current_user.can_manage_users():
+            return jsonify({'message': 'ليس لديك صلاحية لإدارة المواقع'}), 403
+        
+        location = Location.query.get_or_404(location_id)
+        
+        has_children = db.session.query(Location.query.filter(Location.parent_id == location.id).exists()).scalar()
+        has_devices = db.session.query(
+            Device.query.filter(starts_with(Device.location_path, location.path)).exists()
+        ).scalar()
+        if has_children or has_devices:
+            return jsonify({'message': 'لا يمكن حذف موقع يحتوي على مواقع فرعية أو أجهزة'}), 409
+        
+        db.session.delete(location)
+        db.session.commit()
+        
+        return jsonify({'message': 'تم حذف الموقع بنجاح'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Delete location error: {str(e)}")
+        return jsonify({'message': 'حدث خطأ في حذف الموقع'}), 500
@@ -1,13 +1,28 @@
 from flask import Blueprint, jsonify, request, current_app
 from src.models.user import MaintenanceTask, Device, User, db
 from src.routes.auth import token_required
+from src.services.reference_data import reference_data
+from src.services.date_ranges import range_start, range_end
+from src.services.table_versions import conditional_response
+from src.services.pagination import cursor_page, InvalidCursor
 from datetime import datetime, timedelta
 import json
 
 maintenance_bp = Blueprint('maintenance', __name__)
 
+# الجداول التي تعتمد عليها استجابات الصيانة (لبناء ETag)
+MAINTENANCE_TABLES = (MaintenanceTask.__tablename__, Device.__tablename__, User.__tablename__)
+
+def overdue_clock():
+    """عدد المهام المعلقة التي تجاوزت موعدها، يزيد عندما تتأخر مهمة بمرور الوقت فيتغير is_overdue"""
+    return MaintenanceTask.query.filter(
+        MaintenanceTask.status == 'pending',
+        MaintenanceTask.scheduled_date < datetime.utcnow()
+    ).count()
+
 @maintenance_bp.route('/maintenance', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(MAINTENANCE_TABLES, clock=overdue_clock)
 def get_maintenance_tasks(current_user):
     """الحصول على قائمة مهام الصيانة"""
     try:
@@ -44,33 +59,45 @@ def get_maintenance_tasks(current_user):
         if assigned_user_id:
             query = query.filter(MaintenanceTask.assigned_user_id == assigned_user_id)
         
-        # تصفية حسب التاريخ
-        if date_from:
-            try:
-                from_date = datetime.fromisoformat(date_from.replace('Z', '+00:00'))
-                query = query.filter(MaintenanceTask.scheduled_date >= from_date)
-            except ValueError:
-                pass
+        # تصفية حسب التاريخ بنطاق نصف مفتوح [date_from, date_to)
+        from_date = range_start(date_from) if date_from else None
+        if from_date:
+            query = query.filter(MaintenanceTask.scheduled_date >= from_date)
         
-        if date_to:
-            try:
-                to_date = datetime.fromisoformat(date_to.replace('Z', '+00:00'))
-                query = query.filter(MaintenanceTask.scheduled_date <= to_date)
-            except ValueError:
-                pass
-        
-        # ترتيب النتائج
-        query = query.order_by(MaintenanceTask.scheduled_date.asc())
+        to_date = range_end(date_to) if date_to else None
+        if to_date:
+            query = query.filter(MaintenanceTask.scheduled_date < to_date)
         
-        # تطبيق التصفح
-        tasks = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+        # التصفح بالمؤشر عند طلبه (?cursor=)، وإلا بأرقام الصفحات
+        if 'cursor' in request.args:
+            try:
+                rows, pagination = cursor_page(
+                    query, MaintenanceTask.scheduled_date, MaintenanceTask.id, MAINTENANCE_TABLES, descending=False
+                )
+            except InvalidCursor:
+                return jsonify({'message': 'مؤشر الصفحة غير صالح'}), 400
+        else:
+            # ترتيب النتائج
+            query = query.order_by(MaintenanceTask.scheduled_date.asc())
+            
+            # تطبيق التصفح
+            tasks = query.paginate(
+                page=page,
+                per_page=per_page,
+                error_out=False
+            )
+            rows = tasks.items
+            pagination = {
+                'page': page,
+                'pages': tasks.pages,
+                'per_page': per_page,
+                'total': tasks.total,
+                'has_next': tasks.has_next,
+                'has_prev': tasks.has_prev
+            }
         
         tasks_data = []
-        for task, device_name, device_location, assigned_user_name in tasks.items:
+        for task, device_name, device_location, assigned_user_name in rows:
             task_data = {
                 'id': task.id,
                 'device_id': task.device_id,
@@ -94,14 +121,7 @@ def get_maintenance_tasks(current_user):
         
         return jsonify({
             'tasks': tasks_data,
-            'pagination': {
-                'page': page,
-                'pages': tasks.pages,
-                'per_page': per_page,
-                'total': tasks.total,
-                'has_next': tasks.has_next,
-                'has_prev': tasks.has_prev
-            }
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -182,7 +202,8 @@ def create_maintenance_task(current_user):
         return jsonify({'message': 'حدث خطأ في إنشاء مهمة الصيانة'}), 500
 
 @maintenance_bp.route('/maintenance/<int:task_id>', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(MAINTENANCE_TABLES, clock=overdue_clock)
 def get_maintenance_task(current_user, task_id):
     """الحصول على مهمة صيانة معينة"""
     try:
@@ -319,7 +340,7 @@ def delete_maintenance_task(current_user, task_id):
         return jsonify({'message': 'حدث خطأ في حذف مهمة الصيانة'}), 500
 
 @maintenance_bp.route('/maintenance/stats', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_maintenance_stats(current_user):
     """الحصول على إحصائيات الصيانة"""
     try:
@@ -347,7 +368,7 @@ def get_maintenance_stats(current_user):
         user_stats = db.session.query(
             User.name,
             db.func.count(MaintenanceTask.id).label('total'),
-            db.func.sum(db.case([(MaintenanceTask.status == 'completed', 1)], else_=0)).label('completed')
+            db.func.sum(db.case((MaintenanceTask.status == 'completed', 1), else_=0)).label('completed')
         ).join(MaintenanceTask).group_by(User.id, User.name).all()
         
         # إحصائيات الأسبوع الماضي
@@ -390,7 +411,7 @@ def get_maintenance_stats(current_user):
             ],
             'weekly_trend': [
                 {
-                    'date': date.isoformat(),
+                    'date': str(date),
                     'count': count
                 } for date, count in weekly_tasks
             ],
@@ -408,29 +429,16 @@ def get_maintenance_stats(current_user):
         return jsonify({'message': 'حدث خطأ في جلب إحصائيات الصيانة'}), 500
 
 @maintenance_bp.route('/maintenance/schedule', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_maintenance_schedule(current_user):
     """الحصول على جدول الصيانة"""
     try:
         start_date = request.args.get('start_date', '')
         end_date = request.args.get('end_date', '')
         
-        # تحديد نطاق التاريخ
-        if start_date:
-            try:
-                start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            except ValueError:
-                start = datetime.utcnow()
-        else:
-            start = datetime.utcnow()
-        
-        if end_date:
-            try:
-                end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            except ValueError:
-                end = start + timedelta(days=30)
-        else:
-            end = start + timedelta(days=30)
+        # تحديد نطاق التاريخ [start, end)
+        start = (range_start(start_date) if start_date else None) or datetime.utcnow()
+        end = (range_end(end_date) if end_date else None) or start + timedelta(days=30)
         
         # جلب المهام في النطاق المحدد
         tasks = db.session.query(
@@ -440,7 +448,7 @@ def get_maintenance_schedule(current_user):
             User.name.label('assigned_user_name')
         ).join(Device).join(User).filter(
             MaintenanceTask.scheduled_date >= start,
-            MaintenanceTask.scheduled_date <= end
+            MaintenanceTask.scheduled_date < end
         ).order_by(MaintenanceTask.scheduled_date.asc()).all()
         
         schedule_data = []
@@ -468,73 +476,78 @@ def get_maintenance_schedule(current_user):
         current_app.logger.error(f"Get maintenance schedule error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب جدول الصيانة'}), 500
 
+@reference_data.catalog('maintenance_templates')
+def _maintenance_templates_catalog():
+    """قوالب الصيانة"""
+    templates = [
+        {
+            'id': 'monthly_inspection',
+            'name': 'تشييك شهري',
+            'description': 'تشييك شهري شامل لجميع أجهزة السلامة',
+            'priority': 'medium',
+            'estimated_duration': 120,  # بالدقائق
+            'checklist': [
+                'فحص مقياس الضغط',
+                'اختبار آلية التشغيل',
+                'فحص الخراطيم والوصلات',
+                'تنظيف الجهاز',
+                'فحص الملصقات والتعليمات'
+            ]
+        },
+        {
+            'id': 'quarterly_maintenance',
+            'name': 'صيانة ربع سنوية',
+            'description': 'صيانة دورية كل 3 أشهر',
+            'priority': 'high',
+            'estimated_duration': 180,
+            'checklist': [
+                'فحص شامل للأجزاء الداخلية',
+                'استبدال القطع المستهلكة',
+                'معايرة الأجهزة',
+                'اختبار الأداء',
+                'تحديث السجلات'
+            ]
+        },
+        {
+            'id': 'annual_overhaul',
+            'name': 'مراجعة سنوية',
+            'description': 'مراجعة شاملة سنوية',
+            'priority': 'high',
+            'estimated_duration': 300,
+            'checklist': [
+                'فحص شامل لجميع المكونات',
+                'استبدال الأجزاء حسب الحاجة',
+                'اختبار الأداء الكامل',
+                'تحديث الشهادات',
+                'إعداد تقرير مفصل'
+            ]
+        },
+        {
+            'id': 'emergency_repair',
+            'name': 'إصلاح طارئ',
+            'description': 'إصلاح عاجل للأعطال الطارئة',
+            'priority': 'urgent',
+            'estimated_duration': 60,
+            'checklist': [
+                'تشخيص العطل',
+                'إصلاح المشكلة',
+                'اختبار التشغيل',
+                'توثيق الإصلاح'
+            ]
+        }
+    ]
+    
+    return {
+        'templates': templates,
+        'message': 'تم جلب قوالب الصيانة بنجاح'
+    }
+
 @maintenance_bp.route('/maintenance/templates', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_maintenance_templates(current_user):
     """الحصول على قوالب الصيانة"""
     try:
-        templates = [
-            {
-                'id': 'monthly_inspection',
-                'name': 'تشييك شهري',
-                'description': 'تشييك شهري شامل لجميع أجهزة السلامة',
-                'priority': 'medium',
-                'estimated_duration': 120,  # بالدقائق
-                'checklist': [
-                    'فحص مقياس الضغط',
-                    'اختبار آلية التشغيل',
-                    'فحص الخراطيم والوصلات',
-                    'تنظيف الجهاز',
-                    'فحص الملصقات والتعليمات'
-                ]
-            },
-            {
-                'id': 'quarterly_maintenance',
-                'name': 'صيانة ربع سنوية',
-                'description': 'صيانة دورية كل 3 أشهر',
-                'priority': 'high',
-                'estimated_duration': 180,
-                'checklist': [
-                    'فحص شامل للأجزاء الداخلية',
-                    'استبدال القطع المستهلكة',
-                    'معايرة الأجهزة',
-                    'اختبار الأداء',
-                    'تحديث السجلات'
-                ]
-            },
-            {
-                'id': 'annual_overhaul',
-                'name': 'مراجعة سنوية',
-                'description': 'مراجعة شاملة سنوية',
-                'priority': 'high',
-                'estimated_duration': 300,
-                'checklist': [
-                    'فحص شامل لجميع المكونات',
-                    'استبدال الأجزاء حسب الحاجة',
-                    'اختبار الأداء الكامل',
-                    'تحديث الشهادات',
-                    'إعداد تقرير مفصل'
-                ]
-            },
-            {
-                'id': 'emergency_repair',
-                'name': 'إصلاح طارئ',
-                'description': 'إصلاح عاجل للأعطال الطارئة',
-                'priority': 'urgent',
-                'estimated_duration': 60,
-                'checklist': [
-                    'تشخيص العطل',
-                    'إصلاح المشكلة',
-                    'اختبار التشغيل',
-                    'توثيق الإصلاح'
-                ]
-            }
-        ]
-        
-        return jsonify({
-            'templates': templates,
-            'message': 'تم جلب قوالب الصيانة بنجاح'
-        }), 200
+        return reference_data.response('maintenance_templates')
         
     except Exception as e:
         current_app.logger.error(f"Get maintenance templates error: {str(e)}")
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request, current_app
-from src.models.user import AutoSaveData, db
+from src.models.user import AutoSaveData, User, db
 from src.routes.auth import token_required
+from src.services.table_versions import conditional_response
 from datetime import datetime
 import json
 
@@ -54,6 +55,7 @@ def save_data(current_user):
 
 @sync_bp.route('/restore', methods=['GET'])
 @token_required
+@conditional_response((AutoSaveData.__tablename__,))
 def restore_data(current_user):
     """استعادة البيانات المحفوظة"""
     try:
@@ -90,6 +92,7 @@ def restore_data(current_user):
 
 @sync_bp.route('/sync-all', methods=['GET'])
 @token_required
+@conditional_response((AutoSaveData.__tablename__,))
 def sync_all_data(current_user):
     """مزامنة جميع البيانات المحفوظة للمستخدم"""
     try:
@@ -150,6 +153,7 @@ def clear_saved_data(current_user):
 
 @sync_bp.route('/export', methods=['GET'])
 @token_required
+@conditional_response((AutoSaveData.__tablename__, User.__tablename__))
 def export_data(current_user):
     """تصدير البيانات المحفوظة"""
     try:
@@ -246,6 +250,7 @@ def import_data(current_user):
 
 @sync_bp.route('/stats', methods=['GET'])
 @token_required
+@conditional_response((AutoSaveData.__tablename__,))
 def get_sync_stats(current_user):
     """الحصول على إحصائيات المزامنة"""
     try:
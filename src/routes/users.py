@@ -1,10 +1,19 @@
 from flask import Blueprint, jsonify, request, current_app
 from src.models.user import User, UserProfile, db
-from src.routes.auth import token_required
+from src.routes.auth import token_required, hasher_busy_response
+from src.services.password_hasher import HasherBusy
+from src.services.token_cache import invalidate_user_tokens
+from src.services.token_revocation import bump_token_version, revoke_sessions
+from src.services.reference_data import reference_data
+from src.services.table_versions import conditional_response
+from src.services.pagination import cursor_page, InvalidCursor
 from datetime import datetime
 
 users_bp = Blueprint('users', __name__)
 
+# الجداول التي تعتمد عليها استجابات المستخدمين (لبناء ETag)
+USER_TABLES = (User.__tablename__, UserProfile.__tablename__)
+
 def admin_required(f):
     """ديكوريتر للتحقق من صلاحيات المدير"""
     def admin_decorated(current_user, *args, **kwargs):
@@ -15,7 +24,8 @@ def admin_required(f):
     return admin_decorated
 
 @users_bp.route('/users', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(USER_TABLES)
 def get_all_users(current_user):
     """الحصول على جميع المستخدمين"""
     try:
@@ -54,19 +64,24 @@ def get_all_users(current_user):
             active_status = is_active.lower() == 'true'
             query = query.filter(User.is_active == active_status)
         
-        # ترتيب النتائج
-        query = query.order_by(User.created_at.desc())
-        
-        # تطبيق التصفح
-        users = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
-        
-        return jsonify({
-            'users': [user.to_dict() for user in users.items],
-            'pagination': {
+        # التصفح بالمؤشر عند طلبه (?cursor=)، وإلا بأرقام الصفحات
+        if 'cursor' in request.args:
+            try:
+                rows, pagination = cursor_page(query, User.created_at, User.id, USER_TABLES, default=10)
+            except InvalidCursor:
+                return jsonify({'message': 'مؤشر الصفحة غير صالح'}), 400
+        else:
+            # ترتيب النتائج
+            query = query.order_by(User.created_at.desc())
+            
+            # تطبيق التصفح
+            users = query.paginate(
+                page=page,
+                per_page=per_page,
+                error_out=False
+            )
+            rows = users.items
+            pagination = {
                 'page': page,
                 'pages': users.pages,
                 'per_page': per_page,
@@ -74,6 +89,10 @@ def get_all_users(current_user):
                 'has_next': users.has_next,
                 'has_prev': users.has_prev
             }
+        
+        return jsonify({
+            'users': [user.to_dict() for user in rows],
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -81,7 +100,8 @@ def get_all_users(current_user):
         return jsonify({'message': 'حدث خطأ في جلب المستخدمين'}), 500
 
 @users_bp.route('/users/<int:user_id>', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(USER_TABLES)
 def get_user(current_user, user_id):
     """الحصول على مستخدم معين"""
     try:
@@ -161,6 +181,9 @@ def create_user(current_user):
             'temp_password': temp_password if not send_invitation else None
         }), 201
         
+    except HasherBusy as e:
+        db.session.rollback()
+        return hasher_busy_response(e)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Create user error: {str(e)}")
@@ -192,15 +215,18 @@ def update_user(current_user, user_id):
             user.phone = data['phone'].strip()
         
         # تحديث الدور (للمدير فقط)
-        if 'role' in data and current_user.can_manage_users():
+        if 'role' in data and current_user.can_manage_users() and data['role'] != user.role:
             user.role = data['role']
+            bump_token_version(user)
         
         # تحديث الحالة (للمدير فقط)
-        if 'is_active' in data and current_user.can_manage_users():
+        if 'is_active' in data and current_user.can_manage_users() and data['is_active'] != user.is_active:
             user.is_active = data['is_active']
+            bump_token_version(user)
         
         user.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_user_tokens(user.id)
         
         return jsonify({
             'message': 'تم تحديث المستخدم بنجاح',
@@ -230,6 +256,7 @@ def delete_user(current_user, user_id):
         # حذف المستخدم
         db.session.delete(user)
         db.session.commit()
+        invalidate_user_tokens(user_id)
         
         return jsonify({'message': 'تم حذف المستخدم بنجاح'}), 200
         
@@ -246,8 +273,10 @@ def activate_user(current_user, user_id):
     try:
         user = User.query.get_or_404(user_id)
         user.is_active = True
+        bump_token_version(user)
         user.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_user_tokens(user.id)
         
         return jsonify({
             'message': 'تم تفعيل المستخدم بنجاح',
@@ -270,8 +299,10 @@ def deactivate_user(current_user, user_id):
         
         user = User.query.get_or_404(user_id)
         user.is_active = False
+        bump_token_version(user)
         user.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_user_tokens(user.id)
         
         return jsonify({
             'message': 'تم إلغاء تفعيل المستخدم بنجاح',
@@ -296,74 +327,91 @@ def admin_reset_password(current_user, user_id):
         
         # تعيين كلمة المرور الجديدة
         user.set_password(new_password)
+        bump_token_version(user)
+        revoke_sessions(user)
         user.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_user_tokens(user.id)
         
         return jsonify({
             'message': 'تم إعادة تعيين كلمة المرور بنجاح',
             'temp_password': new_password
         }), 200
         
+    except HasherBusy as e:
+        db.session.rollback()
+        return hasher_busy_response(e)
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Admin reset password error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في إعادة تعيين كلمة المرور'}), 500
 
+@reference_data.catalog('user_roles')
+def _user_roles_catalog():
+    """الأدوار المتاحة"""
+    roles = [
+        {'value': 'user', 'label': 'مستخدم'},
+        {'value': 'technician', 'label': 'فني صيانة'},
+        {'value': 'safety_manager', 'label': 'مسؤول سلامة'},
+        {'value': 'admin', 'label': 'مدير'},
+        {'value': 'super_admin', 'label': 'مدير عام'}
+    ]
+    
+    return {'roles': roles}
+
 @users_bp.route('/users/roles', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_user_roles(current_user):
     """الحصول على قائمة الأدوار المتاحة"""
     try:
-        roles = [
-            {'value': 'user', 'label': 'مستخدم'},
-            {'value': 'technician', 'label': 'فني صيانة'},
-            {'value': 'safety_manager', 'label': 'مسؤول سلامة'},
-            {'value': 'admin', 'label': 'مدير'},
-            {'value': 'super_admin', 'label': 'مدير عام'}
-        ]
-        
-        return jsonify({'roles': roles}), 200
+        return reference_data.response('user_roles')
         
     except Exception as e:
         current_app.logger.error(f"Get user roles error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب الأدوار'}), 500
 
+@reference_data.catalog('departments', columns=(User.department,))
+def _departments_catalog():
+    """أقسام المستخدمين الحالية مع الأقسام الافتراضية"""
+    # الحصول على الأقسام من قاعدة البيانات
+    departments_query = db.session.query(User.department).filter(
+        User.department.isnot(None),
+        User.department != ''
+    ).distinct().all()
+    
+    departments = [dept[0] for dept in departments_query if dept[0]]
+    
+    # إضافة أقسام افتراضية إذا لم تكن موجودة
+    default_departments = [
+        'إدارة السلامة',
+        'الصيانة',
+        'الطوارئ',
+        'الإدارة العامة',
+        'التمريض',
+        'الأطباء',
+        'الأمن'
+    ]
+    
+    for dept in default_departments:
+        if dept not in departments:
+            departments.append(dept)
+    
+    return {'departments': sorted(departments)}
+
 @users_bp.route('/users/departments', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
 def get_departments(current_user):
     """الحصول على قائمة الأقسام"""
     try:
-        # الحصول على الأقسام من قاعدة البيانات
-        departments_query = db.session.query(User.department).filter(
-            User.department.isnot(None),
-            User.department != ''
-        ).distinct().all()
-        
-        departments = [dept[0] for dept in departments_query if dept[0]]
-        
-        # إضافة أقسام افتراضية إذا لم تكن موجودة
-        default_departments = [
-            'إدارة السلامة',
-            'الصيانة',
-            'الطوارئ',
-            'الإدارة العامة',
-            'التمريض',
-            'الأطباء',
-            'الأمن'
-        ]
-        
-        for dept in default_departments:
-            if dept not in departments:
-                departments.append(dept)
-        
-        return jsonify({'departments': sorted(departments)}), 200
+        return reference_data.response('departments')
         
     except Exception as e:
         current_app.logger.error(f"Get departments error: {str(e)}")
         return jsonify({'message': 'حدث خطأ في جلب الأقسام'}), 500
 
 @users_bp.route('/users/stats', methods=['GET'])
-@token_required
+@token_required(claims_only=True)
+@conditional_response(USER_TABLES)
 def get_users_stats(current_user):
     """الحصول على إحصائيات المستخدمين"""
     try:
@@ -0,0 +1,168 @@
+from datetime import datetime
+from sqlalchemy import literal, select
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import ActivityLog, Device, Inspection, MaintenanceTask, UploadedFile, User, db
+from src.services.change_tracking import on_change, after_flush, after_rollback
+
+ENTRIES_KEY = 'activity_entries'
+
+INSPECTION = 'inspection'
+MAINTENANCE = 'maintenance'
+FILE = 'file'
+USER = 'user'
+ACTIVITY_TYPES = (INSPECTION, MAINTENANCE, FILE, USER)
+
+
+# الحقول المنسوخة إلى السجل لكل نوع، حتى لا تحتاج القراءة إلى أي ربط بين الجداول
+def inspection_fields(row):
+    return {'user_id': row['inspector_id'], 'device_id': row['device_id'], 'status': row['status']}
+
+
+def task_fields(row):
+    return {
+        'user_id': row['assigned_user_id'], 'device_id': row['device_id'],
+        'subject': row['title'], 'status': row['status'], 'priority': row['priority']
+    }
+
+
+def file_fields(row):
+    return {'user_id': row['uploader_id'], 'subject': row['original_filename']}
+
+
+def user_fields(row):
+    return {'user_id': row['id'], 'user_name': row['name'], 'subject': row['email']}
+
+
+ACTIVITIES = (
+    (Inspection, ('id', 'device_id', 'inspector_id', 'status'), INSPECTION, inspection_fields),
+    (MaintenanceTask, ('id', 'device_id', 'assigned_user_id', 'title', 'status', 'priority'), MAINTENANCE, task_fields),
+    (UploadedFile, ('id', 'uploader_id', 'original_filename'), FILE, file_fields),
+    (User, ('id', 'name', 'email', 'role', 'is_active'), USER, user_fields),
+)
+
+
+def _track(model, fields, activity_type, fields_for):
+    @on_change(model, fields)
+    def record(session, old, new):
+        row = new or old
+        action = 'created' if old is None else 'deleted' if new is None else 'updated'
+        entry = {
+            'type': activity_type, 'action': action, 'source_id': row['id'],
+            'user_id': None, 'user_name': None, 'device_id': None, 'device_name': None,
+            'subject': None, 'status': None, 'priority': None, 'timestamp': datetime.utcnow()
+        }
+        entry.update(fields_for(row))
+        session.info.setdefault(ENTRIES_KEY, []).append(entry)
+
+
+for _model, _fields, _type, _fields_for in ACTIVITIES:
+    _track(_model, _fields, _type, _fields_for)
+
+
+def _names(connection, column_id, column_name, ids):
+    if not ids:
+        return {}
+    return dict(connection.execute(select(column_id, column_name).where(column_id.in_(ids))).all())
+
+
+@after_flush
+def write_activity_entries(session):
+    """كتابة النشاطات المجمّعة ضمن المعاملة نفسها مع نسخ أسماء المستخدمين والأجهزة"""
+    entries = session.info.pop(ENTRIES_KEY, None)
+    if not entries:
+        return
+
+    connection = session.connection()
+    user_names = _names(connection, User.id, User.name, {
+        entry['user_id'] for entry in entries if entry['user_name'] is None and entry['user_id']
+    })
+    device_names = _names(connection, Device.id, Device.name, {
+        entry['device_id'] for entry in entries if entry['device_id']
+    })
+    for entry in entries:
+        if entry['user_name'] is None:
+            entry['user_name'] = user_names.get(entry['user_id'])
+        entry['device_name'] = device_names.get(entry['device_id'])
+
+    connection.execute(insert(ActivityLog), entries)
+
+
+@after_rollback
+def discard_activity_entries(session):
+    session.info.pop(ENTRIES_KEY, None)
+
+
+def backfill_activity_log():
+    """إنشاء سجل مبدئي من البيانات الموجودة بعبارة INSERT ... SELECT لكل نوع"""
+    columns = ['type', 'action', 'source_id', 'user_id', 'user_name', 'device_id', 'device_name',
+               'subject', 'status', 'priority', 'timestamp']
+    queries = (
+        select(
+            literal(INSPECTION), literal('created'), Inspection.id, Inspection.inspector_id, User.name,
+            Inspection.device_id, Device.name, literal(None), Inspection.status, literal(None), Inspection.inspection_date
+        ).join(Device, Device.id == Inspection.device_id).outerjoin(User, User.id == Inspection.inspector_id)
+        .where(Inspection.inspection_date.isnot(None)),
+        select(
+            literal(MAINTENANCE), literal('created'), MaintenanceTask.id, MaintenanceTask.assigned_user_id, User.name,
+            MaintenanceTask.device_id, Device.name, MaintenanceTask.title, MaintenanceTask.status,
+            MaintenanceTask.priority, MaintenanceTask.created_at
+        ).join(Device, Device.id == MaintenanceTask.device_id).outerjoin(User, User.id == MaintenanceTask.assigned_user_id)
+        .where(MaintenanceTask.created_at.isnot(None)),
+        select(
+            literal(FILE), literal('created'), UploadedFile.id, UploadedFile.uploader_id, User.name,
+            literal(None), literal(None), UploadedFile.original_filename, literal(None), literal(None), UploadedFile.upload_date
+        ).outerjoin(User, User.id == UploadedFile.uploader_id).where(UploadedFile.upload_date.isnot(None)),
+        select(
+            literal(USER), literal('created'), User.id, User.id, User.name,
+            literal(None), literal(None), User.email, literal(None), literal(None), User.created_at
+        ).where(User.created_at.isnot(None)),
+    )
+    for query in queries:
+        db.session.execute(insert(ActivityLog).from_select(columns, query))
+    db.session.commit()
+
+
+def init_activity_log(app):
+    """ملء السجل من البيانات الموجودة عند أول تشغيل بعد إضافته"""
+    with app.app_context():
+        if db.session.query(ActivityLog.id).first() is None:
+            backfill_activity_log()
+
+
+def activity_to_dict(entry):
+    """تحويل سطر السجل إلى الشكل المعروض"""
+    if entry.type == INSPECTION:
+        title = f'تشييك {entry.device_name}'
+        description = f'تم إجراء تشييك بواسطة {entry.user_name}'
+        if entry.action == 'updated':
+            description = f'تم تحديث تشييك بواسطة {entry.user_name}'
+        icon = '🔍'
+    elif entry.type == MAINTENANCE:
+        title = entry.subject
+        description = f'مهمة صيانة لـ {entry.device_name} - {entry.user_name}'
+        icon = '⚙️'
+    elif entry.type == FILE:
+        title = f'حذف ملف {entry.subject}' if entry.action == 'deleted' else f'رفع ملف {entry.subject}'
+        description = f'بواسطة {entry.user_name}'
+        icon = '📁'
+    else:
+        titles = {'created': 'مستخدم جديد', 'updated': 'تحديث بيانات مستخدم', 'deleted': 'حذف مستخدم'}
+        title = titles[entry.action]
+        description = entry.user_name
+        icon = '👤'
+
+    activity = {
+        'id': entry.id,
+        'type': entry.type,
+        'action': entry.action,
+        'title': title,
+        'description': description,
+        'status': entry.status,
+        'timestamp': entry.timestamp.isoformat(),
+        'user': entry.user_name,
+        'user_id': entry.user_id,
+        'icon': icon
+    }
+    if entry.priority:
+        activity['priority'] = entry.priority
+    return activity
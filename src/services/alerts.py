@@ -0,0 +1,252 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, delete, func, literal, or_, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import Alert, Device, Inspection, MaintenanceTask, db
+from src.services.background import PeriodicTask
+from src.services.change_tracking import on_change, after_flush, after_rollback
+from src.services.dashboard_counters import apply_counter_deltas
+from src.services.table_versions import bump_versions
+import os
+
+# إعدادات التنبيهات
+ALERTS_SWEEP_INTERVAL = int(os.environ.get('ALERTS_SWEEP_INTERVAL', 60))
+OVERDUE_HIGH_AFTER_DAYS = 7
+UPCOMING_WINDOW_DAYS = 7
+UPCOMING_MEDIUM_WITHIN_DAYS = 3
+DANGER_WINDOW = timedelta(days=1)
+
+SEVERITY_RANKS = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+OVERDUE = 'overdue_maintenance'
+UPCOMING = 'upcoming_maintenance'
+DANGER = 'danger_inspection'
+
+OPS_KEY = 'alert_ops'
+RENAMES_KEY = 'alert_device_renames'
+DELETE_CHUNK = 400
+
+
+def _midnight(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def _alert_row(alert_type, source_id, severity, timestamp, device_id, subject=None, device_name=None):
+    return {
+        'type': alert_type,
+        'source_id': source_id,
+        'severity': severity,
+        'severity_rank': SEVERITY_RANKS[severity],
+        'timestamp': timestamp,
+        'device_id': device_id,
+        'device_name': device_name,
+        'subject': subject
+    }
+
+
+# حالة التنبيه المطلوبة لكل صف في الوقت الحالي (None تعني عدم وجود تنبيه)
+def task_alert(row, now):
+    if row['status'] != 'pending' or not row['scheduled_date'] or row['scheduled_date'] >= now:
+        return None
+    severity = 'high' if (now - row['scheduled_date']).days > OVERDUE_HIGH_AFTER_DAYS else 'medium'
+    return _alert_row(OVERDUE, row['id'], severity, row['scheduled_date'], row['device_id'], subject=row['title'])
+
+
+def device_alert(row, now):
+    today = now.date()
+    due = row['next_maintenance']
+    if row['status'] != 'active' or not due or not (today < due <= today + timedelta(days=UPCOMING_WINDOW_DAYS)):
+        return None
+    severity = 'low' if (due - today).days > UPCOMING_MEDIUM_WITHIN_DAYS else 'medium'
+    return _alert_row(UPCOMING, row['id'], severity, _midnight(due), row['id'], device_name=row['name'])
+
+
+def inspection_alert(row, now):
+    if row['status'] != 'danger' or not row['inspection_date'] or row['inspection_date'] < now - DANGER_WINDOW:
+        return None
+    return _alert_row(DANGER, row['id'], 'critical', row['inspection_date'], row['device_id'])
+
+
+def _track(model, fields, alert_type, desired):
+    @on_change(model, fields)
+    def record(session, old, new):
+        row = new or old
+        ops = session.info.setdefault(OPS_KEY, {})
+        ops[(alert_type, row['id'])] = desired(new, datetime.utcnow()) if new else None
+        if alert_type == UPCOMING and old and new and old['name'] != new['name']:
+            session.info.setdefault(RENAMES_KEY, {})[row['id']] = new['name']
+
+
+_track(MaintenanceTask, ('id', 'status', 'scheduled_date', 'title', 'device_id'), OVERDUE, task_alert)
+_track(Device, ('id', 'status', 'next_maintenance', 'name'), UPCOMING, device_alert)
+_track(Inspection, ('id', 'status', 'inspection_date', 'device_id'), DANGER, inspection_alert)
+
+
+def _count(deltas, severities, sign):
+    for severity in severities:
+        key = f'alerts.severity:{severity}'
+        deltas[key] = deltas.get(key, 0) + sign
+
+
+@after_flush
+def apply_alert_ops(session):
+    """تطبيق تغييرات التنبيهات المجمّعة ضمن المعاملة نفسها
+
+    يتم حذف التنبيهات القديمة للصفوف المتغيرة ثم إدراج الحالة الجديدة، مع
+    تحديث عدادات الأهمية بالفرق الناتج عن الحذف والإدراج.
+    """
+    ops = session.info.pop(OPS_KEY, None)
+    renames = session.info.pop(RENAMES_KEY, None)
+    if not ops and not renames:
+        return
+
+    connection = session.connection()
+    deltas = {}
+
+    keys = list(ops or {})
+    for start in range(0, len(keys), DELETE_CHUNK):
+        removed = connection.execute(
+            delete(Alert).where(tuple_(Alert.type, Alert.source_id).in_(keys[start:start + DELETE_CHUNK])).returning(Alert.severity)
+        ).scalars().all()
+        _count(deltas, removed, -1)
+
+    rows = [row for row in (ops or {}).values() if row]
+    missing_names = {row['device_id'] for row in rows if row['device_name'] is None}
+    if missing_names:
+        names = dict(connection.execute(select(Device.id, Device.name).where(Device.id.in_(missing_names))).all())
+        for row in rows:
+            if row['device_name'] is None:
+                row['device_name'] = names.get(row['device_id'])
+    if rows:
+        connection.execute(insert(Alert), rows)
+        _count(deltas, [row['severity'] for row in rows], 1)
+
+    for device_id, name in (renames or {}).items():
+        connection.execute(update(Alert).where(Alert.device_id == device_id).values(device_name=name))
+
+    apply_counter_deltas(connection, deltas)
+
+
+@after_rollback
+def discard_alert_ops(session):
+    session.info.pop(OPS_KEY, None)
+    session.info.pop(RENAMES_KEY, None)
+
+
+def _insert_missing(query):
+    statement = insert(Alert).from_select(
+        ['type', 'source_id', 'severity', 'severity_rank', 'timestamp', 'device_id', 'device_name', 'subject', 'created_at'],
+        query
+    )
+    return statement.on_conflict_do_nothing(index_elements=['type', 'source_id']).returning(Alert.severity)
+
+
+def _severity(condition, severity, otherwise):
+    return (
+        case((condition, literal(severity)), else_=literal(otherwise)),
+        case((condition, literal(SEVERITY_RANKS[severity])), else_=literal(SEVERITY_RANKS[otherwise]))
+    )
+
+
+def sweep_alerts():
+    """تطبيق التغيرات المرتبطة بالوقت على جدول التنبيهات بعبارات SQL مجمّعة
+
+    - إضافة المهام التي أصبحت متأخرة والأجهزة التي دخلت نافذة الصيانة القريبة
+    - رفع أهمية التنبيهات التي تجاوزت حدود الأيام
+    - حذف التنبيهات التي انتهت نافذتها الزمنية
+    """
+    now = datetime.utcnow()
+    today = now.date()
+    tomorrow = _midnight(today + timedelta(days=1))
+    high_before = now - timedelta(days=OVERDUE_HIGH_AFTER_DAYS + 1)
+    deltas = {}
+
+    overdue_severity, overdue_rank = _severity(MaintenanceTask.scheduled_date <= high_before, 'high', 'medium')
+    upcoming_severity, upcoming_rank = _severity(
+        Device.next_maintenance > today + timedelta(days=UPCOMING_MEDIUM_WITHIN_DAYS), 'low', 'medium'
+    )
+
+    inserts = (
+        select(
+            literal(OVERDUE), MaintenanceTask.id, overdue_severity, overdue_rank, MaintenanceTask.scheduled_date,
+            Device.id, Device.name, MaintenanceTask.title, literal(now)
+        ).join(Device, Device.id == MaintenanceTask.device_id).where(
+            MaintenanceTask.status == 'pending',
+            MaintenanceTask.scheduled_date < now
+        ),
+        select(
+            literal(UPCOMING), Device.id, upcoming_severity, upcoming_rank,
+            # نفس صيغة DateTime التي يكتبها SQLAlchemy حتى تصح المقارنات النصية
+            func.strftime('%Y-%m-%d 00:00:00.000000', Device.next_maintenance),
+            Device.id, Device.name, literal(None), literal(now)
+        ).where(
+            Device.status == 'active',
+            Device.next_maintenance > today,
+            Device.next_maintenance <= today + timedelta(days=UPCOMING_WINDOW_DAYS)
+        ),
+        select(
+            literal(DANGER), Inspection.id, literal('critical'), literal(SEVERITY_RANKS['critical']), Inspection.inspection_date,
+            Device.id, Device.name, literal(None), literal(now)
+        ).join(Device, Device.id == Inspection.device_id).where(
+            Inspection.status == 'danger',
+            Inspection.inspection_date >= now - DANGER_WINDOW
+        ),
+    )
+    for query in inserts:
+        _count(deltas, db.session.execute(_insert_missing(query)).scalars().all(), 1)
+
+    escalations = (
+        (OVERDUE, 'medium', 'high', Alert.timestamp <= high_before),
+        (UPCOMING, 'low', 'medium', Alert.timestamp <= _midnight(today + timedelta(days=UPCOMING_MEDIUM_WITHIN_DAYS))),
+    )
+    for alert_type, old, new, condition in escalations:
+        changed = db.session.execute(
+            update(Alert).where(Alert.type == alert_type, Alert.severity == old, condition)
+            .values(severity=new, severity_rank=SEVERITY_RANKS[new]).returning(Alert.id)
+        ).all()
+        _count(deltas, [old] * len(changed), -1)
+        _count(deltas, [new] * len(changed), 1)
+
+    removed = db.session.execute(
+        delete(Alert).where(or_(
+            and_(Alert.type == DANGER, Alert.timestamp < now - DANGER_WINDOW),
+            and_(Alert.type == UPCOMING, Alert.timestamp < tomorrow)
+        )).returning(Alert.severity)
+    ).scalars().all()
+    _count(deltas, removed, -1)
+
+    if any(deltas.values()):
+        bump_versions(db.session, {Alert.__tablename__})
+    apply_counter_deltas(db.session.connection(), deltas)
+    db.session.commit()
+
+
+def alert_to_dict(alert, now):
+    """تحويل التنبيه إلى الشكل المعروض مع حساب عدد الأيام في وقت القراءة"""
+    if alert.type == OVERDUE:
+        title = 'صيانة متأخرة'
+        message = f'مهمة صيانة {alert.subject} لجهاز {alert.device_name} متأخرة بـ {(now - alert.timestamp).days} يوم'
+        action_url = f'/maintenance.html?task_id={alert.source_id}'
+        timestamp = alert.timestamp.isoformat()
+    elif alert.type == UPCOMING:
+        title = 'صيانة قادمة'
+        message = f'جهاز {alert.device_name} يحتاج صيانة خلال {(alert.timestamp.date() - now.date()).days} يوم'
+        action_url = f'/devices.html?device_id={alert.source_id}'
+        timestamp = alert.timestamp.date().isoformat()
+    else:
+        title = 'تشييك خطير'
+        message = f'تم العثور على مشكلة خطيرة في جهاز {alert.device_name}'
+        action_url = f'/inspections.html?inspection_id={alert.source_id}'
+        timestamp = alert.timestamp.isoformat()
+
+    return {
+        'id': alert.id,
+        'type': alert.type,
+        'severity': alert.severity,
+        'title': title,
+        'message': message,
+        'timestamp': timestamp,
+        'action_url': action_url
+    }
+
+
+alerts_sweeper = PeriodicTask('alerts-sweep', ALERTS_SWEEP_INTERVAL, sweep_alerts)
@@ -0,0 +1,55 @@
+import threading
+
+
+class PeriodicTask:
+    """تنفيذ دالة بشكل دوري في خيط خلفي داخل سياق التطبيق"""
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._app = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        """بدء الخيط الخلفي"""
+        if self.running:
+            return
+        self._app = app
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """إيقاف الخيط الخلفي"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+
+    def trigger(self):
+        """تنفيذ الدالة فوراً دون انتظار انتهاء الفترة"""
+        self._wakeup.set()
+
+    def run_once(self):
+        """تنفيذ الدالة مرة واحدة داخل سياق التطبيق"""
+        with self._app.app_context():
+            try:
+                self.func()
+            except Exception as e:
+                self._app.logger.error(f"{self.name} error: {str(e)}")
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            self.run_once()
@@ -0,0 +1,133 @@
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from src.models.user import Device, Inspection, db
+from src.services.change_tracking import bulk_inserted
+from src.services.table_versions import bump_versions
+from datetime import datetime
+import json
+import os
+
+# عدد التشييكات في كل دفعة (عبارة INSERT واحدة ومعاملة واحدة لكل دفعة)
+INSPECTION_BULK_CHUNK_SIZE = int(os.environ.get('INSPECTION_BULK_CHUNK_SIZE', 500))
+# حد المعرفات في استعلام IN الواحد (أقل من حد متغيرات SQLite)
+DEVICE_PREFETCH_LIMIT = 20000
+
+
+def _device_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def prefetch_devices(records):
+    """أسماء كل الأجهزة المذكورة في الطلب باستعلام IN واحد بدل استعلام لكل تشييك"""
+    ids = sorted({
+        _device_id(record.get('device_id')) for record in records if isinstance(record, dict)
+    } - {None})
+    names = {}
+    for start in range(0, len(ids), DEVICE_PREFETCH_LIMIT):
+        names.update(db.session.execute(
+            select(Device.id, Device.name).where(Device.id.in_(ids[start:start + DEVICE_PREFETCH_LIMIT]))
+        ).all())
+    return names
+
+
+def parse_inspection(record, devices, inspector_id, now):
+    """التحقق من تشييك واحد وتحويله إلى قيم الأعمدة، مع رسالة الخطأ إذا كان غير صالح"""
+    if not isinstance(record, dict):
+        return None, 'صيغة التشييك غير صالحة'
+
+    device_id = record.get('device_id')
+    if not device_id:
+        return None, 'معرف الجهاز مطلوب'
+    if _device_id(device_id) not in devices:
+        return None, f'الجهاز {device_id} غير موجود'
+
+    status = record.get('status', 'good')
+    if not status or not isinstance(status, str):
+        return None, f'حالة التشييك للجهاز {device_id} غير صالحة'
+    notes = record.get('notes', '')
+    images = record.get('images', [])
+
+    return {
+        'device_id': _device_id(device_id),
+        'inspector_id': inspector_id,
+        'inspection_date': now,
+        'status': status,
+        'notes': notes,
+        'images': json.dumps(images) if images else None,
+        'created_at': now
+    }, None
+
+
+def _insert(rows):
+    ids = db.session.execute(
+        insert(Inspection).returning(Inspection.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    for row, inspection_id in zip(rows, ids):
+        row['id'] = inspection_id
+
+
+def _insert_rows(chunk, report):
+    """إدراج صفوف في نقطة حفظ، وعند الفشل تقسيمها إلى نصفين حتى يبقى الصف الخاطئ وحده"""
+    try:
+        with db.session.begin_nested():
+            _insert([row for _, row in chunk])
+        return [row for _, row in chunk]
+    except SQLAlchemyError as e:
+        if len(chunk) == 1:
+            line, row = chunk[0]
+            report.error(line, f'خطأ في إنشاء تشييك للجهاز {row["device_id"]}: {str(getattr(e, "orig", None) or e)}')
+            return []
+    middle = len(chunk) // 2
+    return _insert_rows(chunk[:middle], report) + _insert_rows(chunk[middle:], report)
+
+
+def _insert_chunk(chunk, report, on_created):
+    """إدراج دفعة بعبارة INSERT مجمّعة داخل نقطة حفظ، ثم commit
+
+    الصف الذي يرفضه SQLite لا يُلغي الدفعة: تُعاد المحاولة بنصفي الدفعة في
+    نقاط حفظ متداخلة حتى يُعزل ويُسجل كخطأ. نقطة الحفظ الخارجية تجمع الصفوف
+    وتحديث الجداول المشتقة في معاملة واحدة.
+    """
+    with db.session.begin_nested():
+        rows = _insert_rows(chunk, report)
+        if rows:
+            # INSERT المجمّع لا يمر عبر flush، لذلك تُحدّث حالة الأجهزة والعدادات والتنبيهات صراحة
+            bulk_inserted(db.session, Inspection, rows)
+            bump_versions(db.session, {Inspection.__tablename__})
+    db.session.commit()
+
+    report.total_created += len(rows)
+    if on_created:
+        for row in rows:
+            on_created(row)
+
+
+def create_inspections(records, inspector_id, report, on_created=None, chunk_size=None):
+    """إنشاء تشييكات متعددة على دفعات، كل دفعة في معاملة مستقلة
+
+    الأجهزة تُجلب مرة واحدة للطلب كله، ولا يُحجز قفل الكتابة في SQLite إلا
+    أثناء إدراج دفعة واحدة، فتستمر الطلبات الأخرى بين الدفعات.
+    """
+    chunk_size = chunk_size or INSPECTION_BULK_CHUNK_SIZE
+    records = list(records)
+    devices = prefetch_devices([record for _, record in records])
+    created = (lambda row: on_created(row, devices[row['device_id']])) if on_created else None
+    chunk = []
+    now = datetime.utcnow()
+    for line, record in records:
+        report.total_rows += 1
+        row, error = parse_inspection(record, devices, inspector_id, now)
+        if error:
+            report.error(line, error)
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            _insert_chunk(chunk, report, created)
+            chunk = []
+            now = datetime.utcnow()
+    if chunk:
+        _insert_chunk(chunk, report, created)
+    return report
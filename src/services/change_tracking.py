@@ -0,0 +1,123 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+import itertools
+
+TOUCHED_TABLES_KEY = 'touched_tables'
+_change_handlers = {}  # model -> [(fields, handler)]
+_flush_handlers = []
+_commit_handlers = []
+
+
+def _values(state, fields, previous=False):
+    """قيم الحقول الحالية أو السابقة (قبل التعديل) للكائن"""
+    values = {}
+    for field in fields:
+        attr = state.attrs[field]
+        history = attr.history
+        values[field] = history.deleted[0] if previous and history.deleted else attr.value
+    return values
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+def on_change(model, fields):
+    """تسجيل دالة تُستدعى عند إضافة أو تعديل أو حذف صف من النموذج
+
+    تُستدعى الدالة بالشكل handler(session, old, new) حيث old و new قاموسان
+    لقيم الحقول المحددة، ويكون old فارغاً (None) عند الإضافة و new فارغاً عند
+    الحذف. تُنفذ داخل عملية flush نفسها، لذلك يجب أن تكتفي بتجميع التغييرات
+    في session.info وتطبيقها لاحقاً من خلال after_flush.
+    """
+    def decorator(handler):
+        _change_handlers.setdefault(model, []).append((fields, handler))
+
+        # تحميل القيمة القديمة عند التعديل حتى لو كان الحقل منتهي الصلاحية
+        for field in fields:
+            event.listen(getattr(model, field), 'set', _keep_old_value, active_history=True, retval=True)
+
+        @event.listens_for(model, 'after_insert')
+        def after_insert(mapper, connection, target):
+            state = inspect(target)
+            handler(state.session, None, _values(state, fields))
+
+        @event.listens_for(model, 'after_update')
+        def after_update(mapper, connection, target):
+            state = inspect(target)
+            old = _values(state, fields, previous=True)
+            new = _values(state, fields)
+            if old != new:
+                handler(state.session, old, new)
+
+        @event.listens_for(model, 'before_delete')
+        def before_delete(mapper, connection, target):
+            state = inspect(target)
+            handler(state.session, _values(state, fields, previous=True), None)
+
+        return handler
+    return decorator
+
+
+def after_flush(handler):
+    """تسجيل دالة تُستدعى بعد كل flush في أي جلسة لتطبيق التغييرات المجمّعة"""
+    _flush_handlers.append(handler)
+    event.listen(Session, 'after_flush', lambda session, flush_context: handler(session))
+    return handler
+
+
+def after_rollback(handler):
+    """تسجيل دالة تُستدعى عند التراجع عن المعاملة لتجاهل التغييرات المجمّعة"""
+    event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: handler(session))
+    return handler
+
+
+def bulk_inserted(session, model, rows):
+    """تشغيل دوال on_change و after_flush لصفوف أُدرجت بعبارة INSERT مجمّعة دون كائنات ORM
+
+    كل صف قاموس يحتوي على قيم الأعمدة بما فيها المعرف، حتى تبقى الجداول
+    المشتقة (العدادات والتنبيهات وغيرها) متوافقة كما لو أُدرجت الصفوف عبر flush.
+    """
+    for fields, handler in _change_handlers.get(model, ()):
+        for row in rows:
+            handler(session, None, {field: row.get(field) for field in fields})
+    for handler in _flush_handlers:
+        handler(session)
+    touch_tables(session, {model.__table__.name})
+
+
+def touch_tables(session, tables):
+    """تسجيل جداول تغيرت بعبارات SQL مباشرة حتى تصل إلى دوال on_commit"""
+    session.info.setdefault(TOUCHED_TABLES_KEY, set()).update(tables)
+
+
+def on_commit(handler):
+    """تسجيل دالة تُستدعى بعد نجاح commit بمجموعة أسماء الجداول التي تغيرت"""
+    _commit_handlers.append(handler)
+    return handler
+
+
+def flushed_tables(session):
+    """أسماء الجداول التي تغيرت في عملية flush الحالية (تُستدعى من after_flush)"""
+    return {
+        inspect(obj).mapper.local_table.name
+        for obj in itertools.chain(session.new, session.dirty, session.deleted)
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_touched_tables(session, flush_context):
+    session.info.setdefault(TOUCHED_TABLES_KEY, set()).update(flushed_tables(session))
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_commit(session):
+    tables = session.info.pop(TOUCHED_TABLES_KEY, None)
+    if tables:
+        for handler in _commit_handlers:
+            handler(tables)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_touched_tables(session, previous_transaction):
+    session.info.pop(TOUCHED_TABLES_KEY, None)
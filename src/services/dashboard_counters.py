@@ -0,0 +1,400 @@
+from datetime import datetime, timedelta
+from sqlalchemy import String, and_, or_, case, cast, delete, func, literal, select, update
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import User, Device, Location, Inspection, MaintenanceTask, UploadedFile, DashboardCounter, Alert, db
+from src.services.background import PeriodicTask
+from src.services.change_tracking import on_change, after_flush, after_rollback
+from src.services.locations import ancestor_ids
+from src.services.table_versions import bump_versions
+from flask.cli import with_appcontext
+import click
+import os
+
+# إعدادات عدادات لوحة التحكم
+DASHBOARD_COUNTERS_SWEEP_INTERVAL = int(os.environ.get('DASHBOARD_COUNTERS_SWEEP_INTERVAL', 60))
+DASHBOARD_COUNTERS_DAYS = int(os.environ.get('DASHBOARD_COUNTERS_DAYS', 15))
+UPCOMING_MAINTENANCE_DAYS = 30
+OPEN_TASK_STATUSES = ('pending', 'in_progress')
+
+DELTAS_KEY = 'dashboard_counter_deltas'
+MOVES_KEY = 'dashboard_counter_location_moves'
+LOCATION_METRICS = ('devices', 'overdue')
+
+
+# مفاتيح العدادات التي يساهم بها كل صف
+def device_keys(row, today):
+    if row['status'] != 'active':
+        return []
+    keys = ['devices.active', f"devices.active.type:{row['type']}"]
+    if row['next_maintenance'] and row['next_maintenance'] <= today + timedelta(days=UPCOMING_MAINTENANCE_DAYS):
+        keys.append('devices.upcoming_maintenance')
+    # الجهاز يُحسب في موقعه وفي كل المواقع الأعلى منه، فتبقى مجاميع الشجرة جاهزة
+    overdue = row['next_maintenance'] and row['next_maintenance'] < today
+    for location_id in ancestor_ids(row['location_path']):
+        keys.append(f'locations:{location_id}.devices')
+        if overdue:
+            keys.append(f'locations:{location_id}.overdue')
+    return keys
+
+
+def user_keys(row, today):
+    return ['users.active'] if row['is_active'] else []
+
+
+def file_keys(row, today):
+    return ['files.total']
+
+
+def inspection_keys(row, today):
+    keys = [f"inspections.user:{row['inspector_id']}"]
+    if row['inspection_date']:
+        keys.append(f"inspections.day:{row['inspection_date'].date().isoformat()}:{row['status']}")
+    return keys
+
+
+def task_keys(row, today):
+    keys = [f"tasks.status:{row['status']}", f"tasks.user:{row['assigned_user_id']}"]
+    if row['status'] in OPEN_TASK_STATUSES:
+        keys.append(f"tasks.open.priority:{row['priority']}")
+    if row['status'] == 'pending' and row['scheduled_date'] and row['scheduled_date'] < datetime.utcnow():
+        keys.append('tasks.overdue')
+    if row['status'] == 'completed' and row['completed_date'] and row['scheduled_date'] \
+            and row['completed_date'] >= row['scheduled_date']:
+        keys.append('tasks.completed_on_schedule')
+    return keys
+
+
+TRACKED = (
+    (Device, ('status', 'type', 'next_maintenance', 'location_path'), device_keys),
+    (User, ('is_active',), user_keys),
+    (UploadedFile, ('id',), file_keys),
+    (Inspection, ('inspector_id', 'inspection_date', 'status'), inspection_keys),
+    (MaintenanceTask, ('status', 'priority', 'assigned_user_id', 'scheduled_date', 'completed_date'), task_keys),
+)
+
+
+def _track(model, fields, keys_for):
+    @on_change(model, fields)
+    def record(session, old, new):
+        today = datetime.utcnow().date()
+        deltas = session.info.setdefault(DELTAS_KEY, {})
+        for key in keys_for(old, today) if old else []:
+            deltas[key] = deltas.get(key, 0) - 1
+        for key in keys_for(new, today) if new else []:
+            deltas[key] = deltas.get(key, 0) + 1
+
+
+for _model, _fields, _keys_for in TRACKED:
+    _track(_model, _fields, _keys_for)
+
+
+@on_change(Location, ('id', 'path'))
+def _record_location_move(session, old, new):
+    # عند إنشاء الموقع يكون المسار فارغاً قبل معرفة المعرف
+    if old and new and old['path'] and old['path'] != new['path']:
+        session.info.setdefault(MOVES_KEY, []).append((new['id'], old['path'], new['path']))
+
+
+def _location_move_deltas(connection, moves, deltas):
+    """نقل مجاميع كل موقع منقول من آبائه القدامى إلى آبائه الجدد دون إعادة الحساب"""
+    names = [f'locations:{location_id}.{metric}' for location_id, _, _ in moves for metric in LOCATION_METRICS]
+    totals = dict(connection.execute(
+        select(DashboardCounter.name, DashboardCounter.value).where(DashboardCounter.name.in_(names))
+    ).all())
+    for location_id, old_path, new_path in moves:
+        for metric in LOCATION_METRICS:
+            value = totals.get(f'locations:{location_id}.{metric}', 0)
+            for ancestor_id in ancestor_ids(old_path)[:-1]:
+                key = f'locations:{ancestor_id}.{metric}'
+                deltas[key] = deltas.get(key, 0) - value
+            for ancestor_id in ancestor_ids(new_path)[:-1]:
+                key = f'locations:{ancestor_id}.{metric}'
+                deltas[key] = deltas.get(key, 0) + value
+
+
+def _upsert(values, replace=False):
+    statement = insert(DashboardCounter).values(values)
+    return statement.on_conflict_do_update(
+        index_elements=[DashboardCounter.name],
+        set_={'value': statement.excluded.value if replace else DashboardCounter.value + statement.excluded.value}
+    )
+
+
+def apply_counter_deltas(connection, deltas):
+    """إضافة الفروقات إلى العدادات ضمن معاملة الاتصال المعطى"""
+    rows = [{'name': name, 'value': delta} for name, delta in deltas.items() if delta]
+    if rows:
+        connection.execute(_upsert(rows))
+
+
+@after_flush
+def apply_deltas(session):
+    """تطبيق التغييرات المجمّعة على جدول العدادات ضمن المعاملة نفسها"""
+    deltas = session.info.pop(DELTAS_KEY, None)
+    moves = session.info.pop(MOVES_KEY, None)
+    if moves:
+        deltas = deltas or {}
+        _location_move_deltas(session.connection(), moves, deltas)
+    if deltas:
+        apply_counter_deltas(session.connection(), deltas)
+
+
+@after_rollback
+def discard_deltas(session):
+    session.info.pop(DELTAS_KEY, None)
+    session.info.pop(MOVES_KEY, None)
+
+
+def read_counters(names=(), prefixes=()):
+    """قراءة العدادات بالأسماء المحددة أو بالبادئات المحددة"""
+    conditions = [DashboardCounter.name.in_(names)] if names else []
+    conditions += [
+        and_(DashboardCounter.name >= prefix, DashboardCounter.name < prefix + '\uffff')
+        for prefix in prefixes
+    ]
+    if not conditions:
+        return {}
+    rows = db.session.query(DashboardCounter.name, DashboardCounter.value).filter(or_(*conditions)).all()
+    return {name: value for name, value in rows}
+
+
+def family(counters, prefix):
+    """استخراج عائلة عدادات (مثل tasks.status:) كقاموس بالقيم غير الصفرية"""
+    return {
+        name[len(prefix):]: value for name, value in counters.items()
+        if name.startswith(prefix) and value
+    }
+
+
+def day_keys(start, days):
+    return [(start - timedelta(days=offset)).isoformat() for offset in range(days)]
+
+
+def inspections_by_status(counters, days):
+    """عدد التشييكات حسب الحالة لمجموعة أيام من عائلة inspections.day:"""
+    totals = {}
+    for key, value in family(counters, 'inspections.day:').items():
+        day, status = key.split(':', 1)
+        if day in days:
+            totals[status] = totals.get(status, 0) + value
+    return totals
+
+
+BASIC_STATS_NAMES = ('devices.active', 'devices.upcoming_maintenance', 'users.active', 'files.total', 'tasks.overdue')
+BASIC_STATS_PREFIXES = ('tasks.status:', 'inspections.day:')
+
+
+def basic_stats(counters, today):
+    """الإحصائيات الأساسية للوحة التحكم من قاموس العدادات"""
+    status_counts = family(counters, 'tasks.status:')
+    return {
+        'totalDevices': counters.get('devices.active', 0),
+        'todayInspections': sum(inspections_by_status(counters, day_keys(today, 1)).values()),
+        'pendingMaintenance': sum(status_counts.get(status, 0) for status in OPEN_TASK_STATUSES),
+        'totalUsers': counters.get('users.active', 0),
+        'overdueMaintenance': counters.get('tasks.overdue', 0),
+        'totalFiles': counters.get('files.total', 0),
+        'upcomingMaintenance': counters.get('devices.upcoming_maintenance', 0)
+    }
+
+
+def read_location_totals(location_ids):
+    """مجاميع كل موقع (الأجهزة النشطة والمتأخرة عن الصيانة بما فيها المواقع الفرعية)"""
+    counters = read_counters(names=[
+        f'locations:{location_id}.{metric}' for location_id in location_ids for metric in LOCATION_METRICS
+    ])
+    return {
+        location_id: {metric: counters.get(f'locations:{location_id}.{metric}', 0) for metric in LOCATION_METRICS}
+        for location_id in location_ids
+    }
+
+
+def _location_totals_query(today):
+    """الأجهزة النشطة والمتأخرة لكل موقع مع مواقعه الفرعية، بنطاق مسار في فهرس الأجهزة لكل موقع"""
+    subtree_end = func.substr(Location.path, 1, func.length(Location.path) - 1) + '0'
+    return select(
+        Location.id,
+        func.count(Device.id).label('devices'),
+        func.sum(case((Device.next_maintenance < today, 1), else_=0)).label('overdue')
+    ).join(Device, and_(
+        Device.location_path >= Location.path,
+        Device.location_path < subtree_end
+    )).where(Device.status == 'active').group_by(Location.id)
+
+
+def read_basic_stats():
+    return basic_stats(
+        read_counters(names=BASIC_STATS_NAMES, prefixes=BASIC_STATS_PREFIXES),
+        datetime.utcnow().date()
+    )
+
+
+def _time_based_statements(now):
+    """عبارات إعادة حساب العدادات المرتبطة بالوقت في عبارة واحدة لكل عداد"""
+    today = now.date()
+    overdue = select(literal('tasks.overdue'), func.count(MaintenanceTask.id)).where(
+        MaintenanceTask.status == 'pending',
+        MaintenanceTask.scheduled_date < now
+    )
+    upcoming = select(literal('devices.upcoming_maintenance'), func.count(Device.id)).where(
+        Device.status == 'active',
+        Device.next_maintenance <= today + timedelta(days=UPCOMING_MAINTENANCE_DAYS)
+    )
+    totals = _location_totals_query(today).subquery()
+    overdue_name = literal('locations:') + cast(totals.c.id, String) + literal('.overdue')
+    overdue_by_location = select(overdue_name, totals.c.overdue).where(totals.c.overdue > 0)
+    for query in (overdue, upcoming, overdue_by_location):
+        statement = insert(DashboardCounter).from_select(['name', 'value'], query)
+        yield statement.on_conflict_do_update(
+            index_elements=[DashboardCounter.name],
+            set_={'value': statement.excluded.value},
+            where=DashboardCounter.value != statement.excluded.value
+        ).returning(DashboardCounter.name)
+    # المواقع التي لم يعد فيها أجهزة متأخرة (أو لا أجهزة مطابقة لها) لا تظهر في التجميع، فيُعاد عدادها إلى الصفر
+    yield update(DashboardCounter).where(
+        DashboardCounter.name.like('locations:%.overdue'),
+        DashboardCounter.value != 0,
+        DashboardCounter.name.not_in(select(overdue_name).where(totals.c.overdue > 0))
+    ).values(value=0).returning(DashboardCounter.name)
+
+
+def sweep_counters():
+    """تحديث العدادات المرتبطة بالوقت (المهام المتأخرة والصيانة القريبة والأجهزة المتأخرة لكل موقع) وحذف الأيام القديمة
+
+    هذه العدادات تتغير بمرور الوقت دون أي عملية كتابة، لذلك يعاد حسابها
+    دورياً بينما تبقى التغييرات الناتجة عن الكتابة محدّثة مباشرة.
+    """
+    now = datetime.utcnow()
+    changed = []
+    for statement in _time_based_statements(now):
+        changed += db.session.execute(statement).all()
+    oldest_day = (now.date() - timedelta(days=DASHBOARD_COUNTERS_DAYS - 1)).isoformat()
+    changed += db.session.execute(delete(DashboardCounter).where(
+        DashboardCounter.name >= 'inspections.day:',
+        DashboardCounter.name < f'inspections.day:{oldest_day}'
+    ).returning(DashboardCounter.name)).all()
+    if changed:
+        bump_versions(db.session, {DashboardCounter.__tablename__})
+    db.session.commit()
+
+
+def compute_counters():
+    """حساب جميع العدادات من الجداول الأصلية"""
+    now = datetime.utcnow()
+    today = now.date()
+    counters = {}
+
+    def add(key, value):
+        if value:
+            counters[key] = counters.get(key, 0) + value
+
+    for dtype, count, upcoming in db.session.query(
+        Device.type,
+        func.count(Device.id),
+        func.sum(case((Device.next_maintenance <= today + timedelta(days=UPCOMING_MAINTENANCE_DAYS), 1), else_=0))
+    ).filter(Device.status == 'active').group_by(Device.type):
+        add('devices.active', count)
+        add(f'devices.active.type:{dtype}', count)
+        add('devices.upcoming_maintenance', upcoming)
+
+    for location_id, count, overdue_devices in db.session.execute(_location_totals_query(today)):
+        add(f'locations:{location_id}.devices', count)
+        add(f'locations:{location_id}.overdue', overdue_devices)
+
+    add('users.active', db.session.query(func.count(User.id)).filter(User.is_active == True).scalar())
+    add('files.total', db.session.query(func.count(UploadedFile.id)).scalar())
+
+    for inspector_id, count in db.session.query(
+        Inspection.inspector_id, func.count(Inspection.id)
+    ).group_by(Inspection.inspector_id):
+        add(f'inspections.user:{inspector_id}', count)
+
+    first_day = datetime.combine(today - timedelta(days=DASHBOARD_COUNTERS_DAYS - 1), datetime.min.time())
+    for day, status, count in db.session.query(
+        func.date(Inspection.inspection_date), Inspection.status, func.count(Inspection.id)
+    ).filter(Inspection.inspection_date >= first_day).group_by(
+        func.date(Inspection.inspection_date), Inspection.status
+    ):
+        add(f'inspections.day:{day}:{status}', count)
+
+    for status, priority, assigned_user_id, count, overdue, on_schedule in db.session.query(
+        MaintenanceTask.status,
+        MaintenanceTask.priority,
+        MaintenanceTask.assigned_user_id,
+        func.count(MaintenanceTask.id),
+        func.sum(case((and_(
+            MaintenanceTask.status == 'pending',
+            MaintenanceTask.scheduled_date < now
+        ), 1), else_=0)),
+        func.sum(case((and_(
+            MaintenanceTask.status == 'completed',
+            MaintenanceTask.completed_date >= MaintenanceTask.scheduled_date
+        ), 1), else_=0))
+    ).group_by(MaintenanceTask.status, MaintenanceTask.priority, MaintenanceTask.assigned_user_id):
+        add(f'tasks.status:{status}', count)
+        add(f'tasks.user:{assigned_user_id}', count)
+        if status in OPEN_TASK_STATUSES:
+            add(f'tasks.open.priority:{priority}', count)
+        add('tasks.overdue', overdue)
+        add('tasks.completed_on_schedule', on_schedule)
+
+    for severity, count in db.session.query(Alert.severity, func.count(Alert.id)).group_by(Alert.severity):
+        add(f'alerts.severity:{severity}', count)
+
+    return counters
+
+
+def rebuild_counters():
+    """إعادة بناء جدول العدادات بالكامل وإرجاع الفروقات عن القيم المخزنة
+
+    الحذف يتم أولاً مع RETURNING للحصول على القيم القديمة وحجز قفل الكتابة،
+    فلا تتغير الجداول الأصلية أثناء إعادة الحساب.
+    """
+    stored = {
+        name: value for name, value in db.session.execute(
+            delete(DashboardCounter).returning(DashboardCounter.name, DashboardCounter.value)
+        )
+    }
+    actual = compute_counters()
+    if actual:
+        db.session.execute(_upsert([{'name': name, 'value': value} for name, value in actual.items()], replace=True))
+    bump_versions(db.session, {DashboardCounter.__tablename__})
+    db.session.commit()
+
+    return {
+        name: {'stored': stored.get(name, 0), 'actual': actual.get(name, 0)}
+        for name in sorted(set(stored) | set(actual))
+        if stored.get(name, 0) != actual.get(name, 0)
+    }
+
+
+class DashboardCounters:
+    """تهيئة جدول العدادات وتشغيل التحديث الدوري للعدادات المرتبطة بالوقت"""
+
+    def __init__(self, interval=DASHBOARD_COUNTERS_SWEEP_INTERVAL):
+        self._task = PeriodicTask('dashboard-counters', interval, sweep_counters)
+
+    def init_app(self, app):
+        """بناء الجدول عند أول تشغيل بعد إضافته"""
+        with app.app_context():
+            if db.session.query(DashboardCounter.name).first() is None:
+                rebuild_counters()
+
+    def start(self, app):
+        self._task.start(app)
+
+
+dashboard_counters = DashboardCounters()
+
+
+@click.command('reconcile-dashboard-counters')
+@with_appcontext
+def reconcile_dashboard_counters_command():
+    """إعادة بناء عدادات لوحة التحكم وعرض الفروقات"""
+    drift = rebuild_counters()
+    if not drift:
+        click.echo('Dashboard counters are in sync')
+        return
+    for name, values in drift.items():
+        click.echo(f"{name}: stored={values['stored']} actual={values['actual']}")
+    click.echo(f'{len(drift)} counters drifted and were rebuilt')
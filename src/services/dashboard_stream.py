@@ -0,0 +1,140 @@
+from src.models.user import Alert, Device, Inspection, MaintenanceTask, db
+from src.services.alerts import DANGER
+from src.services.background import PeriodicTask
+from src.services.change_tracking import on_commit
+from src.services.dashboard_counters import read_basic_stats
+from src.services.table_versions import read_versions
+import queue
+import threading
+import json
+import os
+
+# إعدادات بث لوحة التحكم (Server-Sent Events)
+STREAM_POLL_INTERVAL = float(os.environ.get('STREAM_POLL_INTERVAL', 1))
+STREAM_HEARTBEAT_INTERVAL = float(os.environ.get('STREAM_HEARTBEAT_INTERVAL', 25))
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', 100))
+STREAM_TICKET_TTL = int(os.environ.get('STREAM_TICKET_TTL', 30))  # ثوانٍ
+
+STREAM_TABLES = {Device.__tablename__, Inspection.__tablename__, MaintenanceTask.__tablename__}
+
+
+def format_event(event, data):
+    """تنسيق حدث SSE"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def danger_inspection_alert(inspection_id, inspection_date, device_name):
+    return {
+        'type': 'danger_inspection',
+        'severity': 'critical',
+        'title': 'تشييك خطير',
+        'message': f'تم العثور على مشكلة خطيرة في جهاز {device_name}',
+        'timestamp': inspection_date.isoformat() if inspection_date else None,
+        'action_url': f'/inspections.html?inspection_id={inspection_id}'
+    }
+
+
+class Subscription(queue.Queue):
+    """قائمة انتظار متصل واحد، يتم إغلاقها عند امتلائها لإنهاء الاستجابة"""
+    closed = False
+
+
+class DashboardBroadcaster:
+    """بث تغييرات لوحة التحكم لجميع المتصلين في العملية الحالية
+
+    خيط واحد لكل عملية يقرأ العدادات (استعلام واحد صغير) ويرسل الفروقات فقط
+    عند تغيرها، ولا يعمل أي استعلام عند عدم وجود متصلين. يتم إيقاظه فوراً عند
+    الكتابة في هذه العملية، وتُلتقط الكتابات من العمليات الأخرى في الدورة التالية.
+    تنبيهات التشييكات الخطيرة تُقرأ من جدول التنبيهات كلما تغير إصدار جدول
+    التشييكات، فتشمل التشييكات بتاريخ سابق والتعديلات إلى حالة خطيرة.
+    """
+
+    def __init__(self, interval=STREAM_POLL_INTERVAL, queue_size=STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._task = PeriodicTask('dashboard-stream', interval, self.poll)
+        self._stats = None
+        self._inspections_version = None
+        self._danger_ids = None
+
+    def subscribe(self, app):
+        """تسجيل متصل جديد وإرجاع قائمة الانتظار الخاصة به"""
+        subscription = Subscription(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        self._task.start(app)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if not self._subscribers:
+                self._stats = None
+                self._inspections_version = None
+                self._danger_ids = None
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def trigger(self, tables=None):
+        """إيقاظ خيط البث عند تغيير أحد الجداول المعنية"""
+        if (tables is None or tables & STREAM_TABLES) and self.subscriber_count():
+            self._task.trigger()
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((event, data))
+            except queue.Full:
+                # متصل بطيء لا يستهلك الأحداث، يتم فصله ليعيد الاتصال ويستلم لقطة جديدة
+                subscription.closed = True
+                self.unsubscribe(subscription)
+
+    def poll(self):
+        """قراءة العدادات وإرسال ما تغير منها والتنبيهات الجديدة"""
+        if not self.subscriber_count():
+            return
+
+        stats = read_basic_stats()
+        version = read_versions([Inspection.__tablename__])[Inspection.__tablename__]
+        previous = self._stats
+        self._stats = stats
+        if previous is None:
+            # أول دورة بعد الاتصال: إرسال القيم الحالية دون فروقات أو تنبيهات سابقة
+            self._inspections_version = version
+            self._danger_ids = set(self._danger_alerts())
+            self.publish('stats', {'values': stats, 'deltas': {}})
+            return
+
+        changed = {key: value for key, value in stats.items() if previous.get(key) != value}
+        if changed:
+            self.publish('stats', {
+                'values': changed,
+                'deltas': {key: value - previous.get(key, 0) for key, value in changed.items()}
+            })
+
+        if version != self._inspections_version:
+            self._inspections_version = version
+            self._publish_danger_inspections()
+
+    def _danger_alerts(self):
+        """تنبيهات التشييكات الخطيرة النشطة (آخر يوم فقط، لذلك عددها صغير)"""
+        rows = db.session.query(
+            Alert.source_id, Alert.timestamp, Alert.device_name
+        ).filter(Alert.type == DANGER).order_by(Alert.source_id).all()
+        return {source_id: (timestamp, device_name) for source_id, timestamp, device_name in rows}
+
+    def _publish_danger_inspections(self):
+        alerts = self._danger_alerts()
+        for inspection_id, (inspection_date, device_name) in alerts.items():
+            if inspection_id not in self._danger_ids:
+                self.publish('alert', danger_inspection_alert(inspection_id, inspection_date, device_name))
+        self._danger_ids = set(alerts)
+
+
+dashboard_broadcaster = DashboardBroadcaster()
+on_commit(dashboard_broadcaster.trigger)
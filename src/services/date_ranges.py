@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+
+def parse_datetime(value):
+    """تحويل نص ISO إلى datetime بتوقيت UTC بدون منطقة زمنية، أو None إذا كان غير صالح"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _is_date_only(value):
+    return len(value) == 10
+
+
+def range_start(value):
+    """بداية نطاق (شاملة) من معامل date_from"""
+    return parse_datetime(value)
+
+
+def range_end(value):
+    """نهاية نطاق (غير شاملة) من معامل date_to
+
+    التاريخ بدون وقت يشمل اليوم كاملاً، أي ينتهي عند منتصف ليل اليوم التالي.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        return None
+    if _is_date_only(value):
+        return parsed + timedelta(days=1)
+    return parsed + timedelta(microseconds=1)
+
+
+def day_bounds(day):
+    """بداية اليوم وبداية اليوم التالي للمقارنة بنطاق نصف مفتوح [start, end)"""
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
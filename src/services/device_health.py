@@ -0,0 +1,139 @@
+from sqlalchemy import func, select, update
+from src.models.user import Device, Inspection, MaintenanceTask, User, db
+from src.services.background import PeriodicTask
+from src.services.change_tracking import on_change, after_flush, after_rollback
+from src.services.device_scan import invalidate_all_scans
+from src.services.table_versions import bump_versions
+from flask.cli import with_appcontext
+import click
+import os
+
+# إعادة حساب أعمدة حالة الأجهزة بالكامل بشكل دوري لإصلاح أي انحراف
+DEVICE_HEALTH_REPAIR_INTERVAL = int(os.environ.get('DEVICE_HEALTH_REPAIR_INTERVAL', 6 * 3600))
+
+DIRTY_KEY = 'device_health_dirty'
+RENAMES_KEY = 'device_health_inspector_renames'
+CHUNK = 400
+
+HEALTH_COLUMNS = (
+    'last_inspection_id', 'last_inspection_date', 'last_inspection_status',
+    'last_inspector_id', 'last_inspector_name', 'pending_tasks_count'
+)
+
+
+def _mark_devices(session, old, new):
+    dirty = session.info.setdefault(DIRTY_KEY, set())
+    for row in (old, new):
+        if row and row['device_id']:
+            dirty.add(row['device_id'])
+
+
+for _model, _fields in (
+    (Inspection, ('device_id', 'inspection_date', 'status', 'inspector_id')),
+    (MaintenanceTask, ('device_id', 'status')),
+):
+    on_change(_model, _fields)(_mark_devices)
+
+
+@on_change(User, ('id', 'name'))
+def _record_rename(session, old, new):
+    if old and new and old['name'] != new['name']:
+        session.info.setdefault(RENAMES_KEY, {})[new['id']] = new['name']
+
+
+def refresh_device_health(connection, device_ids=None):
+    """إعادة حساب أعمدة الحالة للأجهزة المعطاة (أو لجميع الأجهزة) بعبارتي UPDATE"""
+    scope = [Device.id.in_(device_ids)] if device_ids is not None else []
+    pending = select(func.count(MaintenanceTask.id)).where(
+        MaintenanceTask.device_id == Device.id,
+        MaintenanceTask.status == 'pending'
+    ).scalar_subquery()
+    result = connection.execute(update(Device).where(*scope).values(
+        last_inspection_id=None,
+        last_inspection_date=None,
+        last_inspection_status=None,
+        last_inspector_id=None,
+        last_inspector_name=None,
+        pending_tasks_count=pending
+    ))
+
+    ranked = select(
+        Inspection.device_id,
+        Inspection.id,
+        Inspection.inspection_date,
+        Inspection.status,
+        Inspection.inspector_id,
+        User.name.label('inspector_name'),
+        func.row_number().over(
+            partition_by=Inspection.device_id,
+            order_by=(Inspection.inspection_date.desc(), Inspection.id.desc())
+        ).label('position')
+    ).outerjoin(User, User.id == Inspection.inspector_id)
+    if device_ids is not None:
+        ranked = ranked.where(Inspection.device_id.in_(device_ids))
+    latest = ranked.subquery()
+    connection.execute(update(Device).where(
+        Device.id == latest.c.device_id,
+        latest.c.position == 1
+    ).values(
+        last_inspection_id=latest.c.id,
+        last_inspection_date=latest.c.inspection_date,
+        last_inspection_status=latest.c.status,
+        last_inspector_id=latest.c.inspector_id,
+        last_inspector_name=latest.c.inspector_name
+    ))
+    return result.rowcount
+
+
+@after_flush
+def apply_device_health(session):
+    """تحديث أعمدة الحالة للأجهزة المتأثرة ضمن المعاملة نفسها"""
+    dirty = session.info.pop(DIRTY_KEY, None)
+    renames = session.info.pop(RENAMES_KEY, None)
+    if not dirty and not renames:
+        return
+
+    connection = session.connection()
+    device_ids = sorted(dirty or ())
+    for start in range(0, len(device_ids), CHUNK):
+        refresh_device_health(connection, device_ids[start:start + CHUNK])
+    for user_id, name in (renames or {}).items():
+        connection.execute(update(Device).where(Device.last_inspector_id == user_id).values(last_inspector_name=name))
+
+    # الكائنات المحمّلة في الجلسة تحمل القيم القديمة
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Device) and (obj.id in (dirty or ()) or renames):
+            session.expire(obj, HEALTH_COLUMNS)
+    bump_versions(session, {Device.__tablename__})
+
+
+@after_rollback
+def discard_device_health(session):
+    session.info.pop(DIRTY_KEY, None)
+    session.info.pop(RENAMES_KEY, None)
+
+
+def repair_device_health():
+    """إعادة حساب أعمدة الحالة لجميع الأجهزة من الجداول الفرعية"""
+    repaired = refresh_device_health(db.session.connection())
+    bump_versions(db.session, {Device.__tablename__})
+    invalidate_all_scans(db.session)
+    db.session.commit()
+    return repaired
+
+
+def init_device_health(app, added_columns):
+    """ملء أعمدة الحالة مرة واحدة عند إضافتها لقاعدة بيانات موجودة، بدل إعادة حسابها عند كل تشغيل"""
+    if any(f'{Device.__tablename__}.{column}' in added_columns for column in HEALTH_COLUMNS):
+        with app.app_context():
+            repair_device_health()
+
+
+device_health_repair = PeriodicTask('device-health-repair', DEVICE_HEALTH_REPAIR_INTERVAL, repair_device_health)
+
+
+@click.command('repair-device-health')
+@with_appcontext
+def repair_device_health_command():
+    """إعادة حساب آخر تشييك وعدد المهام المعلقة لكل جهاز"""
+    click.echo(f'Recomputed health columns for {repair_device_health()} devices')
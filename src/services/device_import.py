@@ -0,0 +1,211 @@
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from src.models.user import Device, db
+from src.services.change_tracking import bulk_inserted
+from src.services.date_ranges import parse_datetime
+from src.services.table_versions import bump_versions
+from datetime import datetime
+import csv
+import io
+import json
+import os
+
+# عدد الصفوف في كل دفعة (استعلام IN واحد وعبارة INSERT واحدة ومعاملة واحدة لكل دفعة)
+DEVICE_IMPORT_CHUNK_SIZE = int(os.environ.get('DEVICE_IMPORT_CHUNK_SIZE', 500))
+# الحد الأقصى للأخطاء المعادة في التقرير (العدد الكلي يُحسب دائماً)
+DEVICE_IMPORT_MAX_ERRORS = int(os.environ.get('DEVICE_IMPORT_MAX_ERRORS', 1000))
+
+
+class ImportReport:
+    """نتيجة الاستيراد: عدد الصفوف والأجهزة المنشأة والأخطاء مع رقم السطر لكل صف مرفوض"""
+
+    def __init__(self, max_errors=DEVICE_IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.total_rows = 0
+        self.total_created = 0
+        self.total_errors = 0
+        self.errors = []
+
+    def error(self, line, message, serial_number=None):
+        self.total_errors += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'serial_number': serial_number or None, 'message': message})
+
+    def to_dict(self):
+        return {
+            'total_rows': self.total_rows,
+            'total_created': self.total_created,
+            'total_errors': self.total_errors,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.total_errors > len(self.errors)
+        }
+
+
+def _text(record, field):
+    value = record.get(field)
+    return str(value).strip() if value is not None else ''
+
+
+def _date(record, field):
+    """(التاريخ أو None، صالح أم لا)"""
+    value = _text(record, field)
+    if not value:
+        return None, True
+    parsed = parse_datetime(value)
+    return (parsed.date() if parsed else None), parsed is not None
+
+
+def parse_device(record, now):
+    """التحقق من صف واحد وتحويله إلى قيم أعمدة الجهاز، مع رسالة الخطأ إذا كان غير صالح"""
+    if not isinstance(record, dict):
+        return None, 'صيغة الصف غير صالحة'
+
+    name = _text(record, 'name')
+    device_type = _text(record, 'type')
+    location = _text(record, 'location')
+    if not name or not device_type or not location:
+        return None, 'الاسم والنوع والموقع مطلوبة'
+
+    installation_date, valid = _date(record, 'installation_date')
+    if not valid:
+        return None, 'تاريخ التركيب غير صالح'
+    next_maintenance, valid = _date(record, 'next_maintenance')
+    if not valid:
+        return None, 'تاريخ الصيانة القادمة غير صالح'
+
+    return {
+        'name': name,
+        'type': device_type,
+        'location': location,
+        'serial_number': _text(record, 'serial_number') or None,
+        'installation_date': installation_date,
+        'next_maintenance': next_maintenance,
+        'status': 'active',
+        'created_at': now
+    }, None
+
+
+def _insert(rows):
+    ids = db.session.execute(
+        insert(Device).returning(Device.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    for row, device_id in zip(rows, ids):
+        row['id'] = device_id
+
+
+def _insert_rows(chunk, report):
+    """إدراج صفوف في نقطة حفظ، وعند الفشل تقسيمها إلى نصفين حتى يبقى الصف الخاطئ وحده"""
+    try:
+        with db.session.begin_nested():
+            _insert([row for _, row in chunk])
+        return [row for _, row in chunk]
+    except SQLAlchemyError as e:
+        if len(chunk) == 1:
+            line, row = chunk[0]
+            serial_number = row['serial_number']
+            if isinstance(e, IntegrityError) and serial_number:
+                # جهاز بنفس الرقم التسلسلي أُضيف من طلب آخر بعد التحقق المسبق
+                report.error(line, f'الرقم التسلسلي {serial_number} مستخدم مسبقاً', serial_number)
+            else:
+                report.error(line, f'خطأ في إنشاء الجهاز: {str(getattr(e, "orig", None) or e)}', serial_number)
+            return []
+    middle = len(chunk) // 2
+    return _insert_rows(chunk[:middle], report) + _insert_rows(chunk[middle:], report)
+
+
+def _insert_chunk(chunk, report, on_created):
+    """إدراج دفعة: استعلام IN واحد للأرقام التسلسلية المكررة ثم INSERT مجمّع داخل نقطة حفظ
+
+    إذا أضاف طلب متزامن رقماً تسلسلياً بعد التحقق المسبق يرفض الفهرس الفريد
+    الدفعة، فتُعاد المحاولة بنصفيها في نقاط حفظ متداخلة حتى يُعزل الصف
+    المكرر ويُسجل في التقرير بدل فشل الطلب كله.
+    """
+    serials = {row['serial_number'] for _, row in chunk if row['serial_number']}
+    taken = set(db.session.execute(
+        select(Device.serial_number).where(Device.serial_number.in_(serials))
+    ).scalars()) if serials else set()
+
+    pending = []
+    for line, row in chunk:
+        serial_number = row['serial_number']
+        if serial_number in taken:
+            report.error(line, f'الرقم التسلسلي {serial_number} مستخدم مسبقاً', serial_number)
+            continue
+        if serial_number:
+            taken.add(serial_number)
+        pending.append((line, row))
+    if not pending:
+        return
+
+    with db.session.begin_nested():
+        rows = _insert_rows(pending, report)
+        if rows:
+            # INSERT المجمّع لا يمر عبر flush، لذلك تُحدّث العدادات والتنبيهات صراحة
+            bulk_inserted(db.session, Device, rows)
+            bump_versions(db.session, {Device.__tablename__})
+    db.session.commit()
+
+    report.total_created += len(rows)
+    if on_created:
+        for row in rows:
+            on_created(row)
+
+
+def import_devices(records, report, on_created=None, chunk_size=None):
+    """استيراد الأجهزة من مصدر صفوف (رقم السطر، القاموس) على دفعات بذاكرة ثابتة
+
+    كل دفعة تُحفظ في معاملة مستقلة، فإذا توقف الاستيراد تبقى الدفعات السابقة
+    محفوظة ويوضح التقرير عدد الأجهزة المنشأة حتى تلك اللحظة.
+    """
+    chunk_size = chunk_size or DEVICE_IMPORT_CHUNK_SIZE
+    chunk = []
+    now = datetime.utcnow()
+    for line, record in records:
+        report.total_rows += 1
+        row, error = parse_device(record, now)
+        if error:
+            report.error(line, error, _text(record, 'serial_number') if isinstance(record, dict) else None)
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            _insert_chunk(chunk, report, on_created)
+            chunk = []
+            now = datetime.utcnow()
+    if chunk:
+        _insert_chunk(chunk, report, on_created)
+    return report
+
+
+def _text_stream(stream):
+    return io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8-sig', newline='')
+
+
+def read_csv(stream):
+    """قراءة صفوف CSV (بسطر عناوين) من مجرى ثنائي سطراً بسطر"""
+    reader = csv.DictReader(_text_stream(stream))
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_ndjson(stream):
+    """قراءة كائنات JSON مفصولة بأسطر من مجرى ثنائي سطراً بسطر"""
+    for line_number, line in enumerate(_text_stream(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record
+
+
+# نوع المحتوى أو قيمة المعامل format -> قارئ الصفوف
+IMPORT_READERS = {
+    'csv': read_csv,
+    'text/csv': read_csv,
+    'application/csv': read_csv,
+    'ndjson': read_ndjson,
+    'application/x-ndjson': read_ndjson,
+    'application/ndjson': read_ndjson,
+    'application/jsonl': read_ndjson,
+}
@@ -0,0 +1,339 @@
+from flask import request, current_app
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import String, bindparam, cast, delete, func, select
+from sqlalchemy.orm import aliased
+from src.models.user import Device, MaintenanceTask, Inspection, TableVersion, User, db
+from src.services.background import PeriodicTask
+from src.services.change_tracking import on_change, on_commit, after_flush, after_rollback, touch_tables
+from src.services.reference_data import reference_data
+from src.services.table_versions import bump_versions
+import hashlib
+import threading
+import time
+import os
+
+# عدد الملصقات المخزنة في كل عملية (worker)، وفترة تسخين الذاكرة بالثواني
+SCAN_CACHE_MAX_ENTRIES = int(os.environ.get('SCAN_CACHE_MAX_ENTRIES', 5000))
+SCAN_CACHE_WARM_INTERVAL = int(os.environ.get('SCAN_CACHE_WARM_INTERVAL', 60))
+SCAN_OPEN_TASKS_LIMIT = 10
+OPEN_TASK_STATUSES = ('pending', 'in_progress')
+CHUNK = 400
+
+# مفتاح عام لتغييرات تمس أجهزة كثيرة (تغيير اسم مفتش أو نقل موقع)، ومفتاح لكل جهاز
+ALL_DEVICES_KEY = 'device_scan'
+CHANGED_KEY = 'device_scan_changed'
+REMOVED_KEY = 'device_scan_removed'
+
+_Entry = namedtuple('_Entry', 'device_id versions body etag')
+
+
+def device_key(device_id):
+    """مفتاح إصدار بيانات المسح لجهاز واحد في table_versions"""
+    return f'{ALL_DEVICES_KEY}.{device_id}'
+
+
+def invalidate_all_scans(session):
+    """إبطال بيانات المسح لجميع الأجهزة بعد تحديث مجمّع لا يمر عبر ORM"""
+    bump_versions(session, {ALL_DEVICES_KEY})
+
+
+def _mark(session, *device_ids):
+    changed = session.info.setdefault(CHANGED_KEY, set())
+    changed.update(device_key(device_id) for device_id in device_ids if device_id)
+
+
+@on_change(Device, (
+    'id', 'name', 'type', 'location', 'location_id', 'serial_number',
+    'status', 'last_maintenance', 'next_maintenance'
+))
+def _record_device(session, old, new):
+    # الجهاز الجديد لا توجد له قيمة مخزنة بعد
+    if old and new:
+        _mark(session, old['id'])
+    elif old:
+        # حذف صف إصدار الجهاز المحذوف حتى لا يتراكم في table_versions، وإبطال الكل
+        # لأن غياب الصف يُقرأ كإصدار 0 وقد يطابق قيمة مخزنة قديمة
+        session.info.setdefault(REMOVED_KEY, set()).add(device_key(old['id']))
+        session.info.setdefault(CHANGED_KEY, set()).add(ALL_DEVICES_KEY)
+
+
+# آخر تشييك يُقرأ من أعمدة حالة الجهاز، وتتغير مع هذه الحقول (src/services/device_health.py)
+@on_change(Inspection, ('device_id', 'inspection_date', 'status', 'inspector_id'))
+@on_change(MaintenanceTask, ('device_id', 'title', 'priority', 'status', 'scheduled_date', 'assigned_user_id'))
+def _record_child(session, old, new):
+    _mark(session, *(row['device_id'] for row in (old, new) if row))
+
+
+@on_change(User, ('id', 'name'))
+def _record_rename(session, old, new):
+    if old and new and old['name'] != new['name']:
+        session.info.setdefault(CHANGED_KEY, set()).add(ALL_DEVICES_KEY)
+
+
+@after_flush
+def bump_changed_scans(session):
+    changed = session.info.pop(CHANGED_KEY, set())
+    removed = session.info.pop(REMOVED_KEY, set())
+    if removed:
+        touch_tables(session, removed)
+        session.connection().execute(delete(TableVersion.__table__).where(TableVersion.table_name.in_(removed)))
+    if changed - removed:
+        bump_versions(session, changed - removed)
+
+
+@after_rollback
+def discard_changed_scans(session):
+    session.info.pop(CHANGED_KEY, None)
+    session.info.pop(REMOVED_KEY, None)
+
+
+# عبارة مبنية مرة واحدة لأنها تُنفذ مع كل مسح
+_VERSIONS_QUERY = select(TableVersion.table_name, TableVersion.version).where(
+    TableVersion.table_name.in_(bindparam('keys', expanding=True))
+)
+
+
+def _versions(device_id):
+    key = device_key(device_id)
+    versions = dict(db.session.execute(_VERSIONS_QUERY, {'keys': [ALL_DEVICES_KEY, key]}).all())
+    # حالة الاستحقاق والتأخر تتغير مع التاريخ
+    return datetime.utcnow().date(), versions.get(ALL_DEVICES_KEY, 0), versions.get(key, 0)
+
+
+def _with_versions(*columns):
+    """استعلام الأجهزة مع إصدارات بيانات المسح في العبارة نفسها، فتكون القيم وإصداراتها من لقطة واحدة"""
+    all_devices = aliased(TableVersion)
+    device = aliased(TableVersion)
+    return select(
+        *columns,
+        func.coalesce(all_devices.version, 0),
+        func.coalesce(device.version, 0)
+    ).select_from(Device).outerjoin(all_devices, all_devices.table_name == ALL_DEVICES_KEY).outerjoin(
+        device, device.table_name == ALL_DEVICES_KEY + '.' + cast(Device.id, String)
+    )
+
+
+def scan_payload(device, open_tasks, template):
+    """بيانات المسح المختصرة: الجهاز وآخر تشييك والمهام المفتوحة وقالب التشييك المطابق"""
+    today = datetime.utcnow().date()
+    return {
+        'device': {
+            'id': device.id,
+            'name': device.name,
+            'type': device.type,
+            'location': device.location,
+            'location_id': device.location_id,
+            'serial_number': device.serial_number,
+            'status': device.status,
+            'last_maintenance': device.last_maintenance.isoformat() if device.last_maintenance else None,
+            'next_maintenance': device.next_maintenance.isoformat() if device.next_maintenance else None,
+            'maintenance_due': bool(device.next_maintenance and device.next_maintenance <= today + timedelta(days=7)),
+            'maintenance_overdue': bool(device.next_maintenance and device.next_maintenance < today)
+        },
+        'last_inspection': {
+            'id': device.last_inspection_id,
+            'date': device.last_inspection_date.isoformat() if device.last_inspection_date else None,
+            'status': device.last_inspection_status,
+            'inspector': device.last_inspector_name
+        } if device.last_inspection_id else None,
+        'pending_tasks': device.pending_tasks_count,
+        'open_tasks': [
+            {
+                'id': task.id,
+                'title': task.title,
+                'priority': task.priority,
+                'status': task.status,
+                'scheduled_date': task.scheduled_date.isoformat() if task.scheduled_date else None,
+                'assigned_user_name': assigned_user_name
+            } for task, assigned_user_name in open_tasks
+        ],
+        'template': template
+    }
+
+
+def _build_entries(*criteria):
+    """بناء القيم المرمّزة للأجهزة المطابقة بعبارتين: الأجهزة مع إصداراتها ثم مهامها المفتوحة"""
+    today = datetime.utcnow().date()
+    rows = db.session.execute(_with_versions(Device).where(*criteria)).all()
+    if not rows:
+        return []
+
+    open_tasks = {}
+    for task, assigned_user_name in db.session.execute(
+        select(MaintenanceTask, User.name).outerjoin(User, User.id == MaintenanceTask.assigned_user_id).where(
+            MaintenanceTask.device_id.in_([device.id for device, _, _ in rows]),
+            MaintenanceTask.status.in_(OPEN_TASK_STATUSES)
+        ).order_by(
+            MaintenanceTask.device_id,
+            MaintenanceTask.scheduled_date.is_(None),
+            MaintenanceTask.scheduled_date,
+            MaintenanceTask.id
+        )
+    ):
+        tasks = open_tasks.setdefault(task.device_id, [])
+        if len(tasks) < SCAN_OPEN_TASKS_LIMIT:
+            tasks.append((task, assigned_user_name))
+
+    templates = {
+        template['id']: template
+        for template in reference_data.get('inspection_templates').payload['templates']
+    }
+    entries = []
+    for device, all_version, device_version in rows:
+        payload = scan_payload(device, open_tasks.get(device.id, ()), templates.get(device.type))
+        body = current_app.json.response(payload).get_data()
+        entries.append((device.serial_number, _Entry(
+            device.id, (today, all_version, device_version), body, hashlib.sha1(body).hexdigest()[:20]
+        )))
+    return entries
+
+
+class DeviceScanCache:
+    """ذاكرة LRU لاستجابات مسح ملصقات الأجهزة مرمّزة مسبقاً
+
+    كل قيمة مرتبطة بإصدار بيانات جهازها في table_versions، ويُتحقق منه عند كل
+    طلب بقراءة واحدة بالمفتاح الأساسي فتظهر كتابات العمليات الأخرى فوراً. الكتابات
+    في هذه العملية تُبطل أجهزتها فور commit (on_commit) ويعيد خيط الذاكرة
+    (warm) بناءها في الخلفية، مع تسخين كامل كل SCAN_CACHE_WARM_INTERVAL.
+    """
+
+    def __init__(self, max_entries=SCAN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # code -> _Entry
+        self._codes = {}  # device_id -> code
+        self._pending = set()
+        self._warmed_at = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, entries):
+        with self._lock:
+            for code, entry in entries:
+                self._entries[code] = entry
+                self._entries.move_to_end(code)
+                self._codes[entry.device_id] = code
+            while len(self._entries) > self.max_entries:
+                _, entry = self._entries.popitem(last=False)
+                self._codes.pop(entry.device_id, None)
+
+    def _drop(self, code):
+        entry = self._entries.pop(code, None)
+        if entry is not None and self._codes.get(entry.device_id) == code:
+            del self._codes[entry.device_id]
+        return entry
+
+    def get(self, code):
+        """الاستجابة المرمّزة لرمز ملصق، أو None إذا لم يوجد جهاز بهذا الرقم التسلسلي"""
+        with self._lock:
+            entry = self._entries.get(code)
+        if entry is not None and entry.versions == _versions(entry.device_id):
+            with self._lock:
+                if code in self._entries:
+                    self._entries.move_to_end(code)
+                self.hits += 1
+            return entry
+
+        with self._lock:
+            self.misses += 1
+            self._drop(code)
+        entries = _build_entries(Device.serial_number == code)
+        self._store(entries)
+        return entries[0][1] if entries else None
+
+    def invalidate(self, device_ids):
+        """حذف القيم المخزنة لأجهزة تغيرت وتسجيلها لإعادة بنائها في الاستدعاء التالي لـ warm"""
+        with self._lock:
+            for device_id in device_ids:
+                code = self._codes.get(device_id)
+                if code is not None:
+                    self._drop(code)
+            self._pending.update(device_ids)
+            if len(self._pending) > self.max_entries:
+                # إعادة بناء كاملة أرخص من بناء هذا العدد جهازاً جهازاً
+                self._pending.clear()
+                self._warmed_at = None
+
+    def invalidate_all(self):
+        """طلب تسخين كامل في الاستدعاء التالي لـ warm بعد تغيير يمس أجهزة كثيرة"""
+        with self._lock:
+            self._warmed_at = None
+
+    def warm(self):
+        """إعادة بناء الأجهزة المتغيرة، ومرة كل SCAN_CACHE_WARM_INTERVAL القيم الناقصة أو القديمة لأحدث الأجهزة"""
+        with self._lock:
+            pending, self._pending = sorted(self._pending), set()
+            full = self._warmed_at is None or time.monotonic() - self._warmed_at >= SCAN_CACHE_WARM_INTERVAL
+            if full:
+                self._warmed_at = time.monotonic()
+        for start in range(0, len(pending), CHUNK):
+            self._store(_build_entries(Device.id.in_(pending[start:start + CHUNK]), Device.serial_number.isnot(None)))
+        if not full:
+            return len(pending)
+
+        today = datetime.utcnow().date()
+        rows = db.session.execute(
+            _with_versions(Device.id, Device.serial_number).where(Device.serial_number.isnot(None)).order_by(
+                Device.id.desc()
+            ).limit(self.max_entries)
+        ).all()
+        with self._lock:
+            current = {code: entry.versions for code, entry in self._entries.items()}
+        stale = [
+            device_id for device_id, code, all_version, device_version in rows
+            if current.get(code) != (today, all_version, device_version)
+        ]
+        # الأقدم أولاً حتى تبقى الأحدث في نهاية ترتيب LRU
+        stale.reverse()
+        for start in range(0, len(stale), CHUNK):
+            self._store(_build_entries(Device.id.in_(stale[start:start + CHUNK])))
+        return len(pending) + len(stale)
+
+    def response(self, code):
+        """استجابة المسح مع ETag قوي، و 304 إذا لم يتغير الجهاز منذ آخر مسح"""
+        entry = self.get(code)
+        if entry is None:
+            return None
+        if request.if_none_match.contains_weak(entry.etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._codes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_entries,
+                'pending': len(self._pending),
+                'warmed_seconds_ago': round(time.monotonic() - self._warmed_at, 1) if self._warmed_at is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0
+            }
+
+
+device_scan_cache = DeviceScanCache()
+device_scan_warmer = PeriodicTask('device-scan-cache', SCAN_CACHE_WARM_INTERVAL, device_scan_cache.warm)
+
+
+@on_commit
+def invalidate_committed_scans(tables):
+    """إبطال بيانات المسح للأجهزة التي تغيرت في هذه العملية وإيقاظ خيط الذاكرة لإعادة بنائها"""
+    prefix = ALL_DEVICES_KEY + '.'
+    device_ids = [int(key[len(prefix):]) for key in tables if key.startswith(prefix)]
+    if device_ids:
+        device_scan_cache.invalidate(device_ids)
+    if ALL_DEVICES_KEY in tables:
+        device_scan_cache.invalidate_all()
+    if device_ids or ALL_DEVICES_KEY in tables:
+        device_scan_warmer.trigger()
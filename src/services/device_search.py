@@ -0,0 +1,96 @@
+from sqlalchemy import DDL, Float, Integer, event, text
+from sqlalchemy.engine import Engine
+from src.models.user import Device, db
+import re
+import sqlite3
+
+# أوزان الأعمدة في ترتيب النتائج (bm25): الاسم ثم الرقم التسلسلي ثم الموقع ثم النوع
+COLUMN_WEIGHTS = (10.0, 2.0, 5.0, 1.0)  # name, location, serial_number, type
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+})
+# أداة التعريف في بداية الكلمة (مع بقاء حرفين على الأقل) حتى يطابق "مطبخ" كلمة "المطبخ"
+_ARTICLE = re.compile(r'\b(?:و?ال)(?=\w{2})')
+_TOKENS = re.compile(r'\w+')
+
+
+def normalize_arabic(value):
+    """توحيد النص العربي للبحث: حذف التشكيل والتطويل وأداة التعريف وتوحيد أشكال الألف والتاء المربوطة والياء والأرقام"""
+    if value is None:
+        return None
+    return _ARTICLE.sub('', _DIACRITICS.sub('', str(value)).translate(_LETTERS)).lower()
+
+
+@event.listens_for(Engine, 'connect')
+def _register_functions(dbapi_connection, connection_record):
+    # المشغلات (triggers) تستدعي الدالة، لذلك يجب تسجيلها في كل اتصال
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('normalize_arabic', 1, normalize_arabic, deterministic=True)
+
+
+_COLUMNS = ('name', 'location', 'serial_number', 'type')
+_VALUES = ', '.join(f'normalize_arabic({{row}}.{column})' for column in _COLUMNS)
+
+SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS device_fts USING fts5({', '.join(_COLUMNS)}, tokenize='unicode61')",
+    f"""CREATE TRIGGER IF NOT EXISTS device_fts_insert AFTER INSERT ON device BEGIN
+        INSERT INTO device_fts(rowid, {', '.join(_COLUMNS)}) VALUES (new.id, {_VALUES.format(row='new')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS device_fts_delete AFTER DELETE ON device BEGIN
+        DELETE FROM device_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS device_fts_update AFTER UPDATE OF id, {', '.join(_COLUMNS)} ON device BEGIN
+        DELETE FROM device_fts WHERE rowid = old.id;
+        INSERT INTO device_fts(rowid, {', '.join(_COLUMNS)}) VALUES (new.id, {_VALUES.format(row='new')});
+    END""",
+)
+
+# قاعدة بيانات جديدة: إنشاء الفهرس والمشغلات مع جدول الأجهزة
+for _statement in SCHEMA:
+    event.listen(Device.__table__, 'after_create', DDL(_statement))
+
+
+def rebuild_device_search():
+    """إعادة بناء فهرس البحث من جدول الأجهزة"""
+    db.session.execute(text('DELETE FROM device_fts'))
+    db.session.execute(text(
+        f"INSERT INTO device_fts(rowid, {', '.join(_COLUMNS)}) SELECT id, {_VALUES.format(row='device')} FROM device"
+    ))
+    db.session.commit()
+
+
+def init_device_search(app):
+    """إنشاء فهرس البحث في قاعدة بيانات موجودة وملؤه عند أول تشغيل"""
+    with app.app_context():
+        existed = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'device_fts'"
+        )).first() is not None
+        for statement in SCHEMA:
+            db.session.execute(text(statement))
+        db.session.commit()
+        if not existed:
+            rebuild_device_search()
+
+
+def match_expression(search):
+    """تحويل نص البحث إلى تعبير FTS5: كل كلمة كبادئة، ويجب أن تطابق جميع الكلمات"""
+    tokens = _TOKENS.findall(normalize_arabic(search))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_matches(search):
+    """استعلام فرعي بمعرفات الأجهزة المطابقة ودرجة الصلة (الأقل أفضل)، أو None لنص بدون كلمات"""
+    expression = match_expression(search)
+    if not expression:
+        return None
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    return text(
+        f'SELECT rowid AS device_id, bm25(device_fts, {weights}) AS score FROM device_fts WHERE device_fts MATCH :expression'
+    ).bindparams(expression=expression).columns(device_id=Integer, score=Float).subquery('device_matches')
@@ -0,0 +1,99 @@
+from sqlalchemy import and_, func, update
+from src.models.user import Device, Location, db
+from src.services.device_scan import invalidate_all_scans
+from src.services.reference_data import version_key
+from src.services.table_versions import bump_versions
+
+# مستويات الهرمية بالترتيب، وكل موقع يكون في المستوى التالي لأبيه مباشرة
+LOCATION_KINDS = ('building', 'floor', 'zone', 'room')
+LOCATION_KIND_LABELS = {'building': 'مبنى', 'floor': 'طابق', 'zone': 'منطقة', 'room': 'غرفة'}
+NAME_SEPARATOR = ' / '
+
+
+def starts_with(column, prefix):
+    """شرط نطاق يستخدم الفهرس لكل القيم التي تبدأ بـ prefix (بدلاً من LIKE أو contains)"""
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def ancestor_ids(path):
+    """معرفات المواقع في المسار من الجذر حتى الموقع نفسه"""
+    return [int(part) for part in path.strip('/').split('/')] if path else []
+
+
+def child_kind(parent):
+    """المستوى المسموح للمواقع الفرعية، أو None إذا كان الأب غرفة"""
+    if parent is None:
+        return LOCATION_KINDS[0]
+    position = LOCATION_KINDS.index(parent.kind) + 1
+    return LOCATION_KINDS[position] if position < len(LOCATION_KINDS) else None
+
+
+def location_filter(location):
+    """تصفية الأجهزة حسب نص الموقع: الموقع نفسه وكل ما تحته في الهرمية، دون مطابقة جزئية"""
+    return db.or_(Device.location == location, starts_with(Device.location, location + NAME_SEPARATOR))
+
+
+def create_location(name, kind, parent=None):
+    """إضافة موقع مع حساب مساره واسمه الكامل (يحتاج المعرف، لذلك يتم flush أولاً)"""
+    location = Location(name=name, kind=kind, parent_id=parent.id if parent else None)
+    db.session.add(location)
+    db.session.flush()
+    location.path = f'{parent.path if parent else "/"}{location.id}/'
+    location.full_name = f'{parent.full_name}{NAME_SEPARATOR}{name}' if parent else name
+    return location
+
+
+def assign_location(device, location):
+    """ربط جهاز بموقع ونسخ مساره واسمه الكامل إلى أعمدة الجهاز"""
+    device.location_id = location.id
+    device.location_path = location.path
+    device.location = location.full_name
+
+
+def move_location(location, name, parent):
+    """تغيير اسم موقع أو نقله، مع تحديث المواقع والأجهزة التابعة بعبارتي UPDATE
+
+    يُحدّث الموقع نفسه عبر ORM حتى تنقل دالة العدادات مجاميعه من الآباء
+    القدامى إلى الجدد، أما المواقع والأجهزة التابعة فتُحدّث باستبدال بادئة
+    المسار والاسم الكامل.
+    """
+    old_path, old_full_name = location.path, location.full_name
+    new_path = f'{parent.path if parent else "/"}{location.id}/'
+    new_full_name = f'{parent.full_name}{NAME_SEPARATOR}{name}' if parent else name
+    if (old_path, old_full_name) == (new_path, new_full_name):
+        return
+
+    location.name = name
+    location.parent_id = parent.id if parent else None
+    location.path = new_path
+    location.full_name = new_full_name
+
+    path_tail = func.substr(Location.path, len(old_path) + 1)
+    name_tail = func.substr(Location.full_name, len(old_full_name) + 1)
+    db.session.execute(update(Location).where(
+        starts_with(Location.path, old_path),
+        Location.id != location.id
+    ).values(path=new_path + path_tail, full_name=new_full_name + name_tail).execution_options(
+        synchronize_session='fetch'
+    ))
+    db.session.execute(update(Device).where(starts_with(Device.location_path, old_path)).values(
+        location_path=new_path + func.substr(Device.location_path, len(old_path) + 1),
+        location=new_full_name + func.substr(Device.location, len(old_full_name) + 1)
+    ).execution_options(synchronize_session='fetch'))
+    bump_versions(db.session, {version_key(Device.location), version_key(Location.full_name)})
+    invalidate_all_scans(db.session)
+
+
+def location_to_dict(location, totals=None):
+    totals = totals or {}
+    return {
+        'id': location.id,
+        'name': location.name,
+        'kind': location.kind,
+        'kind_label': LOCATION_KIND_LABELS.get(location.kind, location.kind),
+        'parent_id': location.parent_id,
+        'path': location.path,
+        'full_name': location.full_name,
+        'devices': totals.get('devices', 0),
+        'overdue': totals.get('overdue', 0)
+    }
@@ -0,0 +1,221 @@
+from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from src.models.user import User, UserSession, db
+from src.services.background import PeriodicTask
+from src.services.table_versions import bump_versions
+import threading
+import atexit
+import os
+
+# إعدادات التخزين المؤقت لعمليات الكتابة الخاصة بتسجيل الدخول
+LOGIN_WRITE_FLUSH_INTERVAL = float(os.environ.get('LOGIN_WRITE_FLUSH_INTERVAL', 2))
+LOGIN_WRITE_FLUSH_SIZE = int(os.environ.get('LOGIN_WRITE_FLUSH_SIZE', 100))
+# عدد مرات التفريغ الفاشلة المتتالية قبل عزل الصفوف الخاطئة وحذفها
+LOGIN_WRITE_MAX_ATTEMPTS = int(os.environ.get('LOGIN_WRITE_MAX_ATTEMPTS', 3))
+# الحد الأقصى للعناصر المعلقة، وعند بلوغه ينتظر تسجيل الدخول التفريغ (بالثواني) ثم يُرفض
+LOGIN_WRITE_MAX_PENDING = int(os.environ.get('LOGIN_WRITE_MAX_PENDING', 5000))
+LOGIN_WRITE_WAIT_TIMEOUT = float(os.environ.get('LOGIN_WRITE_WAIT_TIMEOUT', 5))
+LOGIN_WRITE_RETRY_AFTER = int(os.environ.get('LOGIN_WRITE_RETRY_AFTER', 2))
+
+
+class LoginWritesBusy(Exception):
+    """يُرفع عندما تبقى قائمة الكتابة المجمّعة ممتلئة (مثل قفل مستمر على قاعدة البيانات)"""
+
+    def __init__(self, retry_after=LOGIN_WRITE_RETRY_AFTER):
+        super().__init__('Login write buffer is full')
+        self.retry_after = retry_after
+
+
+class LoginWriteBuffer:
+    """تجميع تحديثات last_login وجلسات التذكر وكتابتها في معاملة واحدة
+
+    يتم التفريغ كل LOGIN_WRITE_FLUSH_INTERVAL ثانية أو عند بلوغ
+    LOGIN_WRITE_FLUSH_SIZE عنصر، وعند إيقاف التطبيق. أخطاء قاعدة البيانات
+    المؤقتة (OperationalError مثل القفل) يُعاد تفريغها دائماً، أما إذا فشل
+    التفريغ LOGIN_WRITE_MAX_ATTEMPTS مرات بسبب صف خاطئ فتُكتب الدفعة مقسمة
+    في نقاط حفظ ويُحذف الصف الذي يفشل وحده. حجم القائمة محدود بـ
+    LOGIN_WRITE_MAX_PENDING، وعند امتلائها ينتظر المستدعي التفريغ أو يُرفض.
+    """
+
+    def __init__(self, interval=LOGIN_WRITE_FLUSH_INTERVAL, flush_size=LOGIN_WRITE_FLUSH_SIZE,
+                 max_attempts=LOGIN_WRITE_MAX_ATTEMPTS, max_pending=LOGIN_WRITE_MAX_PENDING,
+                 wait_timeout=LOGIN_WRITE_WAIT_TIMEOUT):
+        self.flush_size = flush_size
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self._failures = 0
+        self._logins = {}  # user_id -> last_login
+        self._sessions = []
+        # الدفعة التي يجري تفريغها الآن (تبقى محسوبة في الحد وقابلة للبحث حتى commit)
+        self._flushing_logins = {}
+        self._flushing_sessions = []
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._task = PeriodicTask('login-write-buffer', interval, self.flush)
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rejected = 0
+
+    def init_app(self, app):
+        """بدء التفريغ الدوري وضمان التفريغ عند الإيقاف"""
+        self._task.start(app)
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        """إيقاف الخيط الخلفي وتفريغ ما تبقى"""
+        if self._task.running:
+            self._task.stop()
+            self._task.run_once()
+
+    def record_login(self, user_id, when):
+        """تسجيل وقت آخر دخول للمستخدم"""
+        with self._lock:
+            if user_id not in self._logins:
+                self._wait_for_room()
+            self._logins[user_id] = when
+        self._after_write()
+
+    def add_session(self, **row):
+        """إضافة جلسة تذكر جديدة"""
+        with self._lock:
+            self._wait_for_room()
+            self._sessions.append(row)
+        self._after_write()
+
+    def find_session(self, session_token):
+        """البحث عن جلسة تذكر لم تُكتب بعد في الذاكرة (دون تفريغ من خيط الطلب)"""
+        with self._lock:
+            for row in self._sessions + self._flushing_sessions:
+                if row['session_token'] == session_token:
+                    return dict(row)
+        return None
+
+    def _size(self):
+        return len(self._logins) + len(self._sessions) + len(self._flushing_logins) + len(self._flushing_sessions)
+
+    def _wait_for_room(self):
+        """الضغط العكسي: انتظار التفريغ عند امتلاء القائمة بدل نموها بلا حد (يُستدعى مع القفل)"""
+        if self._size() < self.max_pending:
+            return
+        self._task.trigger()
+        if not self._task.running or not self._room.wait_for(lambda: self._size() < self.max_pending, self.wait_timeout):
+            self.rejected += 1
+            raise LoginWritesBusy()
+
+    def discard_sessions(self, user_id):
+        """حذف جلسات المستخدم التي لم تُكتب بعد"""
+        with self._lock:
+            self._sessions = [row for row in self._sessions if row['user_id'] != user_id]
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._logins) + len(self._sessions)
+
+    def _after_write(self):
+        if not self._task.running:
+            # بدون خيط خلفي (مثل سكربتات الأدوات) تتم الكتابة مباشرة
+            self.flush()
+        elif self.pending_count() >= self.flush_size:
+            self._task.trigger()
+
+    def flush(self):
+        """كتابة جميع العناصر المعلقة في معاملة واحدة"""
+        with self._flush_lock:
+            with self._lock:
+                logins, self._logins = self._logins, {}
+                sessions, self._sessions = self._sessions, []
+                self._flushing_logins, self._flushing_sessions = logins, sessions
+
+            if not logins and not sessions:
+                return 0
+
+            dropped = []
+            try:
+                try:
+                    self._write(logins, sessions)
+                    db.session.commit()
+                    written = len(logins) + len(sessions)
+                except OperationalError:
+                    # خطأ مؤقت في قاعدة البيانات (مثل القفل): تُعاد الدفعة كاملة دائماً
+                    db.session.rollback()
+                    raise
+                except Exception:
+                    db.session.rollback()
+                    self._failures += 1
+                    if self._failures < self.max_attempts:
+                        raise
+                    written = self._write_isolated(logins, sessions, dropped)
+            except Exception:
+                # إعادة العناصر إلى القائمة لمحاولة كتابتها في التفريغ التالي
+                with self._lock:
+                    for user_id, when in logins.items():
+                        self._logins.setdefault(user_id, when)
+                    self._sessions = sessions + self._sessions
+                    self._flushing_logins, self._flushing_sessions = {}, []
+                raise
+
+            with self._lock:
+                self._flushing_logins, self._flushing_sessions = {}, []
+                self._room.notify_all()
+            self._failures = 0
+            for rows, error in dropped:
+                self._drop(rows, error)
+
+            self.flushes += 1
+            self.rows_written += written
+            return written
+
+    def _write(self, logins, sessions):
+        if logins:
+            db.session.execute(
+                update(User),
+                [{'id': user_id, 'last_login': when} for user_id, when in logins.items()]
+            )
+            # التحديث المجمّع بالمفتاح الأساسي لا يمر بأحداث flush
+            bump_versions(db.session, {User.__tablename__})
+        if sessions:
+            db.session.execute(insert(UserSession), sessions)
+
+    def _write_isolated(self, logins, sessions, dropped):
+        """المحاولة الأخيرة للدفعة: كتابة ما يمكن كتابته وعزل الصفوف الخاطئة في dropped"""
+        rows = [(user_id, when, None) for user_id, when in logins.items()] + [(None, None, row) for row in sessions]
+        try:
+            written = self._write_rows(rows, dropped)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            dropped.clear()
+            raise
+        return written
+
+    def _write_rows(self, rows, dropped):
+        """كتابة الصفوف في نقطة حفظ، وعند الفشل تقسيمها إلى نصفين حتى يبقى الصف الخاطئ وحده"""
+        try:
+            with db.session.begin_nested():
+                self._write(
+                    {user_id: when for user_id, when, session in rows if session is None},
+                    [session for _, _, session in rows if session is not None]
+                )
+            return len(rows)
+        except OperationalError:
+            raise
+        except SQLAlchemyError as e:
+            if len(rows) == 1:
+                dropped.append((rows, e))
+                return 0
+        middle = len(rows) // 2
+        return self._write_rows(rows[:middle], dropped) + self._write_rows(rows[middle:], dropped)
+
+    def _drop(self, rows, error):
+        self.rows_dropped += len(rows)
+        users = sorted({user_id if session is None else session['user_id'] for user_id, _, session in rows})
+        current_app.logger.error(
+            f"Login write buffer dropped {len(rows)} rows for users {users} "
+            f"after {self.max_attempts} failed flushes: {str(getattr(error, 'orig', None) or error)}"
+        )
+
+login_writes = LoginWriteBuffer()
@@ -0,0 +1,110 @@
+from flask import request
+from datetime import datetime
+from sqlalchemy import tuple_
+from src.services.response_cache import response_cache, RESPONSE_CACHE_TTL_COUNTS
+import base64
+import json
+import operator
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """مؤشر صفحة غير صالح"""
+
+
+def encode_cursor(*values):
+    """تحويل قيم آخر صف في الصفحة إلى مؤشر نصي مبهم"""
+    encoded = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(encoded).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, *types):
+    """فك المؤشر وإرجاع القيم بالأنواع المحددة (int أو str أو datetime)، والقيم الفارغة تبقى None"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise InvalidCursor(cursor)
+        return [
+            None if value is None else datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+            for value, value_type in zip(values, types)
+        ]
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor(cursor)
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """حجم الصفحة المطلوب ضمن الحدود المسموحة"""
+    if not value or value < 1:
+        return default
+    return min(value, MAX_PAGE_SIZE)
+
+
+def _sort_values(row, column, id_column):
+    # الصف نفسه، أو الكائن الأول في الصفوف المركبة (الكائن مع أعمدة إضافية)
+    source = row if hasattr(row, column.key) else row[0]
+    return getattr(source, column.key), getattr(source, id_column.key)
+
+
+def keyset_page(query, column, id_column, limit, cursor=None, descending=True):
+    """صفحة بالترتيب (column, id) تبدأ بعد المؤشر، مع مؤشر الصفحة التالية
+
+    المقارنة بقيم الصف (column, id) < (?, ?) تبدأ البحث في الفهرس من موضع المؤشر
+    مباشرة بدل تخطي الصفوف السابقة. القيم الفارغة لا تطابقها تلك المقارنة، وهي
+    تأتي أخيراً في الترتيب التنازلي وأولاً في التصاعدي، لذلك تُجلب باستعلام
+    منفصل عند الوصول إليها.
+    """
+    order = (column.desc(), id_column.desc()) if descending else (column.asc(), id_column.asc())
+    after = operator.lt if descending else operator.gt
+
+    if cursor is None:
+        rows = query.order_by(*order).limit(limit + 1).all()
+    elif cursor[0] is None:
+        rows = query.filter(column.is_(None), after(id_column, cursor[1])).order_by(order[1]).limit(limit + 1).all()
+        if not descending and len(rows) <= limit:
+            rows += query.filter(column.isnot(None)).order_by(*order).limit(limit + 1 - len(rows)).all()
+    else:
+        rows = query.filter(after(tuple_(column, id_column), tuple_(*cursor))).order_by(*order).limit(limit + 1).all()
+        if descending and len(rows) <= limit:
+            rows += query.filter(column.is_(None)).order_by(order[1]).limit(limit + 1 - len(rows)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*_sort_values(rows[-1], column, id_column))
+    return rows, next_cursor
+
+
+def cached_count(query, tables):
+    """عدد صفوف الاستعلام من الذاكرة المؤقتة المشتركة
+
+    يُبطل عند تغيير أحد الجداول في هذه العملية، أما كتابات العمليات الأخرى
+    فتظهر بعد انتهاء RESPONSE_CACHE_TTL_COUNTS، لذلك قد يكون العدد تقريبياً.
+    """
+    compiled = query.statement.compile()
+    key = ('count', str(compiled), tuple(sorted(compiled.params.items())))
+    return response_cache.get_or_compute(
+        request.endpoint, key, RESPONSE_CACHE_TTL_COUNTS, frozenset(tables), lambda: query.order_by(None).count()
+    )
+
+
+def cursor_page(query, column, id_column, tables, descending=True, default=20):
+    """صفحة بالمؤشر حسب معاملات الطلب cursor و per_page و include_total
+
+    بديل اختياري لـ paginate دون OFFSET ودون COUNT في كل صفحة. الصفحة الأولى
+    تُطلب بـ ?cursor= فارغ، والعدد الكلي يُحسب فقط مع include_total=true من
+    cached_count. يرفع InvalidCursor إذا كان المؤشر غير صالح.
+    """
+    limit = page_size(request.args.get('per_page', type=int), default=default)
+    cursor = request.args.get('cursor')
+    cursor = decode_cursor(cursor, column.type.python_type, int) if cursor else None
+
+    rows, next_cursor = keyset_page(query, column, id_column, limit, cursor, descending)
+    total = None
+    if request.args.get('include_total', 'false').lower() == 'true':
+        total = cached_count(query, tables)
+    return rows, {'per_page': limit, 'next_cursor': next_cursor, 'has_next': next_cursor is not None, 'total': total}
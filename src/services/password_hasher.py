@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+import os
+
+# إعدادات مجمع عمليات تشفير كلمات المرور
+# المجمع يفيد عند توفر عدة أنوية: يوزع التشفير عليها ويحد عدد العمليات المتزامنة.
+# على نواة واحدة لا يضيف إلا كلفة نقل البيانات بين العمليات (7.4 دخول/ثانية مباشرة
+# مقابل 6.2 بعمليتين في benchmarks/login_throughput.py)، لذلك يكون الافتراضي
+# التشفير في خيط الطلب (0) مع بقاء حد قائمة الانتظار
+PASSWORD_HASH_WORKERS = int(os.environ.get(
+    'PASSWORD_HASH_WORKERS', os.cpu_count() if (os.cpu_count() or 1) > 1 else 0
+))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', max(PASSWORD_HASH_WORKERS, 1) * 4))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 2))
+
+
+class HasherBusy(Exception):
+    """يُرفع عندما تكون قائمة انتظار التشفير ممتلئة أو لم ينتهِ التشفير خلال المهلة"""
+
+    def __init__(self, retry_after=PASSWORD_HASH_RETRY_AFTER, message='Password hashing queue is full'):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """مجمع عمليات محدود لتنفيذ PBKDF2 خارج خيط الطلب مع حد لعمق قائمة الانتظار"""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING,
+                 timeout=PASSWORD_HASH_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _get_executor(self):
+        # يُنشأ المجمع عند أول استخدام داخل كل عملية (بعد fork في gunicorn)
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._pid = os.getpid()
+        return self._executor
+
+    def _done(self, future):
+        # يُستدعى عند انتهاء المهمة فعلاً أو إلغائها، وليس عند انتهاء مهلة انتظار الطلب لها
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled():
+                self.completed += 1
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy()
+            self._pending += 1
+            if self.workers <= 0:
+                executor = None
+            else:
+                executor = self._get_executor()
+
+        if executor is None:
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    self.completed += 1
+
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # المهمة المنتظرة في القائمة تُلغى، والجارية تبقى محسوبة حتى تنتهي
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise HasherBusy(message='Password hashing timed out')
+
+    def hash(self, password):
+        """تشفير كلمة المرور"""
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash, password):
+        """التحقق من كلمة المرور مقابل القيمة المشفرة"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def stats(self):
+        """إحصائيات المجمع للمراقبة"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out
+            }
+
+
+password_hasher = PasswordHasher()
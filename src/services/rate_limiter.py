@@ -0,0 +1,254 @@
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# إعدادات تحديد معدل محاولات تسجيل الدخول
+RATE_LIMIT_DB = os.environ.get('RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'hospital_fire_safety_ratelimit.db'))
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', '')
+# حد IP مرتفع لأن موظفي المستشفى يسجلون الدخول عادة من خلف عنوان NAT واحد عند تبديل المناوبة،
+# والحماية من تخمين كلمة مرور حساب معين يوفرها حد البريد الإلكتروني. حد البريد يُحسب على
+# المحاولات الفاشلة فقط ولكل عنوان IP، فلا يُقفل الدخول الناجح من عدة أجهزة ولا يستطيع
+# مهاجم من عنوان آخر قفل حساب غيره
+LOGIN_IP_CAPACITY = int(os.environ.get('LOGIN_IP_CAPACITY', 100))
+LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', 60))
+LOGIN_EMAIL_CAPACITY = int(os.environ.get('LOGIN_EMAIL_CAPACITY', 5))
+LOGIN_EMAIL_PER_MINUTE = float(os.environ.get('LOGIN_EMAIL_PER_MINUTE', 1))
+
+
+class SQLiteBucketStore:
+    """تخزين حالة دلاء الرموز في ملف SQLite مشترك بين جميع عمليات gunicorn"""
+
+    PRUNE_EVERY = 1000
+    PRUNE_AGE = 86400
+
+    def __init__(self, path=RATE_LIMIT_DB):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        self._connection().executescript('''
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        ''')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def take(self, key, capacity, rate):
+        """سحب رمز من الدلو، يعيد (مسموح، ثواني الانتظار)"""
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            connection.execute(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        self._calls += 1
+        if self._calls % self.PRUNE_EVERY == 0:
+            connection.execute('DELETE FROM buckets WHERE updated < ?', (now - self.PRUNE_AGE,))
+
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def peek(self, key, capacity, rate):
+        """هل يوجد رمز في الدلو دون سحبه، يعيد (مسموح، ثواني الانتظار)"""
+        row = self._connection().execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + (time.time() - row[1]) * rate)
+        return tokens >= 1, 0 if tokens >= 1 else (1 - tokens) / rate
+
+    def incr(self, name):
+        self._connection().execute(
+            'INSERT INTO counters (name, value) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+            (name,)
+        )
+
+    def counters(self):
+        return dict(self._connection().execute('SELECT name, value FROM counters').fetchall())
+
+
+class RedisBucketStore:
+    """تخزين حالة دلاء الرموز في Redis (اختياري)"""
+
+    TAKE_SCRIPT = '''
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(bucket[1])
+        local updated = tonumber(bucket[2])
+        if tokens == nil then
+            tokens = capacity
+            updated = now
+        end
+        tokens = math.min(capacity, tokens + (now - updated) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+        return {allowed, tostring(tokens)}
+    '''
+
+    # مهلة الاتصال بـ Redis وفترة الاعتماد على SQLite بعد فشله قبل إعادة المحاولة
+    SOCKET_TIMEOUT = 0.5
+    RETRY_AFTER = 30
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url, socket_timeout=self.SOCKET_TIMEOUT, socket_connect_timeout=self.SOCKET_TIMEOUT)
+        self._take = self._redis.register_script(self.TAKE_SCRIPT)
+        self._errors = redis.RedisError
+        self._fallback = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def _call(self, method, *args):
+        """تنفيذ العملية في Redis، وعند تعذر الوصول إليه استخدام مخزن SQLite المحلي مع تسجيل تحذير
+
+        بدون ذلك يصبح تعطل Redis خطأ 500 في كل محاولة تسجيل دخول.
+        """
+        if self._failed_at is None or time.time() - self._failed_at >= self.RETRY_AFTER:
+            try:
+                result = getattr(self, f'_redis_{method}')(*args)
+            except self._errors as e:
+                if self._failed_at is None:
+                    logger.warning(f'Redis rate limit store unavailable, falling back to SQLite: {str(e)}')
+                self._failed_at = time.time()
+            else:
+                if self._failed_at is not None:
+                    logger.warning('Redis rate limit store is reachable again')
+                    self._failed_at = None
+                return result
+        return getattr(self._fallback_store(), method)(*args)
+
+    def _fallback_store(self):
+        if self._fallback is None:
+            with self._lock:
+                if self._fallback is None:
+                    self._fallback = SQLiteBucketStore()
+        return self._fallback
+
+    def take(self, key, capacity, rate):
+        return self._call('take', key, capacity, rate)
+
+    def peek(self, key, capacity, rate):
+        return self._call('peek', key, capacity, rate)
+
+    def incr(self, name):
+        return self._call('incr', name)
+
+    def counters(self):
+        return self._call('counters')
+
+    def _redis_take(self, key, capacity, rate):
+        allowed, tokens = self._take(keys=[f'ratelimit:{key}'], args=[capacity, rate, time.time()])
+        tokens = float(tokens)
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+    def _redis_peek(self, key, capacity, rate):
+        tokens, updated = self._redis.hmget(f'ratelimit:{key}', 'tokens', 'updated')
+        tokens = capacity if tokens is None else min(capacity, float(tokens) + (time.time() - float(updated)) * rate)
+        return tokens >= 1, 0 if tokens >= 1 else (1 - tokens) / rate
+
+    def _redis_incr(self, name):
+        self._redis.hincrby('ratelimit:counters', name, 1)
+
+    def _redis_counters(self):
+        return {name.decode(): int(value) for name, value in self._redis.hgetall('ratelimit:counters').items()}
+
+
+def create_store():
+    """اختيار مخزن Redis إذا تم إعداده وتوفرت المكتبة، وإلا SQLite"""
+    if RATE_LIMIT_REDIS_URL:
+        try:
+            return RedisBucketStore(RATE_LIMIT_REDIS_URL)
+        except ImportError:
+            logger.warning('redis package is not installed, falling back to SQLite rate limit store')
+    return SQLiteBucketStore()
+
+
+class LoginRateLimiter:
+    """تحديد معدل محاولات تسجيل الدخول لكل عنوان IP ولكل بريد إلكتروني"""
+
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = create_store()
+        return self._store
+
+    def _check(self, kind, value, capacity, per_minute, charge=True):
+        method = self.store.take if charge else self.store.peek
+        allowed, retry_after = method(f'login:{kind}:{value}', capacity, per_minute / 60.0)
+        if allowed:
+            return None
+        self.store.incr(f'rejected_{kind}')
+        return max(1, math.ceil(retry_after))
+
+    def check_ip(self, ip_address):
+        """يعيد عدد ثواني الانتظار إذا تم تجاوز الحد، أو None"""
+        return self._check('ip', ip_address or 'unknown', LOGIN_IP_CAPACITY, LOGIN_IP_PER_MINUTE)
+
+    def check_email(self, ip_address, email):
+        """يعيد عدد ثواني الانتظار إذا استُنفدت المحاولات الفاشلة لهذا البريد من هذا العنوان، أو None
+
+        لا يحتسب المحاولة، فالاحتساب يتم في login_failed بعد فشل التحقق من كلمة المرور.
+        """
+        return self._check('email', f'{ip_address or "unknown"}:{email}', LOGIN_EMAIL_CAPACITY, LOGIN_EMAIL_PER_MINUTE, charge=False)
+
+    def login_failed(self, ip_address, email):
+        """احتساب محاولة فاشلة على حد البريد الإلكتروني"""
+        self.store.take(f'login:email:{ip_address or "unknown"}:{email}', LOGIN_EMAIL_CAPACITY, LOGIN_EMAIL_PER_MINUTE / 60.0)
+
+    def stats(self):
+        counters = self.store.counters()
+        return {
+            'backend': type(self.store).__name__,
+            'rejected_ip': counters.get('rejected_ip', 0),
+            'rejected_email': counters.get('rejected_email', 0),
+            'limits': {
+                'ip': {'capacity': LOGIN_IP_CAPACITY, 'per_minute': LOGIN_IP_PER_MINUTE},
+                'email': {'capacity': LOGIN_EMAIL_CAPACITY, 'per_minute': LOGIN_EMAIL_PER_MINUTE}
+            }
+        }
+
+
+login_rate_limiter = LoginRateLimiter()
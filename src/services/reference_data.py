@@ -0,0 +1,109 @@
+from flask import request, current_app
+from collections import namedtuple
+from src.services.change_tracking import on_change, after_flush, after_rollback
+from src.services.table_versions import bump_versions, read_versions
+import gzip
+import hashlib
+import threading
+
+# الاستجابات الأصغر من ذلك لا تستفيد من الضغط
+REFERENCE_GZIP_MIN_SIZE = 512
+
+CHANGED_KEY = 'reference_data_changed'
+
+_Entry = namedtuple('_Entry', 'versions payload body gzipped etag')
+
+
+class _Catalog:
+    def __init__(self, build, keys):
+        self.build = build
+        self.keys = keys
+        self.entry = None
+        self.lock = threading.Lock()
+
+
+def version_key(attribute):
+    """مفتاح إصدار لعمود واحد في table_versions، مثل device.location"""
+    return f'{attribute.class_.__tablename__}.{attribute.key}'
+
+
+def _track(attribute):
+    key = version_key(attribute)
+
+    @on_change(attribute.class_, (attribute.key,))
+    def record(session, old, new):
+        session.info.setdefault(CHANGED_KEY, set()).add(key)
+
+    return key
+
+
+@after_flush
+def bump_changed_columns(session):
+    changed = session.info.pop(CHANGED_KEY, None)
+    if changed:
+        bump_versions(session, changed)
+
+
+@after_rollback
+def discard_changed_columns(session):
+    session.info.pop(CHANGED_KEY, None)
+
+
+class ReferenceData:
+    """سجل مركزي للقوائم المرجعية (الأنواع والمواقع والفئات والقوالب)
+
+    تُبنى كل قائمة مرة واحدة وتُخزن كبايتات JSON جاهزة مع نسخة مضغوطة بـ gzip
+    و ETag قوي من محتواها. القوائم المشتقة من أعمدة في قاعدة البيانات تُبنى من
+    جديد عندما يتغير إصدار أحد أعمدتها في table_versions، فتشمل الكتابات من
+    العمليات الأخرى أيضاً.
+    """
+
+    def __init__(self):
+        self._catalogs = {}
+
+    def catalog(self, name, columns=()):
+        """تسجيل دالة تُرجع محتوى القائمة، مع الأعمدة التي تُشتق منها إن وجدت"""
+        def decorator(build):
+            self._catalogs[name] = _Catalog(build, tuple(sorted(_track(column) for column in columns)))
+            return build
+        return decorator
+
+    def get(self, name):
+        """القائمة المرمّزة الحالية، وتُبنى فقط عند أول طلب أو بعد تغير أعمدتها"""
+        catalog = self._catalogs[name]
+        versions = tuple(sorted(read_versions(catalog.keys).items()))
+        entry = catalog.entry
+        if entry is None or entry.versions != versions:
+            with catalog.lock:
+                entry = catalog.entry
+                if entry is None or entry.versions != versions:
+                    entry = catalog.entry = self._encode(catalog.build(), versions)
+        return entry
+
+    @staticmethod
+    def _encode(payload, versions):
+        body = current_app.json.response(payload).get_data()
+        gzipped = gzip.compress(body, mtime=0) if len(body) >= REFERENCE_GZIP_MIN_SIZE else None
+        return _Entry(versions, payload, body, gzipped, hashlib.sha1(body).hexdigest()[:20])
+
+    def response(self, name):
+        """استجابة القائمة مع ETag قوي، و 304 إذا كانت لدى العميل النسخة الحالية"""
+        entry = self.get(name)
+        compressed = entry.gzipped is not None and request.accept_encodings['gzip'] > 0
+        # لكل ترميز ETag خاص به لأن البايتات مختلفة
+        etag = f'{entry.etag}-gzip' if compressed else entry.etag
+
+        if request.if_none_match.contains_weak(entry.etag) or request.if_none_match.contains_weak(f'{entry.etag}-gzip'):
+            response = current_app.response_class(status=304)
+        elif compressed:
+            response = current_app.response_class(entry.gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = current_app.response_class(entry.body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+reference_data = ReferenceData()
@@ -0,0 +1,148 @@
+from flask import request, current_app
+from functools import wraps
+from src.services.change_tracking import on_commit
+import threading
+import time
+import os
+
+# مدة صلاحية الاستجابات المخزنة بالثواني لكل مجموعة نقاط نهاية
+RESPONSE_CACHE_TTL_STATS = float(os.environ.get('RESPONSE_CACHE_TTL_STATS', 30))
+RESPONSE_CACHE_TTL_CHARTS = float(os.environ.get('RESPONSE_CACHE_TTL_CHARTS', 300))
+RESPONSE_CACHE_TTL_ALERTS = float(os.environ.get('RESPONSE_CACHE_TTL_ALERTS', 30))
+RESPONSE_CACHE_TTL_ACTIVITY = float(os.environ.get('RESPONSE_CACHE_TTL_ACTIVITY', 15))
+RESPONSE_CACHE_TTL_COUNTS = float(os.environ.get('RESPONSE_CACHE_TTL_COUNTS', 60))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 500))
+
+
+class _Flight:
+    """حساب جارٍ لمفتاح معين ينتظره الطلبات الأخرى"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class ResponseCache:
+    """ذاكرة مؤقتة مشتركة لاستجابات JSON المتطابقة لجميع المستخدمين
+
+    عند عدم وجود القيمة يحسبها طلب واحد فقط (single-flight) وتنتظر الطلبات
+    المتزامنة الأخرى نتيجته. تُبطل القيم عند تغيير الجداول التي تعتمد عليها.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, tables, payload)
+        self._flights = {}
+        self._generations = {}  # table -> رقم يزداد مع كل تغيير
+        self._metrics = {}  # endpoint -> {'hits', 'misses', 'waits'}
+        self._lock = threading.Lock()
+
+    def _count(self, endpoint, metric):
+        counters = self._metrics.setdefault(endpoint, {'hits': 0, 'misses': 0, 'waits': 0})
+        counters[metric] += 1
+
+    def get_or_compute(self, endpoint, key, ttl, tables, compute):
+        """إرجاع القيمة المخزنة أو حسابها مرة واحدة لجميع الطلبات المتزامنة"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._count(endpoint, 'hits')
+                return entry[2]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generations = {table: self._generations.get(table, 0) for table in tables}
+                self._count(endpoint, 'misses')
+            else:
+                self._count(endpoint, 'waits')
+
+        if not leader:
+            flight.done.wait()
+            if flight.result is not None:
+                return flight.result
+            return compute()
+
+        try:
+            flight.result = compute()
+        finally:
+            with self._lock:
+                del self._flights[key]
+                # لا نخزن نتيجة حُسبت أثناء تغيير أحد الجداول
+                unchanged = all(self._generations.get(table, 0) == generation for table, generation in generations.items())
+                if flight.result is not None and unchanged:
+                    if len(self._entries) >= self.max_entries:
+                        self._evict()
+                    self._entries[key] = (time.monotonic() + ttl, tables, flight.result)
+            flight.done.set()
+        return flight.result
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry[0] <= now]
+        for key in expired or [min(self._entries, key=lambda key: self._entries[key][0])]:
+            del self._entries[key]
+
+    def invalidate_tables(self, tables):
+        """حذف القيم التي تعتمد على أي من الجداول المعطاة"""
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry[1] & tables]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, counters in self._metrics.items():
+                lookups = counters['hits'] + counters['misses'] + counters['waits']
+                endpoints[endpoint] = dict(
+                    counters,
+                    hit_rate=round((counters['hits'] + counters['waits']) / lookups, 4) if lookups else 0.0
+                )
+            return {'entries': len(self._entries), 'endpoints': endpoints}
+
+
+response_cache = ResponseCache()
+on_commit(response_cache.invalidate_tables)
+
+
+def cached_response(ttl, tables, params=None):
+    """تخزين استجابة نقطة نهاية GET مؤقتاً حسب المسار ومعاملات الاستعلام المعروفة
+
+    params قاموس بأسماء المعاملات التي تؤثر على النتيجة وأنواعها، ويتم تجاهل
+    باقي المعاملات حتى لا تنشئ مفاتيح مختلفة لنفس النتيجة.
+    تُخزن فقط الاستجابات الناجحة (200).
+    """
+    params = params or {}
+    tables = frozenset(tables)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            normalized = tuple(
+                (name, request.args.get(name, type=param_type)) for name, param_type in sorted(params.items())
+            )
+            key = (request.endpoint, normalized)
+
+            def compute():
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    compute.uncached = response
+                    return None
+                return response.get_data(), response.mimetype
+
+            compute.uncached = None
+            payload = response_cache.get_or_compute(request.endpoint, key, ttl, tables, compute)
+            if payload is None:
+                return compute.uncached or current_app.make_response(f(*args, **kwargs))
+            data, mimetype = payload
+            return current_app.response_class(data, status=200, mimetype=mimetype)
+        return decorated
+    return decorator
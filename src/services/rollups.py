@@ -0,0 +1,119 @@
+from sqlalchemy import Integer, cast, delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from src.models.user import Inspection, MaintenanceTask, InspectionDailyRollup, MaintenanceMonthlyRollup, db
+from src.services.change_tracking import on_change, after_flush, after_rollback
+from flask.cli import with_appcontext
+import click
+
+DELTAS_KEY = 'rollup_deltas'
+
+# القيم الفارغة لا تصلح كجزء من المفتاح الأساسي، لذلك تُخزن كنص فارغ
+EMPTY = ''
+
+
+def inspection_key(row):
+    if not row['inspection_date']:
+        return None
+    return (row['inspection_date'].date(), row['status'] or EMPTY)
+
+
+def task_key(row):
+    if not row['created_at']:
+        return None
+    return (row['created_at'].year, row['created_at'].month, row['status'] or EMPTY, row['priority'] or EMPTY)
+
+
+ROLLUPS = (
+    (Inspection, ('inspection_date', 'status'), InspectionDailyRollup, ('day', 'status'), inspection_key),
+    (MaintenanceTask, ('created_at', 'status', 'priority'), MaintenanceMonthlyRollup, ('year', 'month', 'status', 'priority'), task_key),
+)
+
+
+def _track(model, fields, rollup, key_for):
+    @on_change(model, fields)
+    def record(session, old, new):
+        deltas = session.info.setdefault(DELTAS_KEY, {}).setdefault(rollup, {})
+        for row, sign in ((old, -1), (new, 1)):
+            key = key_for(row) if row else None
+            if key is not None:
+                deltas[key] = deltas.get(key, 0) + sign
+
+
+for _model, _fields, _rollup, _columns, _key_for in ROLLUPS:
+    _track(_model, _fields, _rollup, _key_for)
+
+
+@after_flush
+def apply_rollup_deltas(session):
+    """تطبيق الفروقات على جداول التجميع ضمن المعاملة نفسها"""
+    pending = session.info.pop(DELTAS_KEY, None)
+    for _model, _fields, rollup, columns, _key_for in ROLLUPS:
+        deltas = (pending or {}).get(rollup)
+        rows = [dict(zip(columns, key), count=delta) for key, delta in (deltas or {}).items() if delta]
+        if not rows:
+            continue
+        statement = insert(rollup).values(rows)
+        session.connection().execute(statement.on_conflict_do_update(
+            index_elements=list(columns),
+            set_={'count': rollup.count + statement.excluded.count}
+        ))
+
+
+@after_rollback
+def discard_rollup_deltas(session):
+    session.info.pop(DELTAS_KEY, None)
+
+
+def backfill_rollups():
+    """إعادة بناء جداول التجميع من السجل الكامل بعبارة INSERT ... SELECT لكل جدول"""
+    db.session.execute(delete(InspectionDailyRollup))
+    db.session.execute(insert(InspectionDailyRollup).from_select(
+        ['day', 'status', 'count'],
+        select(
+            func.date(Inspection.inspection_date),
+            func.coalesce(Inspection.status, EMPTY),
+            func.count(Inspection.id)
+        ).where(Inspection.inspection_date.isnot(None)).group_by(
+            func.date(Inspection.inspection_date), func.coalesce(Inspection.status, EMPTY)
+        )
+    ))
+
+    db.session.execute(delete(MaintenanceMonthlyRollup))
+    year = cast(func.strftime('%Y', MaintenanceTask.created_at), Integer)
+    month = cast(func.strftime('%m', MaintenanceTask.created_at), Integer)
+    db.session.execute(insert(MaintenanceMonthlyRollup).from_select(
+        ['year', 'month', 'status', 'priority', 'count'],
+        select(
+            year, month,
+            func.coalesce(MaintenanceTask.status, EMPTY),
+            func.coalesce(MaintenanceTask.priority, EMPTY),
+            func.count(MaintenanceTask.id)
+        ).where(MaintenanceTask.created_at.isnot(None)).group_by(
+            year, month, func.coalesce(MaintenanceTask.status, EMPTY), func.coalesce(MaintenanceTask.priority, EMPTY)
+        )
+    ))
+    db.session.commit()
+
+
+def init_rollups(app):
+    """بناء جداول التجميع عند أول تشغيل بعد إضافتها"""
+    with app.app_context():
+        empty = db.session.query(InspectionDailyRollup.day).first() is None \
+            and db.session.query(MaintenanceMonthlyRollup.year).first() is None
+        if empty:
+            backfill_rollups()
+
+
+@click.command('backfill-rollups')
+@with_appcontext
+def backfill_rollups_command():
+    """إعادة بناء جداول تجميع المخططات من السجل الكامل"""
+    backfill_rollups()
+    click.echo(
+        f'Rebuilt {InspectionDailyRollup.query.count()} inspection daily rows and '
+        f'{MaintenanceMonthlyRollup.query.count()} maintenance monthly rows'
+    )
+
+
+def display(value):
+    return None if value == EMPTY else value
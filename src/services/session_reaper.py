@@ -0,0 +1,42 @@
+from datetime import datetime
+from src.models.user import UserSession, db
+from src.services.background import PeriodicTask
+import time
+import os
+
+# إعدادات حذف الجلسات المنتهية
+SESSION_REAPER_INTERVAL = int(os.environ.get('SESSION_REAPER_INTERVAL', 3600))
+SESSION_REAPER_BATCH_SIZE = int(os.environ.get('SESSION_REAPER_BATCH_SIZE', 500))
+SESSION_REAPER_PAUSE = float(os.environ.get('SESSION_REAPER_PAUSE', 0.05))
+
+
+def reap_expired_sessions(batch_size=SESSION_REAPER_BATCH_SIZE, pause=SESSION_REAPER_PAUSE):
+    """حذف الجلسات المنتهية على دفعات صغيرة
+
+    كل دفعة في معاملة مستقلة حتى لا يبقى قفل الكتابة محجوزاً لفترة طويلة،
+    مع توقف قصير بين الدفعات للسماح لعمليات الكتابة الأخرى بالتنفيذ.
+    """
+    now = datetime.utcnow()
+    total_deleted = 0
+
+    while True:
+        expired_ids = [
+            session_id for (session_id,) in db.session.query(UserSession.id).filter(
+                UserSession.expires_at < now
+            ).limit(batch_size).all()
+        ]
+        if not expired_ids:
+            break
+
+        UserSession.query.filter(UserSession.id.in_(expired_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        total_deleted += len(expired_ids)
+
+        if len(expired_ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    return total_deleted
+
+
+session_reaper = PeriodicTask('session-reaper', SESSION_REAPER_INTERVAL, reap_expired_sessions)
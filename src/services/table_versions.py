@@ -0,0 +1,91 @@
+from flask import request, current_app
+from functools import wraps
+from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from src.models.user import TableVersion, db
+from src.services.change_tracking import after_flush, flushed_tables, touch_tables
+import hashlib
+
+
+def _bump(connection, tables):
+    if not tables:
+        return
+    statement = insert(TableVersion).values([{'table_name': table, 'version': 1} for table in sorted(tables)])
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=['table_name'],
+        set_={'version': TableVersion.version + 1}
+    ))
+
+
+def bump_versions(session, tables):
+    """زيادة إصدار جداول تغيرت بعبارات SQL مباشرة ضمن معاملة الجلسة
+
+    تُسجل الجداول أيضاً كمتغيرة حتى تُبطل الاستجابات المخزنة المعتمدة عليها بعد commit.
+    """
+    touch_tables(session, tables)
+    _bump(session.connection(), tables)
+
+
+@after_flush
+def bump_flushed_tables(session):
+    _bump(session.connection(), flushed_tables(session) - {TableVersion.__tablename__})
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def bump_bulk_tables(context):
+    """عمليات Query.update و Query.delete لا تمر بـ flush"""
+    bump_versions(context.session, {context.mapper.local_table.name})
+
+
+def read_versions(tables):
+    """إصدارات الجداول في استعلام واحد (0 للجدول الذي لم يتغير بعد)"""
+    if not tables:
+        return {}
+    rows = db.session.execute(
+        select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tables))
+    ).all()
+    versions = dict(rows)
+    return {table: versions.get(table, 0) for table in tables}
+
+
+def conditional_response(tables, clock=None):
+    """دعم GET الشرطي (ETag و 304) لنقطة نهاية تقرأ من الجداول المعطاة
+
+    يُبنى ETag ضعيف من إصدارات الجداول والمسار ومعاملات الاستعلام والمستخدم
+    وتاريخ اليوم، فإذا طابق هيدر If-None-Match يُرجع 304 دون تنفيذ الاستعلامات
+    أو بناء الاستجابة. يوضع بعد token_required مباشرة.
+    clock: دالة اختيارية لنقاط النهاية التي تقارن بالوقت الحالي، تُرجع قيمة
+    تتغير كلما تغيرت النتيجة بمرور الوقت وحده فتُضاف إلى ETag.
+    """
+    tables = tuple(sorted(set(tables)))
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(current_user, *args, **kwargs):
+            versions = read_versions(tables)
+            fingerprint = repr((
+                request.endpoint,
+                sorted(kwargs.items()),
+                sorted(request.args.items(multi=True)),
+                current_user.id,
+                current_user.role,
+                datetime.utcnow().date().isoformat(),
+                sorted(versions.items()),
+                clock() if clock else None
+            ))
+            etag = hashlib.sha1(fingerprint.encode()).hexdigest()[:20]
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(current_user, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated
+    return decorator
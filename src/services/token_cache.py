@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import time
+import os
+
+from src.models.user import User, db
+
+# إعدادات ذاكرة الرموز المميزة المتحقق منها
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 60))  # بالثواني
+
+
+class CachedUser:
+    """نسخة خفيفة من المستخدم تُحمّل الكائن الكامل من قاعدة البيانات عند الحاجة فقط"""
+
+    __slots__ = ('_data', '_instance')
+
+    def __init__(self, data):
+        object.__setattr__(self, '_data', data)
+        object.__setattr__(self, '_instance', None)
+
+    def _load(self):
+        """تحميل كائن المستخدم الكامل من قاعدة البيانات"""
+        if self._instance is None:
+            object.__setattr__(self, '_instance', db.session.get(User, self._data['id']))
+        return self._instance
+
+    def __getattr__(self, name):
+        if self._instance is None and name in self._data:
+            return self._data[name]
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def is_admin(self):
+        """التحقق من كون المستخدم مدير"""
+        return self.role in ['admin', 'super_admin']
+
+    def is_safety_manager(self):
+        """التحقق من كون المستخدم مسؤول سلامة"""
+        return self.role in ['safety_manager', 'admin', 'super_admin']
+
+    def can_manage_users(self):
+        """التحقق من صلاحية إدارة المستخدمين"""
+        return self.role in ['admin', 'super_admin']
+
+    def to_dict(self, include_sensitive=False):
+        """تحويل المستخدم إلى قاموس"""
+        if self._instance is None and not include_sensitive and 'public' in self._data:
+            return dict(self._data['public'])
+        return self._load().to_dict(include_sensitive=include_sensitive)
+
+    @staticmethod
+    def from_claims(payload):
+        """إنشاء مستخدم خفيف من مطالبات الرمز المميز فقط"""
+        return CachedUser({
+            'id': payload['user_id'],
+            'email': payload.get('email'),
+            'role': payload['role'],
+            'is_active': payload['is_active']
+        })
+
+    @staticmethod
+    def snapshot(user):
+        """إنشاء بيانات النسخة الخفيفة من كائن المستخدم"""
+        return {
+            'id': user.id,
+            'email': user.email,
+            'name': user.name,
+            'role': user.role,
+            'department': user.department,
+            'phone': user.phone,
+            'is_active': user.is_active,
+            'is_verified': user.is_verified,
+            'last_login': user.last_login,
+            'created_at': user.created_at,
+            'updated_at': user.updated_at,
+            'public': user.to_dict()
+        }
+
+
+class TokenCache:
+    """ذاكرة LRU محدودة الحجم والمدة للرموز المميزة المتحقق منها
+
+    كل عملية (worker) تحتفظ بنسختها الخاصة، لذلك تبقى مدة الصلاحية قصيرة
+    حتى يظهر أثر التعديلات التي تتم في عمليات أخرى خلال ثوانٍ.
+    """
+
+    def __init__(self, max_size=TOKEN_CACHE_MAX_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (cached_at, token_exp, user_id, data)
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token):
+        """الحصول على المستخدم المخزن للرمز أو None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            cached_at, token_exp, user_id, data = entry
+            if now - cached_at > self.ttl or now >= token_exp:
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+        return CachedUser(data)
+
+    def set(self, token, token_exp, user):
+        """تخزين نسخة خفيفة من المستخدم المتحقق منه"""
+        data = CachedUser.snapshot(user)
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (time.time(), token_exp, user.id, data)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """حذف جميع الرموز المخزنة لمستخدم معين"""
+        with self._lock:
+            tokens = self._tokens_by_user.pop(user_id, set())
+            for token in tokens:
+                self._entries.pop(token, None)
+            self.invalidations += len(tokens)
+
+    def clear(self):
+        """مسح الذاكرة بالكامل"""
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _remove(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[2])
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[2]]
+
+    def stats(self):
+        """إحصائيات الذاكرة للمراقبة"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+
+
+token_cache = TokenCache()
+
+
+def invalidate_user_tokens(user_id):
+    """إلغاء الرموز المخزنة للمستخدم بعد تعديل بياناته"""
+    token_cache.invalidate_user(user_id)
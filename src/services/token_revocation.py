@@ -0,0 +1,112 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.models.user import User, UserSession, db
+from src.services.change_tracking import on_change, after_rollback
+from src.services.login_writes import login_writes
+import threading
+import time
+import os
+
+# مدة تحديث جدول إصدارات الرموز من قاعدة البيانات (بالثواني)
+TOKEN_VERSIONS_REFRESH = int(os.environ.get('TOKEN_VERSIONS_REFRESH', 30))
+CHANGED_KEY = 'token_versions_changed'
+
+
+class TokenVersions:
+    """جدول صغير في الذاكرة لإصدار الرموز الحالي لكل مستخدم
+
+    يُستخدم في وضع المصادقة بالمطالبات فقط: الرمز الذي يحمل إصدار أقدم
+    من الإصدار الحالي لا يُقبل دون التحقق من قاعدة البيانات. يُعاد تحميل
+    الجدول بالكامل كل TOKEN_VERSIONS_REFRESH ثانية حتى تظهر التغييرات
+    التي تمت في العمليات الأخرى. خيط واحد فقط يعيد التحميل، والتغييرات
+    في هذه العملية تُطبق بعد commit.
+    """
+
+    def __init__(self, refresh_interval=TOKEN_VERSIONS_REFRESH):
+        self.refresh_interval = refresh_interval
+        self._versions = {}
+        self._changed = {}  # التغييرات المطبقة أثناء إعادة التحميل الجارية
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _refresh_if_stale(self):
+        if time.time() - self._loaded_at < self.refresh_interval:
+            return
+        with self._refresh_lock:
+            # ربما أعاد خيط آخر التحميل أثناء الانتظار
+            if time.time() - self._loaded_at < self.refresh_interval:
+                return
+            with self._lock:
+                self._changed = {}
+            rows = db.session.query(User.id, User.token_version).all()
+            with self._lock:
+                versions = {user_id: version or 0 for user_id, version in rows}
+                # التغييرات التي تمت بعد بدء الاستعلام أحدث مما قرأه
+                for user_id, version in self._changed.items():
+                    if version is None:
+                        versions.pop(user_id, None)
+                    else:
+                        versions[user_id] = max(version, versions.get(user_id, 0))
+                self._versions = versions
+                self._loaded_at = time.time()
+
+    def is_current(self, user_id, version):
+        """التحقق من أن إصدار الرمز هو الإصدار الحالي للمستخدم"""
+        self._refresh_if_stale()
+        with self._lock:
+            return self._versions.get(user_id) == version
+
+    def set(self, user_id, version):
+        with self._lock:
+            self._versions[user_id] = version
+            self._changed[user_id] = version
+
+    def forget(self, user_id):
+        with self._lock:
+            self._versions.pop(user_id, None)
+            self._changed[user_id] = None
+
+
+token_versions = TokenVersions()
+
+
+def bump_token_version(user):
+    """إبطال المطالبات الموجودة في رموز المستخدم (الدور، الحالة، كلمة المرور)
+
+    يُحدّث الجدول في الذاكرة بعد commit فقط، فلا يُرفض رمز صالح إذا تم التراجع.
+    """
+    user.token_version = (user.token_version or 0) + 1
+
+
+@on_change(User, ('id', 'token_version'))
+def _record_token_version(session, old, new):
+    changed = session.info.setdefault(CHANGED_KEY, {})
+    if new:
+        changed[new['id']] = new['token_version'] or 0
+    else:
+        changed[old['id']] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_token_versions(session):
+    for user_id, version in session.info.pop(CHANGED_KEY, {}).items():
+        if version is None:
+            token_versions.forget(user_id)
+        else:
+            token_versions.set(user_id, version)
+
+
+@after_rollback
+def _discard_token_versions(session):
+    session.info.pop(CHANGED_KEY, None)
+
+
+def revoke_sessions(user):
+    """حذف جلسات التذكر للمستخدم (بما فيها التي لم تُكتب بعد) ضمن معاملة الجلسة الحالية
+
+    بدونها يستمر رمز جلسة مسروق في إصدار رموز جديدة عبر refresh-session
+    بعد تغيير كلمة المرور أو إعادة تعيينها.
+    """
+    login_writes.discard_sessions(user.id)
+    UserSession.query.filter_by(user_id=user.id).delete()